@@ -1,55 +1,291 @@
+import os
+import time
 import discord
 import asyncio
 import enum
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from .metered_audio_source import MeteredAudioSource
+from .mmap_opus_audio import MmapOpusAudio
+from .prebuffered_audio_source import PrebufferedAudioSource
+from clients.discord.discord_audio.playback_metrics import PlaybackMetrics
+
+FFMPEG_BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+
+
+class PlaybackMode(enum.Enum):
+    OPUS_COPY = "opus passthrough"    # Opus packets are remuxed by ffmpeg, nothing is decoded or encoded
+    OPUS_ENCODE = "ffmpeg opus"       # ffmpeg transcodes to Opus, the voice thread only sends packets
+    PCM = "pcm"                       # ffmpeg decodes to PCM, the voice thread encodes every frame with libopus
+    OPUS_FRAMES = "pre-encoded opus"  # Packets are read from a memory-mapped file, no ffmpeg at all
 
 
 class DiscordGuildAudioPlayer:
+    # Shared by every guild. Prebuffering holds a thread through the ffmpeg connect and PREBUFFER_SECONDS of audio,
+    # so it gets its own pool instead of the default executor used by to_thread and aiohttp
+    _prebuffer_executor: ThreadPoolExecutor = None
+    _prebuffer_executor_lock = Lock()
+
     def __init__(self, guild_id, vc, on_song_end_callback=None):
         self.guild_id = guild_id
         self.voice_client: discord.VoiceClient = vc
         self.on_song_end_callback = on_song_end_callback
         self.loop = asyncio.get_running_loop()
+        self.passthrough = os.getenv('AUDIO_PASSTHROUGH', '1') == '1'
+        self.playback_mode: PlaybackMode = None
+        self.cpu_usage: dict[PlaybackMode, dict] = {}
+        # How long before the end of a track the next one is started, and how much of it is read ahead
+        self.prespawn_seconds = float(os.getenv('PRESPAWN_SECONDS', 5))
+        self.prebuffer_frames = int(float(os.getenv('PREBUFFER_SECONDS', 2)) / 0.02)
+        self.current_source: MeteredAudioSource = None
+        self._prepared = None
+        self._watch_task: asyncio.Task = None
+        self._song_ended_at: float = None
 
-    def play_stream(self, stream_url: str) -> None:
+    def play_stream(self, stream_url: str, audio_codec: str = None) -> bool:
         """
         A method to play a stream in the voice channel.
+        Opus streams are passed through without re-encoding, other codecs are transcoded by ffmpeg,
+        PCM with encoding in the voice thread is only used when passthrough is disabled or unavailable.
         
         Parameters:
             source (str): The source of the audio stream.
+            audio_codec (str, optional): The codec of the stream, e.g. "opus". Defaults to None (unknown).
         
         Returns:
-            None
+            bool: True if the stream started playing.
         """
         if self.voice_client.is_playing():
             #If we're already playing, exit early
-            return
+            print(f"\tNot playing stream in guild {self.guild_id}: already playing")
+            return False
         
         if self.voice_client.is_paused():
             #If we're paused, exit early
-            return
+            print(f"\tNot playing stream in guild {self.guild_id}: paused")
+            return False
         
         try:
-            audio_source = discord.FFmpegPCMAudio(stream_url, before_options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5", options="-vn", executable="ffmpeg")
-            self.voice_client.play(audio_source, after=self.after_song_ends)
+            self._play_source(*self._create_source(stream_url, audio_codec, FFMPEG_BEFORE_OPTIONS))
+            return True
         except Exception as e:
             print(f"\tError playing audio: {e}")
+            return False
+
+    def _play_source(self, audio_source: discord.AudioSource, mode: PlaybackMode, warm: bool = False) -> None:
+        self.playback_mode = mode
+        self.current_source = self._meter(audio_source, mode, warm)
+        self.voice_client.play(self.current_source, after=self.after_song_ends)
+
+    def prepare_stream(self, key, stream_url: str, audio_codec: str = None) -> None:
+        """
+        Start the source of the next track ahead of time, see prepare.
+
+        Parameters:
+            key: Identifies the track, play_prepared only swaps the source in for the same key.
+            stream_url (str): The stream URL of the track.
+            audio_codec (str, optional): The codec of the stream.
+        """
+        self._prepare(key, *self._create_source(stream_url, audio_codec, FFMPEG_BEFORE_OPTIONS))
+
+    def prepare_file(self, key, song_file: str, audio_codec: str = None) -> None:
+        """Start the source of the next track from a local file ahead of time, see prepare_stream."""
+        self._prepare(key, *self._create_source(song_file, audio_codec))
+
+    def prepare_opus_frames(self, key, frames_path: str, index_path: str) -> None:
+        """Open the next track from the Opus frame store ahead of time, see prepare_stream."""
+        self._prepare(key, MmapOpusAudio(frames_path, index_path), PlaybackMode.OPUS_FRAMES)
+
+    def _prepare(self, key, audio_source: discord.AudioSource, mode: PlaybackMode) -> None:
+        # ffmpeg is spawned now, and its first frames are read in a worker thread while the current track plays
+        self.discard_prepared()
+        prebuffered = PrebufferedAudioSource(audio_source, self.prebuffer_frames)
+        self._prepared = (key, prebuffered, mode)
+        self.loop.run_in_executor(self._get_prebuffer_executor(), prebuffered.prebuffer)
+
+    @classmethod
+    def _get_prebuffer_executor(cls) -> ThreadPoolExecutor:
+        with cls._prebuffer_executor_lock:
+            if cls._prebuffer_executor is None:
+                # Not the resolver pool: a prebuffer blocks on ffmpeg for as long as the audio it reads, and must start now
+                cls._prebuffer_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PREBUFFER_WORKERS', 4)), thread_name_prefix="prebuffer")
+        return cls._prebuffer_executor
+
+    def is_prepared(self, key) -> bool:
+        """Return True if the source of the given track has been started ahead of time."""
+        return self._prepared is not None and self._prepared[0] is key
+
+    def play_prepared(self, key) -> bool:
+        """
+        Play the source that was started ahead of time, if it is for the given track.
+        A source prepared for another track (the queue changed) is discarded.
+
+        Parameters:
+            key: Identifies the track, as given to prepare_stream.
+
+        Returns:
+            bool: True if the prepared source started playing, False if the track has to be started cold.
+        """
+        if not self.is_prepared(key):
+            self.discard_prepared()
+            return False
+        if self.voice_client.is_playing() or self.voice_client.is_paused():
+            return False
+
+        _, audio_source, mode = self._prepared
+        self._prepared = None
+        try:
+            self._play_source(audio_source, mode, warm=True)
+            return True
+        except Exception as e:
+            print(f"\tError playing prepared audio: {e}")
+            audio_source.cleanup()
+            return False
+
+    def discard_prepared(self) -> None:
+        """Stop the source started ahead of time, if any."""
+        if self._prepared is not None:
+            _, audio_source, _ = self._prepared
+            self._prepared = None
+            audio_source.cleanup()
+
+    def close(self) -> None:
+        """Stop everything running in the background for the guild, the end of the current song no longer plays the next one."""
+        self.on_song_end_callback = None
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        self.discard_prepared()
+
+    def watch_for_end(self, duration_seconds: float, on_near_end) -> None:
+        """
+        Call on_near_end(guild_id, voice_client) PRESPAWN_SECONDS before the current track ends,
+        so the next track can be prepared. The position comes from the frames actually played, so pauses are accounted for.
+
+        Parameters:
+            duration_seconds (float): The length of the current track.
+            on_near_end (callable): The coroutine function to call.
+        """
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+        if self.prespawn_seconds <= 0 or self.current_source is None:
+            return
+        self._watch_task = self.loop.create_task(self._watch_for_end(self.current_source, duration_seconds, on_near_end))
+
+    async def _watch_for_end(self, source: MeteredAudioSource, duration_seconds: float, on_near_end) -> None:
+        try:
+            while self.current_source is source:
+                remaining = duration_seconds - source.position_seconds
+                if remaining <= self.prespawn_seconds:
+                    await on_near_end(self.guild_id, self.voice_client)
+                    return
+                await asyncio.sleep(min(remaining - self.prespawn_seconds, 5))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error preparing the next track for guild {self.guild_id}: {e}")
+
+    def _create_source(self, source: str, audio_codec: str, before_options: str = None) -> 'tuple[discord.AudioSource, PlaybackMode]':
+        if self.passthrough:
+            mode = PlaybackMode.OPUS_COPY if audio_codec == "opus" else PlaybackMode.OPUS_ENCODE
+            try:
+                audio_source = discord.FFmpegOpusAudio(
+                    source,
+                    bitrate=self._channel_bitrate_kbps(),
+                    codec="copy" if mode == PlaybackMode.OPUS_COPY else None,
+                    before_options=before_options,
+                    options="-vn",
+                    executable="ffmpeg"
+                )
+                return audio_source, mode
+            except Exception as e:
+                print(f"\tFalling back to PCM playback for guild {self.guild_id}: {e}")
+
+        audio_source = discord.FFmpegPCMAudio(source, before_options=before_options, options="-vn", executable="ffmpeg")
+        return audio_source, PlaybackMode.PCM
+
+    def _channel_bitrate_kbps(self) -> int:
+        # Encoding above the channel bitrate is wasted, Discord caps what listeners receive. 512 is libopus' ceiling.
+        channel = getattr(self.voice_client, 'channel', None)
+        if channel is None or not getattr(channel, 'bitrate', None):
+            return 128
+        return min(channel.bitrate // 1000, 512)
+
+    def _meter(self, audio_source: discord.AudioSource, mode: PlaybackMode, warm: bool = False) -> MeteredAudioSource:
+        # Set while the song end callback runs, so only transitions between tracks are measured
+        song_ended_at = self._song_ended_at
+
+        def record_gap(first_frame_at: float) -> None:
+            if song_ended_at is not None:
+                PlaybackMetrics().observe(f"audio_gap_seconds_{'warm' if warm else 'cold'}", first_frame_at - song_ended_at)
+
+        def record(audio_seconds: float, voice_cpu_seconds: float, ffmpeg_cpu_seconds: float) -> None:
+            usage = self.cpu_usage.setdefault(mode, {"songs": 0, "audio_seconds": 0.0, "voice_cpu_seconds": 0.0, "ffmpeg_cpu_seconds": 0.0})
+            usage["songs"] += 1
+            usage["audio_seconds"] += audio_seconds
+            usage["voice_cpu_seconds"] += voice_cpu_seconds
+            usage["ffmpeg_cpu_seconds"] += ffmpeg_cpu_seconds
+            if audio_seconds > 0:
+                PlaybackMetrics().observe(f"cpu_percent_{mode.name.lower()}", 100 * (voice_cpu_seconds + ffmpeg_cpu_seconds) / audio_seconds)
+
+        return MeteredAudioSource(audio_source, on_cleanup=record, on_first_frame=record_gap)
+
+    def get_cpu_stats(self) -> dict:
+        """
+        Return the CPU used per second of audio for each playback mode this guild has used.
+
+        Returns:
+            dict: Mode name to {"songs", "audio_seconds", "voice_cpu_percent", "ffmpeg_cpu_percent"}.
+        """
+        stats = {}
+        for mode, usage in self.cpu_usage.items():
+            audio_seconds = usage["audio_seconds"] or 1
+            stats[mode.value] = {
+                "songs": usage["songs"],
+                "audio_seconds": usage["audio_seconds"],
+                "voice_cpu_percent": 100 * usage["voice_cpu_seconds"] / audio_seconds,
+                "ffmpeg_cpu_percent": 100 * usage["ffmpeg_cpu_seconds"] / audio_seconds,
+            }
+        return stats
                 
-    def play_file(self, song_file: str) -> None:
+    def play_file(self, song_file: str, audio_codec: str = None) -> bool:
         """
         Play a song file using the provided song file path and song information dictionary.
 
         Args:
             song_file (str): The file path of the song to be played.
+            audio_codec (str, optional): The codec of the file, Opus files are played without re-encoding.
+
+        Returns:
+            bool: True if the file started playing.
+        """
+        if not self.voice_client.is_playing():
+            try:
+                self._play_source(*self._create_source(song_file, audio_codec))
+                return True
+            except Exception as e:
+                print(f"\tError playing audio: {e}")
+        return False
+
+    def play_opus_frames(self, frames_path: str, index_path: str) -> bool:
+        """
+        Play a track from the Opus frame store, without spawning ffmpeg.
+
+        Args:
+            frames_path (str): The file holding the pre-encoded Opus packets.
+            index_path (str): The file holding the packet offsets.
 
         Returns:
-            None
+            bool: True if the track started playing.
         """
         if not self.voice_client.is_playing():
             try:
-                audio_source = discord.FFmpegPCMAudio(song_file, executable="ffmpeg")
-                self.voice_client.play(audio_source, after=self.after_song_ends)
+                self._play_source(MmapOpusAudio(frames_path, index_path), PlaybackMode.OPUS_FRAMES)
+                return True
             except Exception as e:
                 print(f"\tError playing audio: {e}")
+        return False
 
     def after_song_ends(self, error=None) -> None:
         """
@@ -58,11 +294,15 @@ class DiscordGuildAudioPlayer:
         :param error: An optional parameter representing any error that occurred.
         :return: None
         """
+        self.current_source = None
         if self.on_song_end_callback:
+            self._song_ended_at = time.perf_counter()
             try:
                 asyncio.run_coroutine_threadsafe(self.on_song_end_callback(self.guild_id, self.voice_client, error), self.loop).result()
             except Exception as e:
                 print(f"Error in after_song_ends: {e}")
+            finally:
+                self._song_ended_at = None
 
     def stop(self) -> bool:
         """
@@ -40,6 +40,17 @@ class DiscordGuildAudioPlayerManager:
         if guild_id in self.audio_players:
             return self.audio_players[guild_id]
     
+    def remove_audio_player_by_id(self, guild_id: int) -> None:
+        """
+        Close and forget the audio player of a guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+        """
+        audio_player = self.audio_players.pop(guild_id, None)
+        if audio_player is not None:
+            audio_player.close()
+
     def _create_audio_player(self, guild_id: int, voice_client: discord.VoiceClient, on_song_end_callback=None) -> DiscordGuildAudioPlayer:
         """
         Create an audio player for a specific guild using the provided voice client.
@@ -104,4 +115,18 @@ class DiscordGuildAudioPlayerManager:
         Returns:
             str: The playback state of the audio player for the specified guild.
         """
-        return self.audio_players[guild_id].playback_state
\ No newline at end of file
+        return self.audio_players[guild_id].playback_state
+
+    def get_cpu_stats_by_id(self, guild_id: int) -> dict:
+        """
+        Retrieve the CPU used per playback mode by the audio player of a specific guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild to retrieve the CPU usage for.
+
+        Returns:
+            dict: The CPU usage per playback mode, empty if the guild has no audio player.
+        """
+        if guild_id in self.audio_players:
+            return self.audio_players[guild_id].get_cpu_stats()
+        return {}
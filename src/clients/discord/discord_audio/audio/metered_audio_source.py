@@ -0,0 +1,74 @@
+import os
+import time
+import discord
+
+
+class MeteredAudioSource(discord.AudioSource):
+    def __init__(self, source: discord.AudioSource, on_cleanup=None, on_first_frame=None):
+        """
+        Wraps an audio source and measures the CPU it costs to play it.
+
+        The voice thread calls read() once per 20ms frame, so the thread CPU time between two reads is
+        everything spent on the previous frame: reading it, encoding it to Opus when the source is PCM,
+        encrypting and sending it. The CPU used by the ffmpeg process is read from /proc when available.
+
+        Parameters:
+            source (discord.AudioSource): The source being played.
+            on_cleanup (callable, optional): Called with (audio_seconds, voice_cpu_seconds, ffmpeg_cpu_seconds) when playback ends.
+            on_first_frame (callable, optional): Called with the time.perf_counter() at which the first frame was read.
+        """
+        self.source = source
+        self.on_cleanup = on_cleanup
+        self.on_first_frame = on_first_frame
+        self.frames = 0
+        self.voice_cpu_seconds = 0.0
+        self._last_thread_time = None
+
+    @property
+    def position_seconds(self) -> float:
+        """How much of the source has been played."""
+        return self.frames * 0.02
+
+    def read(self) -> bytes:
+        now = time.thread_time()
+        if self._last_thread_time is not None:
+            self.voice_cpu_seconds += now - self._last_thread_time
+        self._last_thread_time = now
+
+        data = self.source.read()
+        if data:
+            self.frames += 1
+            if self.frames == 1 and self.on_first_frame:
+                try:
+                    self.on_first_frame(time.perf_counter())
+                except Exception as e:
+                    print(f"Error recording the first audio frame: {e}")
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        ffmpeg_cpu_seconds = self._read_ffmpeg_cpu_seconds()
+        try:
+            self.source.cleanup()
+        finally:
+            # AudioSource.__del__ calls cleanup again, only report once
+            on_cleanup, self.on_cleanup = self.on_cleanup, None
+            if on_cleanup:
+                try:
+                    on_cleanup(self.frames * 0.02, self.voice_cpu_seconds, ffmpeg_cpu_seconds)
+                except Exception as e:
+                    print(f"Error recording audio CPU usage: {e}")
+
+    def _read_ffmpeg_cpu_seconds(self) -> float:
+        process = getattr(self.source, '_process', None)
+        if process is None:
+            return 0.0
+        try:
+            with open(f"/proc/{process.pid}/stat") as stat:
+                # utime and stime are the 14th and 15th fields, after the parenthesised command name
+                fields = stat.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            return 0.0
@@ -0,0 +1,37 @@
+import mmap
+import discord
+
+
+class MmapOpusAudio(discord.AudioSource):
+    def __init__(self, frames_path: str, index_path: str):
+        """
+        Plays pre-encoded 20ms Opus packets straight from a memory-mapped file, without spawning ffmpeg.
+
+        Parameters:
+            frames_path (str): The file holding the Opus packets back to back.
+            index_path (str): The file holding the packet offsets, see OpusFrameStore.
+        """
+        with open(frames_path, "rb") as frames_file:
+            self._frames = mmap.mmap(frames_file.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path, "rb") as index_file:
+            self._index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Packet i spans offsets[i]:offsets[i + 1], read in place from the mapped index.
+        self._offsets = memoryview(self._index_map).cast('I')
+        self._position = 0
+
+    def read(self) -> bytes:
+        if self._offsets is None or self._position + 1 >= len(self._offsets):
+            return b''
+        start, end = self._offsets[self._position], self._offsets[self._position + 1]
+        self._position += 1
+        return self._frames[start:end]
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        if self._offsets is not None:
+            self._offsets.release()
+            self._offsets = None
+            self._index_map.close()
+            self._frames.close()
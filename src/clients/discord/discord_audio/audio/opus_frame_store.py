@@ -0,0 +1,204 @@
+import os
+import subprocess
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Optional
+
+from discord.oggparse import OggStream
+
+# Encoded once per track, every later play only reads packets from disk.
+FFMPEG_ENCODE_ARGS = [
+    "-map_metadata", "-1", "-vn",
+    "-c:a", "libopus", "-b:a", "128k", "-frame_duration", "20", "-ar", "48000", "-ac", "2",
+    "-f", "opus", "pipe:1",
+]
+
+
+class OpusFrameStore:
+    """
+    On-disk store of pre-encoded 20ms Opus packets for the most played tracks.
+
+    Each track is two files: <video_id>.frames holds the packets back to back, <video_id>.idx holds
+    the native uint32 offsets of every packet plus the end offset, so packet i is frames[idx[i]:idx[i + 1]].
+    They are played by MmapOpusAudio without spawning ffmpeg.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.directory = os.getenv('OPUS_FRAME_DIR', 'opus_frames')
+        self.max_bytes = int(os.getenv('OPUS_FRAME_STORE_MAX_BYTES', 512 * 1024 ** 2))
+        self.min_plays = int(os.getenv('OPUS_FRAME_STORE_MIN_PLAYS', 4))
+        self.enabled = self.max_bytes > 0
+
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.building: set[str] = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+        # Pre-encoding a song can take minutes, so it gets a thread of its own instead of a resolver worker
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="opus-frames")
+
+        if self.enabled:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self._load_directory()
+            except OSError as e:
+                print(f"Error opening the Opus frame store, disabling it: {e}")
+                self.enabled = False
+
+    def _load_directory(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                os.remove(path)
+                continue
+            if not name.endswith('.frames'):
+                continue
+            video_id = name.removesuffix('.frames')
+            frames_path, index_path = self.get_paths(video_id)
+            if not os.path.exists(index_path):
+                os.remove(frames_path)
+                continue
+            size = os.path.getsize(frames_path) + os.path.getsize(index_path)
+            entries.append((os.path.getmtime(frames_path), video_id, size))
+
+        for _, video_id, size in sorted(entries):
+            self.entries[video_id] = size
+            self.total_bytes += size
+        self._evict()
+
+    def get_paths(self, video_id: str) -> 'tuple[str, str]':
+        """Return the frames and index paths of a track."""
+        base = os.path.join(self.directory, video_id)
+        return f"{base}.frames", f"{base}.idx"
+
+    @staticmethod
+    def get_duration_seconds(index_path: str) -> Optional[float]:
+        """Return the length of an encoded track, every packet is 20ms."""
+        try:
+            return (os.path.getsize(index_path) // 4 - 1) * 0.02
+        except OSError:
+            return None
+
+    def contains(self, video_id: str) -> bool:
+        """Return True if a track has been encoded, without marking it as used."""
+        return self.enabled and video_id in self.entries
+
+    def get(self, video_id: str) -> Optional['tuple[str, str]']:
+        """
+        Return the frames and index paths of an encoded track and mark it as recently used.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+
+        Returns:
+            tuple[str, str]: The frames and index paths, or None if the track has not been encoded.
+        """
+        if not self.contains(video_id):
+            return None
+        with self._lock:
+            if video_id not in self.entries:
+                return None
+            self.entries.move_to_end(video_id)
+            self.hits += 1
+        paths = self.get_paths(video_id)
+        try:
+            os.utime(paths[0])
+        except OSError:
+            pass
+        return paths
+
+    def maybe_build(self, video_id: str, plays: int, source_path: str) -> bool:
+        """
+        Encode a track in the background once it has been played often enough.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+            plays (int): How many times the track has been played.
+            source_path (str): A local audio file of the track, from the audio cache.
+
+        Returns:
+            bool: True if an encode was scheduled.
+        """
+        if not self.enabled or plays < self.min_plays:
+            return False
+        with self._lock:
+            if video_id in self.entries or video_id in self.building:
+                return False
+            self.building.add(video_id)
+        self.executor.submit(self._build, video_id, source_path)
+        return True
+
+    def get_stats(self) -> dict:
+        """Return the hit, build and eviction counts, the number of encoded tracks and their total size."""
+        return {
+            "hits": self.hits,
+            "builds": self.builds,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "bytes": self.total_bytes,
+        }
+
+    def _build(self, video_id: str, source_path: str) -> None:
+        frames_path, index_path = self.get_paths(video_id)
+        process = None
+        try:
+            offsets = array('I', [0])
+            process = subprocess.Popen(
+                ["ffmpeg", "-loglevel", "warning", "-i", source_path, *FFMPEG_ENCODE_ARGS],
+                stdout=subprocess.PIPE, stdin=subprocess.DEVNULL
+            )
+            with open(f"{frames_path}.part", "wb") as frames_file:
+                for packet in OggStream(process.stdout).iter_packets():
+                    # The stream headers are not audio, Discord only wants the packets
+                    if packet.startswith((b'OpusHead', b'OpusTags')):
+                        continue
+                    frames_file.write(packet)
+                    offsets.append(offsets[-1] + len(packet))
+            if process.wait() != 0 or len(offsets) < 2:
+                raise Exception(f"ffmpeg exited with code {process.returncode}")
+
+            with open(f"{index_path}.part", "wb") as index_file:
+                offsets.tofile(index_file)
+            os.replace(f"{index_path}.part", index_path)
+            os.replace(f"{frames_path}.part", frames_path)
+
+            size = os.path.getsize(frames_path) + os.path.getsize(index_path)
+            with self._lock:
+                self.entries[video_id] = size
+                self.total_bytes += size
+                self.builds += 1
+                self._evict()
+        except Exception as e:
+            print(f"Error encoding Opus frames for {video_id}: {e}")
+            if process is not None and process.poll() is None:
+                process.kill()
+            for path in (f"{frames_path}.part", f"{index_path}.part"):
+                if os.path.exists(path):
+                    os.remove(path)
+        finally:
+            with self._lock:
+                self.building.discard(video_id)
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            video_id, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            for path in self.get_paths(video_id):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,60 @@
+from collections import deque
+from threading import Lock
+import discord
+
+
+class PrebufferedAudioSource(discord.AudioSource):
+    def __init__(self, source: discord.AudioSource, frames: int):
+        """
+        Wraps an audio source so its first frames can be read before playback starts.
+
+        prebuffer() blocks until ffmpeg has started, connected and produced the first `frames` frames,
+        so it runs in a worker thread while the previous track is still playing.
+
+        Parameters:
+            source (discord.AudioSource): The source to buffer.
+            frames (int): How many 20ms frames to read ahead.
+        """
+        self.source = source
+        self.frames = frames
+        self._buffer: deque[bytes] = deque()
+        self._lock = Lock()
+        self._closed = False
+
+    @property
+    def _process(self):
+        # Lets MeteredAudioSource find the ffmpeg process
+        return getattr(self.source, '_process', None)
+
+    def prebuffer(self) -> int:
+        """
+        Read frames ahead until the buffer is full or the source ends.
+
+        Returns:
+            int: How many frames were buffered.
+        """
+        while len(self._buffer) < self.frames:
+            with self._lock:
+                if self._closed:
+                    break
+                data = self.source.read()
+                if not data:
+                    break
+                self._buffer.append(data)
+        return len(self._buffer)
+
+    def read(self) -> bytes:
+        # The lock keeps frames in order while prebuffer() may still be running
+        with self._lock:
+            if self._buffer:
+                return self._buffer.popleft()
+            return self.source.read()
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        # Not under the lock, prebuffer() may be blocked reading from ffmpeg. Killing ffmpeg unblocks it.
+        self._closed = True
+        self.source.cleanup()
+        self._buffer.clear()
@@ -1,16 +1,147 @@
+import os
+import time
+import asyncio
+from threading import Lock
 import discord
+from discord.ext import commands
+from clients.discord.guild_context import GuildContext, PlaybackState
 from clients.discord.discord_audio.queue.guild_queue_manager import GuildQueueManager
 from clients.discord.discord_audio.queue.queue_item import QueueItem
+from clients.discord.discord_audio.queue.queue_prefetcher import QueuePrefetcherManager
+from clients.discord.discord_audio.playback_metrics import PlaybackMetrics
 from clients.discord.discord_audio.audio.discord_guild_audio_player_manager import DiscordGuildAudioPlayerManager
 from clients.discord.discord_audio.audio.dicord_voice_connecter import DiscordVoiceConnecter
 
 class MusicManager:
-    def __init__(self, bot):
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls, bot):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize(bot)
+        return cls._instance
+
+    def initialize(self, bot):
         self.bot: discord.Client = bot
         self.guild_queue_manager = GuildQueueManager()
         self.voice_client_connecter = DiscordVoiceConnecter()
         self.guild_audio_player_manager = DiscordGuildAudioPlayerManager()
-    
+        self.queue_prefetcher_manager = QueuePrefetcherManager()
+        self.guild_contexts: dict[int, GuildContext] = {}
+        # Sessions of guilds the bot is not connected in are closed after this many idle seconds
+        self.session_idle_ttl = float(os.getenv('SESSION_IDLE_TTL', 1800))
+        self.session_reap_interval = float(os.getenv('SESSION_REAP_INTERVAL', 60))
+        self.empty_channel_grace = float(os.getenv('EMPTY_CHANNEL_GRACE_SECONDS', 120))
+
+    #Guild sessions
+    def get_guild_context(self, guild_id: int) -> GuildContext:
+        """
+        Get the session of a guild, creating it on first use.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            GuildContext: The queue, prefetcher, audio player and voice client of the guild.
+        """
+        context = self.guild_contexts.get(guild_id)
+        if context is None:
+            context = GuildContext(
+                self.bot,
+                guild_id,
+                self.guild_queue_manager.get_guild_queue_by_id(guild_id),
+                self.queue_prefetcher_manager.get_prefetcher_by_id(guild_id)
+            )
+            self.guild_contexts[guild_id] = context
+        return context
+
+    def close_guild_context(self, guild_id: int) -> bool:
+        """
+        Tear down the session of a guild: stop filling its queue, cancel its prefetches,
+        stop its audio player and forget all of it. The queue journal keeps what was queued.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            bool: True if the guild had a session.
+        """
+        context = self.guild_contexts.pop(guild_id, None)
+        if context is None:
+            return False
+        self.guild_queue_manager.remove_guild_queue_by_id(guild_id)
+        self.queue_prefetcher_manager.remove_prefetcher_by_id(guild_id)
+        self.guild_audio_player_manager.remove_audio_player_by_id(guild_id)
+        context.audio_player = None
+        context.cancel_empty_channel_timer()
+        return True
+
+    def reap_idle_sessions(self) -> int:
+        """
+        Close the sessions of guilds the bot is not connected in and that did nothing for SESSION_IDLE_TTL seconds,
+        and right away those of guilds the bot is no longer in. Their queue and current song are dropped from the
+        journal first, so they are not restored either.
+
+        Queues restored from the journal that were not resumed (rejoining is off, or the guild is gone) have no session,
+        they are given one here so they are closed the same way.
+
+        Returns:
+            int: The number of sessions closed.
+        """
+        if self.session_idle_ttl <= 0:
+            return 0
+        for guild_id in self.guild_queue_manager.get_guild_ids():
+            if guild_id not in self.guild_contexts:
+                self.get_guild_context(guild_id)
+
+        now = time.monotonic()
+        # Before the bot is ready its guild cache is empty, every guild would look gone
+        ready = self.bot.is_ready()
+        idle_guild_ids = [
+            guild_id for guild_id, context in self.guild_contexts.items()
+            if context.voice_client is None and (now - context.last_active >= self.session_idle_ttl or (ready and context.guild is None))
+        ]
+        for guild_id in idle_guild_ids:
+            try:
+                self.guild_queue_manager.discard_guild_queue_by_id(guild_id)
+                self.close_guild_context(guild_id)
+            except Exception as e:
+                print(f"Error closing idle session of guild {guild_id}: {e}")
+        if idle_guild_ids:
+            PlaybackMetrics().increment("sessions_reaped", len(idle_guild_ids))
+        return len(idle_guild_ids)
+
+    async def run_session_reaper(self) -> None:
+        """Close idle sessions every SESSION_REAP_INTERVAL seconds, until cancelled."""
+        if self.session_idle_ttl <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.session_reap_interval)
+            self.reap_idle_sessions()
+
+    def get_session_stats(self) -> dict:
+        """
+        Get the number of live guild sessions and the memory held by their queues.
+
+        Returns:
+            dict: The sessions, how many are connected to voice, their queued songs, estimated bytes and the sessions reaped so far.
+        """
+        contexts = list(self.guild_contexts.values())
+        return {
+            "sessions": len(contexts),
+            "connected": sum(1 for context in contexts if context.voice_client is not None),
+            "queued": sum(len(context.guild_queue.queue) for context in contexts),
+            "bytes": sum(context.memory_bytes() for context in contexts),
+            "reaped": PlaybackMetrics().get_counter("sessions_reaped"),
+        }
+
+    def _get_audio_player(self, context: GuildContext, voice_client: discord.VoiceClient):
+        """Get the audio player of a guild for the voice client, creating it if the voice client changed."""
+        context.audio_player = self.guild_audio_player_manager.get_audio_player_by_id(context.guild_id, voice_client, self._song_end_callback)
+        return context.audio_player
+
     #Queue Management
     def get_guild_queue(self, guild_id) -> list:
         """
@@ -22,7 +153,7 @@ class MusicManager:
         Returns:
             queue: The queue for the specified guild.
         """
-        return self.guild_queue_manager.get_guild_queue_by_id(guild_id).queue
+        return self.get_guild_context(guild_id).guild_queue.queue
 
     def clear_queue(self, guild_id) -> bool:
         """
@@ -35,7 +166,11 @@ class MusicManager:
             bool: True if the guild queue was successfully cleared, False otherwise.
         """
         try:
+            context = self.get_guild_context(guild_id)
             self.guild_queue_manager.clear_guild_queue_by_id(guild_id)
+            self._refresh_prefetch(guild_id)
+            if context.audio_player is not None:
+                context.audio_player.discard_prepared()
             return True
         except Exception as e:
             print(f"Error clearing guild queue: {e}")
@@ -51,11 +186,159 @@ class MusicManager:
             position (int, optional): The position in the queue to add the item to. Defaults to None.
         """
         try:
-            self.guild_queue_manager.get_guild_queue_by_id(guild_id)
+            context = self.get_guild_context(guild_id)
+            context.touch()
             self.guild_queue_manager.add_item_to_guild_queue_by_id_end(guild_id, queue_item)
+            # Only the head of the queue keeps its YouTube object, the rest is rebuilt when it gets close
+            if len(context.guild_queue.queue) > max(self.queue_prefetcher_manager.depth, 1):
+                queue_item.release()
+            self._refresh_prefetch(guild_id)
         except Exception as e:
             print(f"Error adding item to queue: {e}")
 
+    def remove_item_from_queue(self, guild_id, index: int) -> QueueItem:
+        """
+        Remove an item from the queue of a specific guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+            index (int): The index of the item in the queue, 0 is the next song.
+
+        Returns:
+            QueueItem: The removed item, or None if the index is out of range.
+        """
+        try:
+            self.get_guild_context(guild_id)
+            queue_item = self.guild_queue_manager.remove_item_from_guild_queue_by_id(guild_id, index)
+        except IndexError as e:
+            print(f"Error removing item from queue: {e}")
+            return None
+        self._queue_reordered(guild_id)
+        return queue_item
+
+    def move_item_in_queue(self, guild_id, from_index: int, to_index: int) -> bool:
+        """
+        Move an item to another position in the queue of a specific guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+            from_index (int): The index of the item to move, 0 is the next song.
+            to_index (int): The index the item should end up at.
+
+        Returns:
+            bool: True if the item was moved, False if an index is out of range.
+        """
+        try:
+            self.get_guild_context(guild_id)
+            self.guild_queue_manager.move_item_in_guild_queue_by_id(guild_id, from_index, to_index)
+        except IndexError as e:
+            print(f"Error moving item in queue: {e}")
+            return False
+        self._queue_reordered(guild_id)
+        return True
+
+    def shuffle_queue(self, guild_id) -> bool:
+        """
+        Shuffle the queue of a specific guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            bool: True if the queue was shuffled, False if it is empty.
+        """
+        if self.get_guild_context(guild_id).guild_queue.is_empty():
+            return False
+        self.guild_queue_manager.shuffle_guild_queue_by_id(guild_id)
+        self._queue_reordered(guild_id)
+        return True
+
+    def _queue_reordered(self, guild_id) -> None:
+        """
+        Re-point the prefetcher at the new head of the queue, and stop the source started for the
+        old next song if it is no longer next.
+
+        Parameters:
+            guild_id (int): The ID of the guild whose queue changed.
+        """
+        self._refresh_prefetch(guild_id)
+        context = self.get_guild_context(guild_id)
+        audio_player = context.audio_player
+        if audio_player is None:
+            return
+        guild_queue = context.guild_queue
+        if guild_queue.is_empty() or not audio_player.is_prepared(guild_queue.queue[0]):
+            audio_player.discard_prepared()
+
+    def stream_items_to_queue(self, guild_id, item_pages, ctx: commands.Context) -> asyncio.Task:
+        """
+        Keep adding items to the queue of a guild in the background, one page at a time.
+        If the guild is connected but idle when a page is added, for instance because the items queued
+        before it could not be played, playback is started again.
+
+        Parameters:
+            guild_id (int): The ID of the guild to add the items to.
+            item_pages: An async iterable yielding lists of items (tracks, videos, queries).
+            ctx (commands.Context): The context of the command that requested the items.
+
+        Returns:
+            asyncio.Task: The task adding the items. Clearing the queue cancels it.
+        """
+        async def produce():
+            try:
+                async for page in item_pages:
+                    for item in page:
+                        self.add_item_to_queue(guild_id, QueueItem(item, ctx))
+                    await self._play_if_idle(guild_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error streaming items to queue for guild {guild_id}: {e}")
+
+        task = asyncio.create_task(produce())
+        self.guild_queue_manager.add_producer_by_id(guild_id, task)
+        return task
+
+    def _refresh_prefetch(self, guild_id) -> None:
+        """
+        Let the prefetcher know the queue of a guild changed so it can resolve the new head of the queue.
+
+        Parameters:
+            guild_id (int): The ID of the guild whose queue changed.
+        """
+        if self.queue_prefetcher_manager.depth <= 0:
+            return
+        try:
+            context = self.get_guild_context(guild_id)
+            context.prefetcher.refresh(context.guild_queue.queue)
+        except Exception as e:
+            print(f"Error refreshing prefetch for guild {guild_id}: {e}")
+
+    def get_audio_cpu_stats(self, guild_id) -> dict:
+        """
+        Get the CPU used per playback mode (Opus passthrough, ffmpeg Opus, PCM) for a guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            dict: The songs, audio seconds and CPU percentages per playback mode.
+        """
+        return self.guild_audio_player_manager.get_cpu_stats_by_id(guild_id)
+
+    def get_prefetch_stats(self, guild_id) -> dict:
+        """
+        Get the prefetch hit/miss counts for a guild.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            dict: The hits, misses and pending prefetches for the guild.
+        """
+        self.get_guild_context(guild_id)
+        return self.queue_prefetcher_manager.get_stats_by_id(guild_id)
+
     async def play_queue_in_channel(self, guild_id: int, channel_id: int) -> bool:
         """
         An asynchronous function that adds an item to the queue and plays it in the voice channel.
@@ -65,15 +348,41 @@ class MusicManager:
             channel_id (int): The ID of the channel to play the item in.
 
         Returns:
-            bool: True if the item was successfully added and played, False otherwise.
+            bool: True if playback of the next item was started, False otherwise (including when something is already playing).
         """
         try:
             vc: discord.VoiceClient = await self._connect_to_voice_channel(guild_id, channel_id)
             if vc is not None:
-                if not vc.is_playing():
-                    await self._play_next_song(guild_id, vc)
+                context = self.get_guild_context(guild_id)
+                async with context.playback_lock:
+                    # Anything but idle means a song is playing, paused or being started, the new items wait their turn
+                    if context.state is PlaybackState.IDLE and not vc.is_playing():
+                        return await self._play_next_song(guild_id, vc)
         except Exception as e:
             print(f"Error adding item to queue: {e}")
+        return False
+
+    async def _play_if_idle(self, guild_id: int) -> bool:
+        """
+        Start the next item of a guild if it is connected, nothing is playing and its queue is not empty.
+        Does not connect, unlike play_queue_in_channel.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            bool: True if playback of the next item was started.
+        """
+        context = self.guild_contexts.get(guild_id)
+        if context is None or context.voice_client is None:
+            return False
+        async with context.playback_lock:
+            voice_client = context.voice_client
+            if self.guild_contexts.get(guild_id) is not context or voice_client is None:
+                return False
+            if context.state is PlaybackState.IDLE and not voice_client.is_playing() and not context.guild_queue.is_empty():
+                return await self._start_next_song(context, voice_client)
+        return False
 
     def get_current_song(self, guild_id) -> str:
         """
@@ -85,7 +394,7 @@ class MusicManager:
         Returns:
             str: The current song for the specified guild.
         """
-        return self.guild_queue_manager.get_current_song_by_id(guild_id)
+        return self.get_guild_context(guild_id).guild_queue.get_current_song()
 
     def _set_current_song(self, guild_id, queue_item: QueueItem) -> None:
         """
@@ -101,17 +410,90 @@ class MusicManager:
         self.guild_queue_manager.set_current_song_by_id(guild_id, queue_item)
     
     #Helpers for play
-    def _play_stream(self, guild_id, voice_client, stream_url) -> None:
+    async def _play_queue_item(self, guild_id, voice_client, queue_item: QueueItem) -> bool:
+        """
+        Play a queue item from the Opus frame store or the on-disk audio cache when it is there, from its stream URL otherwise.
+        A stored copy that cannot be opened (evicted since it was looked up, or unreadable) falls back to the next one,
+        and finally to resolving the stream.
+
+        Parameters:
+            guild_id (int): The ID of the guild where the item will be played.
+            voice_client (discord.VoiceClient): The voice client to play the item with.
+            queue_item (QueueItem): The item, with pre-encoded frames, a cached file or a resolved stream URL.
+
+        Returns:
+            bool: True if the item started playing.
+        """
+        dap = self._get_audio_player(self.get_guild_context(guild_id), voice_client)
+        if dap.play_prepared(queue_item):
+            PlaybackMetrics().increment("warm_transitions")
+        elif not await self._play_cold(guild_id, voice_client, dap, queue_item):
+            return False
+        queue_item.record_play()
+
+        duration_seconds = queue_item.get_duration_seconds()
+        if duration_seconds:
+            dap.watch_for_end(duration_seconds, self._prepare_next_song)
+        return True
+
+    async def _play_cold(self, guild_id, voice_client, dap, queue_item: QueueItem) -> bool:
+        """Start a queue item from the first of its Opus frames, cached file or stream URL that opens."""
+        if queue_item.opus_frames is not None:
+            if dap.play_opus_frames(*queue_item.opus_frames):
+                return True
+            print(f"Could not open the Opus frames of {queue_item} in guild {guild_id}, falling back")
+            queue_item.opus_frames = None
+            queue_item.load_cached_audio()
+        if queue_item.audio_file is not None:
+            if dap.play_file(queue_item.audio_file.path, queue_item.audio_file.audio_codec):
+                return True
+            print(f"Could not open the cached audio of {queue_item} in guild {guild_id}, falling back")
+            queue_item.audio_file = None
+        stream_url = await queue_item.get_stream_url()
+        return bool(stream_url) and self._play_stream(guild_id, voice_client, stream_url, queue_item.get_audio_codec())
+
+    async def _prepare_next_song(self, guild_id, voice_client) -> None:
+        """
+        Start the source of the item at the head of the queue while the current one finishes,
+        so it can be swapped in without waiting for ffmpeg when the current one ends.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+            voice_client: The voice client playing the current item.
+        """
+        context = self.guild_contexts.get(guild_id)
+        if context is None:
+            return
+        quild_queue = context.guild_queue
+        if len(quild_queue.queue) == 0:
+            return
+        next_song: QueueItem = quild_queue.queue[0]
+        if next_song.is_failed():
+            return
+
+        dap = self._get_audio_player(context, voice_client)
+        if next_song.load_opus_frames() is not None:
+            dap.prepare_opus_frames(next_song, *next_song.opus_frames)
+        elif next_song.load_cached_audio() is not None:
+            dap.prepare_file(next_song, next_song.audio_file.path, next_song.audio_file.audio_codec)
+        else:
+            stream_url = await next_song.get_stream_url()
+            # The queue may have changed while resolving
+            if stream_url and quild_queue.queue and quild_queue.queue[0] is next_song:
+                dap.prepare_stream(next_song, stream_url, next_song.get_audio_codec())
+
+    def _play_stream(self, guild_id, voice_client, stream_url, audio_codec=None) -> bool:
         """
         Determine whether to play from a local file or stream, and get the appropriate source
         song_to_play: str - The path or stream of the song to be played
         guild_id: int - The ID of the guild where the song will be played
         voice_client: VoiceClient - The client handling voice connections
         song_info: dict - Information about the song being played
+        audio_codec: str - The codec of the stream, Opus streams are played without re-encoding
         """
-        dap = self.guild_audio_player_manager.get_audio_player_by_id(guild_id, voice_client, self._song_end_callback)
+        dap = self._get_audio_player(self.get_guild_context(guild_id), voice_client)
 
-        dap.play_stream(stream_url)
+        return dap.play_stream(stream_url, audio_codec)
 
     async def _song_end_callback(self, guild_id, voice_client, error=None) -> None:
         """
@@ -125,32 +507,37 @@ class MusicManager:
         Returns:
             None
         """
-        if error:
-            print(error)
-            return
-        
-        quild_queue = self.guild_queue_manager.get_guild_queue_by_id(guild_id)
-        if len(quild_queue.queue) == 0:
+        context = self.guild_contexts.get(guild_id)
+        if context is None:
+            # The session was closed, the song was stopped on purpose
             return
-        
-        stream_url = None
-        try:
-            while stream_url is None:
-                next_song: QueueItem = self.guild_queue_manager.pop_item_from_guild_queue_by_id(guild_id, 0)
-
-                if next_song:
-                    stream_url = await next_song.get_stream_url()
-                break
-
-            self._play_stream(guild_id, voice_client, stream_url)
-            self._set_current_song(guild_id, next_song)
-        except Exception as e:
-            print(f"Error in song_end_callback to play next song: {e}")
+        context.touch()
+        async with context.playback_lock:
+            if self.guild_contexts.get(guild_id) is not context or voice_client.is_playing():
+                # Closed, or another song was started while this one was ending
+                return
+            # Nothing is playing until the next song starts, a restart should not play this one again
+            self._set_current_song(guild_id, None)
+            if error:
+                print(error)
+                context.transition(PlaybackState.IDLE)
+                return
+
+            if len(context.guild_queue.queue) == 0:
+                context.transition(PlaybackState.IDLE)
+                return
+
+            song_ended_at = time.perf_counter()
+            try:
+                if await self._start_next_song(context, voice_client):
+                    PlaybackMetrics().observe("transition_gap_seconds", time.perf_counter() - song_ended_at)
+            except Exception as e:
+                print(f"Error in song_end_callback to play next song: {e}")
 
     #Playback
-    async def _play_next_song(self, guild_id: int, voice_client: discord.VoiceClient) -> None:
+    async def _play_next_song(self, guild_id: int, voice_client: discord.VoiceClient) -> bool:
         """
-        Attempts to play the next song in the queue for a given guild.
+        Attempts to play the next song in the queue for a given guild. The playback lock of the guild must be held.
 
         Parameters:
         - guild_id: The ID of the guild where the song will be played.
@@ -159,23 +546,78 @@ class MusicManager:
         Returns:
         - True if a song was successfully started. False otherwise.
         """
-        quild_queue = self.guild_queue_manager.get_guild_queue_by_id(guild_id)
+        context = self.get_guild_context(guild_id)
+        context.touch()
+        quild_queue = context.guild_queue
         if len(quild_queue.queue) == 0:
             raise Exception("No songs in queue")
         
-        while True:
-            next_song: QueueItem = self.guild_queue_manager.pop_item_from_guild_queue_by_id(guild_id, 0)
+        return await self._start_next_song(context, voice_client)
+
+    async def _start_next_song(self, context: GuildContext, voice_client: discord.VoiceClient) -> bool:
+        """
+        Pop the next playable item of a guild and start it, moving the guild through resolving to playing,
+        or back to idle if nothing could be started. An item that resolves but fails to start is skipped
+        for the one after it. The playback lock of the guild must be held.
+
+        Parameters:
+            context (GuildContext): The session of the guild.
+            voice_client (discord.VoiceClient): The voice client to play the item with.
+
+        Returns:
+            bool: True if a song was started.
+        """
+        context.transition(PlaybackState.RESOLVING)
+        started = False
+        try:
+            while not started:
+                next_song = await self._pop_next_playable(context.guild_id)
+                if next_song is None:
+                    break
+                started = await self._play_queue_item(context.guild_id, voice_client, next_song)
+                if not started:
+                    print(f"Could not start {next_song} in guild {context.guild_id}, skipping it")
+        except BaseException:
+            context.transition(PlaybackState.IDLE)
+            raise
+        if not started:
+            context.transition(PlaybackState.IDLE)
+            return False
+
+        self._set_current_song(context.guild_id, next_song)
+        context.transition(PlaybackState.PLAYING)
+        return True
 
-            if next_song:
-                stream_url = await next_song.get_stream_url()
-            break
+    async def _pop_next_playable(self, guild_id: int) -> QueueItem:
+        """
+        Pops items from the head of the queue until one is stored on disk or resolves to a stream URL.
+        Items known to be unplayable are skipped without resolving them again.
+
+        Parameters:
+            guild_id (int): The ID of the guild whose queue to pop from.
 
-        self._play_stream(guild_id, voice_client, stream_url)
-        self._set_current_song(guild_id, next_song)
+        Returns:
+            QueueItem: The item to play, or None if nothing in the queue is playable.
+        """
+        context = self.get_guild_context(guild_id)
+        quild_queue = context.guild_queue
+        while len(quild_queue.queue) > 0:
+            next_song: QueueItem = self.guild_queue_manager.pop_item_from_guild_queue_by_id(guild_id, 0)
+            self._refresh_prefetch(guild_id)
+            if next_song is None:
+                continue
+
+            context.prefetcher.record_transition(next_song)
+            if next_song.load_opus_frames() is not None or next_song.load_cached_audio() is not None:
+                return next_song
+            stream_url = await next_song.get_stream_url()
+            if stream_url:
+                return next_song
+            print(f"Skipping {next_song} in guild {guild_id}: {next_song.failure_reason.value if next_song.failure_reason else 'no stream'}")
+        return None
     
     def get_guild_voice_client(self, guild_id: int) -> discord.VoiceClient:
-        guild = self.bot.get_guild(guild_id)
-        return guild.voice_client
+        return self.get_guild_context(guild_id).voice_client
     
     def _stop_audio_player(self, guild_id: int) -> bool:
         """
@@ -216,9 +658,12 @@ class MusicManager:
             bool: True if the playback was successfully paused, False otherwise.
         """
         try:
-            if self.get_guild_voice_client(guild_id):
-                self.guild_audio_player_manager.pause_audio_player_by_id(guild_id)
-                return True
+            context = self.get_guild_context(guild_id)
+            if context.voice_client and context.state is PlaybackState.PLAYING and context.audio_player is not None:
+                if context.audio_player.pause():
+                    context.transition(PlaybackState.PAUSED)
+                    return True
+            return False
         except Exception as e:
             print(f"Error pausing playback for guild {guild_id}: {e}")
             return False
@@ -234,8 +679,12 @@ class MusicManager:
             bool: True if playback was successfully resumed, False otherwise.
         """
         try:
-            if self.get_guild_voice_client(guild_id):
-                return self.guild_audio_player_manager.resume_audio_player_by_id(guild_id)
+            context = self.get_guild_context(guild_id)
+            if context.voice_client and context.state is PlaybackState.PAUSED and context.audio_player is not None:
+                if context.audio_player.resume():
+                    context.transition(PlaybackState.PLAYING)
+                    return True
+            return False
         except Exception as e:
             print(f"Error resuming playback for guild {guild_id}: {e}")
             return False
@@ -257,6 +706,80 @@ class MusicManager:
             print(f"Error skipping song for guild {guild_id}: {e}")
             return False
         
+    #Listeners
+    def update_listeners(self, guild_id: int, before_channel=None, after_channel=None) -> None:
+        """
+        Update the number of people in the voice channel of the bot after a member joined, left or moved.
+        When the last one leaves playback is paused, and the bot disconnects EMPTY_CHANNEL_GRACE_SECONDS later
+        unless someone comes back, in which case playback resumes on the same connection with the same queue.
+        The channel is only counted when the bot joins or moves, every other event adds or removes one.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+            before_channel (discord.VoiceChannel, optional): The channel the member left.
+            after_channel (discord.VoiceChannel, optional): The channel the member joined.
+        """
+        context = self.guild_contexts.get(guild_id)
+        if context is None:
+            return
+        voice_client = context.voice_client
+        if voice_client is None or voice_client.channel is None:
+            return
+
+        channel = voice_client.channel
+        if context.listener_channel_id != channel.id:
+            context.listener_channel_id = channel.id
+            context.listener_count = sum(1 for member in channel.members if not member.bot)
+        else:
+            if after_channel is not None and after_channel.id == channel.id:
+                context.listener_count += 1
+            if before_channel is not None and before_channel.id == channel.id:
+                context.listener_count -= 1
+
+        if context.listener_count > 0:
+            if context.empty_channel_task is None:
+                return
+            context.cancel_empty_channel_timer()
+            PlaybackMetrics().increment("reconnects_avoided")
+            if context.paused_when_empty:
+                context.paused_when_empty = False
+                self.resume_playback(guild_id)
+        elif context.empty_channel_task is None:
+            context.paused_when_empty = self.pause_playback(guild_id)
+            context.empty_channel_task = asyncio.create_task(self._disconnect_when_empty(guild_id))
+            PlaybackMetrics().increment("empty_channel_lingers")
+
+    def recount_listeners(self, guild_id: int) -> None:
+        """
+        Count the people in the voice channel of the bot again, after the bot itself joined or moved.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+        """
+        context = self.guild_contexts.get(guild_id)
+        if context is None:
+            return
+        context.listener_channel_id = None
+        self.update_listeners(guild_id)
+
+    async def _disconnect_when_empty(self, guild_id: int) -> None:
+        """
+        Disconnect from a guild once its voice channel has been empty for EMPTY_CHANNEL_GRACE_SECONDS.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+        """
+        try:
+            await asyncio.sleep(self.empty_channel_grace)
+        except asyncio.CancelledError:
+            return
+        context = self.guild_contexts.get(guild_id)
+        if context is None:
+            return
+        context.empty_channel_task = None
+        if context.listener_count <= 0:
+            await self.disconnect_from_guild(guild_id)
+
     #Connections
     async def _connect_to_voice_channel(self, guild_id:int, voice_channel_id:int) -> discord.VoiceClient:
         """
@@ -270,14 +793,20 @@ class MusicManager:
             discord.VoiceClient: A reference to the VoiceClient object representing the connection.
         """
         
-        guild: discord.Guild = self.bot.get_guild(guild_id)
-        if not guild.voice_client:
-            try:
-                voice_channel = guild.get_channel(voice_channel_id)
-                return await self.voice_client_connecter.connect_to_voice_channel(voice_channel)
-            except Exception as e:
-                print(f"Error connecting to voice channel: {e}")
-        return guild.voice_client
+        context = self.get_guild_context(guild_id)
+        context.touch()
+        async with context.voice_lock:
+            guild: discord.Guild = context.guild
+            if not guild.voice_client:
+                try:
+                    voice_channel = guild.get_channel(voice_channel_id)
+                    voice_client = await self.voice_client_connecter.connect_to_voice_channel(voice_channel)
+                    if voice_client is not None:
+                        self.guild_queue_manager.record_voice_channel_by_id(guild_id, voice_channel_id)
+                    return voice_client
+                except Exception as e:
+                    print(f"Error connecting to voice channel: {e}")
+            return guild.voice_client
 
     async def join_voice_channel(self, guild_id, voice_channel_id) -> None:
         """
@@ -310,7 +839,11 @@ class MusicManager:
             guild: discord.Guild = self.bot.get_guild(guild_id)
             self.clear_queue(guild_id)
             self.stop_playback(guild_id)
+            self.guild_queue_manager.record_voice_channel_by_id(guild_id, None)
             await self.voice_client_connecter.disconnect_from_guild(guild.voice_client)
+            # The song that was playing is journaled too, a restart should not bring it back
+            self.guild_queue_manager.discard_guild_queue_by_id(guild_id)
+            self.close_guild_context(guild_id)
             return True
         except Exception as e:
             print(f"Error disconnecting from voice channel for guild {guild_id}: {e}")
@@ -0,0 +1,64 @@
+from threading import Lock
+
+
+class PlaybackMetrics:
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.counters = {}
+                cls._instance.observations = {}
+        return cls._instance
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """
+        Increment a named counter.
+
+        Parameters:
+            name (str): The name of the counter.
+            amount (int, optional): The amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Record a single observation (a duration, a size...) for a named metric.
+
+        Parameters:
+            name (str): The name of the metric.
+            value (float): The observed value.
+        """
+        with self._lock:
+            observation = self.observations.setdefault(name, {"count": 0, "total": 0.0, "last": 0.0, "max": 0.0})
+            observation["count"] += 1
+            observation["total"] += value
+            observation["last"] = value
+            observation["max"] = max(observation["max"], value)
+
+    def get_counter(self, name: str) -> int:
+        """Return the current value of a counter, 0 if it was never incremented."""
+        return self.counters.get(name, 0)
+
+    def get_average(self, name: str) -> float:
+        """Return the average of all observations for a metric, 0.0 if there are none."""
+        observation = self.observations.get(name)
+        if not observation or observation["count"] == 0:
+            return 0.0
+        return observation["total"] / observation["count"]
+
+    def snapshot(self) -> dict:
+        """
+        Return a copy of every counter and observation.
+
+        Returns:
+            dict: {"counters": {...}, "observations": {...}}
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "observations": {name: dict(values) for name, values in self.observations.items()},
+            }
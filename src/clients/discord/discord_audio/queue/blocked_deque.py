@@ -0,0 +1,185 @@
+import random
+from collections import deque
+from itertools import chain, islice
+from typing import Any, Iterator
+
+# Blocks are split in two once they grow past twice this size.
+BLOCK_SIZE = 512
+
+
+class BlockedDeque:
+    """
+    A list-like sequence stored as a list of deques of at most 2 * BLOCK_SIZE items each,
+    with a Fenwick tree over the block lengths to find the block holding a position.
+
+    Appending and popping at the head touch a single block, inserting, removing or reading
+    at a position costs O(log(n / BLOCK_SIZE) + BLOCK_SIZE), where a plain list shifts every item.
+    Only creating or dropping a block rebuilds the tree, once per BLOCK_SIZE appends or pops.
+    """
+
+    def __init__(self, items=()):
+        self._blocks: list[deque] = []
+        self._tree: list[int] = [0]
+        self._size = 0
+        self._extend(items)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self._blocks)
+
+    def __repr__(self) -> str:
+        return f"BlockedDeque({list(self)!r})"
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step != 1:
+                return list(self)[index]
+            if start >= stop:
+                return []
+            return list(islice(self._iter_from(start), stop - start))
+        block, offset = self._locate(self._normalize(index))
+        return self._blocks[block][offset]
+
+    def append(self, item) -> None:
+        """Add an item to the end."""
+        if not self._blocks or len(self._blocks[-1]) >= BLOCK_SIZE:
+            self._blocks.append(deque([item]))
+            self._size += 1
+            self._rebuild()
+            return
+        self._blocks[-1].append(item)
+        self._size += 1
+        self._update(len(self._blocks) - 1, 1)
+
+    def popleft(self):
+        """
+        Remove and return the first item.
+
+        Raises:
+            IndexError: If the sequence is empty.
+        """
+        if self._size == 0:
+            raise IndexError('pop from an empty BlockedDeque')
+        item = self._blocks[0].popleft()
+        self._size -= 1
+        if self._blocks[0]:
+            self._update(0, -1)
+        else:
+            del self._blocks[0]
+            self._rebuild()
+        return item
+
+    def insert(self, index: int, item) -> None:
+        """Insert an item before the given position, out of range positions are clamped like list.insert."""
+        if index < 0:
+            index = max(0, index + self._size)
+        if index >= self._size:
+            self.append(item)
+            return
+        block, offset = self._locate(index)
+        self._blocks[block].insert(offset, item)
+        self._size += 1
+        if len(self._blocks[block]) > 2 * BLOCK_SIZE:
+            self._split(block)
+        else:
+            self._update(block, 1)
+
+    def pop(self, index: int = -1):
+        """
+        Remove and return the item at the given position.
+
+        Raises:
+            IndexError: If the position is out of range.
+        """
+        index = self._normalize(index)
+        if index == 0:
+            return self.popleft()
+        block, offset = self._locate(index)
+        item = self._blocks[block][offset]
+        del self._blocks[block][offset]
+        self._size -= 1
+        if self._blocks[block]:
+            self._update(block, -1)
+        else:
+            del self._blocks[block]
+            self._rebuild()
+        return item
+
+    def move(self, from_index: int, to_index: int) -> None:
+        """
+        Move the item at from_index so it ends up at to_index.
+
+        Raises:
+            IndexError: If either position is out of range.
+        """
+        to_index = self._normalize(to_index)
+        self.insert(to_index, self.pop(from_index))
+
+    def shuffle(self) -> None:
+        """Shuffle the items in place."""
+        items = list(self)
+        random.shuffle(items)
+        self.clear()
+        self._extend(items)
+
+    def clear(self) -> None:
+        """Remove every item."""
+        self._blocks = []
+        self._tree = [0]
+        self._size = 0
+
+    def _extend(self, items) -> None:
+        items = list(items)
+        for start in range(0, len(items), BLOCK_SIZE):
+            self._blocks.append(deque(items[start:start + BLOCK_SIZE]))
+        self._size += len(items)
+        self._rebuild()
+
+    def _normalize(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('BlockedDeque index out of range')
+        return index
+
+    def _iter_from(self, index: int) -> Iterator[Any]:
+        block, offset = self._locate(index)
+        yield from islice(self._blocks[block], offset, None)
+        for following in islice(self._blocks, block + 1, None):
+            yield from following
+
+    def _split(self, block: int) -> None:
+        items = self._blocks[block]
+        half = len(items) // 2
+        self._blocks[block:block + 1] = [deque(islice(items, half)), deque(islice(items, half, None))]
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, block: int, delta: int) -> None:
+        i = block + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> 'tuple[int, int]':
+        # Walk down the tree to the last block whose items all come before index
+        position = 0
+        step = 1 << (len(self._blocks).bit_length() - 1) if self._blocks else 0
+        while step:
+            following = position + step
+            if following < len(self._tree) and self._tree[following] <= index:
+                position = following
+                index -= self._tree[following]
+            step >>= 1
+        return position, index
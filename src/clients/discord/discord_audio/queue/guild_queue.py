@@ -1,9 +1,11 @@
 from typing import Any, Optional
+from clients.discord.discord_audio.queue.blocked_deque import BlockedDeque
 
 
 class GuildQueue:
     def __init__(self):
-        self.queue:list = []
+        # Indexes and slices like a list, without shifting every item when the head is popped
+        self.queue: BlockedDeque = BlockedDeque()
         self.current_song = None
 
     def __str__(self):
@@ -56,9 +58,28 @@ class GuildQueue:
         except IndexError as e:
             raise IndexError(f'Index {index} is out of range for queue with length {len(self.queue)}') from e
 
-    
+    def move_item(self, from_index: int, to_index: int) -> None:
+        """
+        Move an item to another position in the queue.
+
+        Parameters:
+            from_index (int): The index of the item to move.
+            to_index (int): The index the item should end up at.
+
+        Raises:
+            IndexError: If either index is out of range for the queue.
+        """
+        try:
+            self.queue.move(from_index, to_index)
+        except IndexError as e:
+            raise IndexError(f'Cannot move {from_index} to {to_index} in queue with length {len(self.queue)}') from e
+
+    def shuffle(self) -> None:
+        """Shuffle the items waiting in the queue, the current song is not affected."""
+        self.queue.shuffle()
+
     def clear_queue(self) -> None: 
-        self.queue = []
+        self.queue.clear()
     
     def is_empty(self) -> bool:
         if len(self.queue) > 0:
@@ -1,7 +1,10 @@
 from threading import Lock
+from asyncio import Task
 from typing import Optional, Dict
+from clients.discord.discord_audio.queue.blocked_deque import BlockedDeque
 from clients.discord.discord_audio.queue.guild_queue import GuildQueue
 from clients.discord.discord_audio.queue.queue_item import QueueItem
+from clients.discord.discord_audio.queue.queue_journal import QueueJournal
 
 class GuildQueueManager():
     _instance = None
@@ -12,29 +15,114 @@ class GuildQueueManager():
             if cls._instance is None:
                 cls._instance = super().__new__(cls)
                 cls._instance.song_queues = {}
+                cls._instance.producer_tasks = {}
+                cls._instance.journal = QueueJournal()
         return cls._instance
 
     def get_guild_queue_by_id(self, guild_id: int) -> GuildQueue:
         """Ensure a guild queue exists for the given guild_id, or creates one."""
         return self.song_queues.setdefault(guild_id, GuildQueue())
 
+    def get_guild_ids(self) -> 'list[int]':
+        """Return the IDs of every guild with a queue, including queues restored from the journal."""
+        return list(self.song_queues)
+
     def pop_item_from_guild_queue_by_id(self, guild_id: int, index: int) -> QueueItem:
         """Remove and return an item by index from the guild's queue."""
-        return self.song_queues[guild_id].pop_item(index)
-    
+        item = self.song_queues[guild_id].pop_item(index)
+        self._journal(guild_id, "pop", index)
+        return item
+
     def add_item_to_guild_queue_by_id_end(self, guild_id: int, item: QueueItem) -> None:
         """Add an item to the guild's queue at the specified position."""
         self.song_queues[guild_id].add_item_to_end(item)
+        self._journal(guild_id, "add", item.to_record())
+
+    def remove_item_from_guild_queue_by_id(self, guild_id: int, index: int) -> QueueItem:
+        """Remove and return an item anywhere in the guild's queue."""
+        item = self.song_queues[guild_id].pop_item(index)
+        self._journal(guild_id, "pop", index)
+        return item
+
+    def move_item_in_guild_queue_by_id(self, guild_id: int, from_index: int, to_index: int) -> None:
+        """Move an item to another position in the guild's queue."""
+        self.song_queues[guild_id].move_item(from_index, to_index)
+        self._journal(guild_id, "move", [from_index, to_index])
+
+    def shuffle_guild_queue_by_id(self, guild_id: int) -> None:
+        """Shuffle the guild's queue."""
+        self.song_queues[guild_id].shuffle()
+        self.snapshot_guild_queue_by_id(guild_id)
+
+    def add_producer_by_id(self, guild_id: int, task: Task) -> None:
+        """Track a background task that keeps adding items to the guild's queue, so clearing the queue stops it."""
+        producers: set = self.producer_tasks.setdefault(guild_id, set())
+        producers.add(task)
+        task.add_done_callback(producers.discard)
+
+    def cancel_producers_by_id(self, guild_id: int) -> None:
+        """Cancel every background task still adding items to the guild's queue."""
+        for task in self.producer_tasks.pop(guild_id, set()):
+            task.cancel()
 
     def clear_guild_queue_by_id(self, guild_id: int) -> None:
-        """Clear the guild's queue if it is not empty."""
+        """Clear the guild's queue if it is not empty, and stop anything still filling it."""
+        self.cancel_producers_by_id(guild_id)
         if len(self.song_queues[guild_id].queue) > 0:
             self.song_queues[guild_id].clear_queue()
+            self.snapshot_guild_queue_by_id(guild_id)
+
+    def discard_guild_queue_by_id(self, guild_id: int) -> None:
+        """Stop anything still filling the guild's queue, forget the queue and the song playing, and drop them from the journal."""
+        self.cancel_producers_by_id(guild_id)
+        self.song_queues.pop(guild_id, None)
+        self.journal.discard(guild_id)
+
+    def remove_guild_queue_by_id(self, guild_id: int) -> None:
+        """Stop anything still filling the guild's queue and forget the queue. The journal keeps what was in it."""
+        self.cancel_producers_by_id(guild_id)
+        self.song_queues.pop(guild_id, None)
 
     def set_current_song_by_id(self, guild_id: int, item: dict) -> None:
         """Set the current song for a guild based on item."""
         self.song_queues[guild_id].set_current_song(item)
+        self._journal(guild_id, "current", item.to_record() if item is not None else None)
 
     def get_current_song_by_id(self, guild_id: int):
         """Retrieve the current song for a guild."""
-        return self.song_queues[guild_id].get_current_song()
\ No newline at end of file
+        return self.song_queues[guild_id].get_current_song()
+
+    def record_voice_channel_by_id(self, guild_id: int, voice_channel_id: Optional[int]) -> None:
+        """Remember the voice channel a guild is playing in, so it can be rejoined after a restart."""
+        self._journal(guild_id, "voice", voice_channel_id)
+
+    def snapshot_guild_queue_by_id(self, guild_id: int) -> None:
+        """Write the whole queue of a guild to the journal, replacing the operations recorded before."""
+        guild_queue = self.song_queues[guild_id]
+        # Only the list is copied here, the items are serialised by the journal's writer thread
+        self.journal.snapshot(guild_id, list(guild_queue.queue), guild_queue.get_current_song())
+
+    def restore_from_journal(self) -> Dict[int, int]:
+        """
+        Rebuild the guild queues recorded in the journal, the song that was playing goes back to the head of its queue.
+
+        Returns:
+            Dict[int, int]: The voice channel each restored guild was playing in, for guilds that were connected.
+        """
+        voice_channels = {}
+        for guild_id, state in self.journal.load().items():
+            records = state["items"]
+            if state["current"] is not None:
+                records = [state["current"], *records]
+            guild_queue = self.get_guild_queue_by_id(guild_id)
+            guild_queue.queue = BlockedDeque(QueueItem.from_record(record) for record in records)
+            # Compacts the journal of the guild, and drops the current song that was just requeued
+            self.snapshot_guild_queue_by_id(guild_id)
+            if state["voice_channel_id"] is not None:
+                voice_channels[guild_id] = state["voice_channel_id"]
+            print(f"Restored {len(guild_queue.queue)} queued songs for guild {guild_id}")
+        return voice_channels
+
+    def _journal(self, guild_id: int, op: str, value=None) -> None:
+        if self.journal.record(guild_id, op, value):
+            self.snapshot_guild_queue_by_id(guild_id)
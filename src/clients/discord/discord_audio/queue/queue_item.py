@@ -1,119 +1,464 @@
-from typing import Union
+from typing import Union, Optional
+from enum import Enum
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import time
 from discord.ext import commands
 
 from services.youtube.youtube_service import YouTubeService
+from services.youtube.youtube_stream_cache import YouTubeStreamCache, CachedAudioStream
+from services.youtube.youtube_playlist_entry import YouTubePlaylistEntry
+from services.youtube.youtube_negative_cache import YouTubeNegativeCache, FailureReason
+from services.youtube.youtube_audio_cache import YouTubeAudioCache, CachedAudioFile
+from services.youtube.youtube_metadata_cache import YouTubeMetadataCache, VideoMetadata
+from services.youtube.youtube_search_cache import YouTubeSearchCache
+from services.services_utils.single_flight import SingleFlight
+from services.spotify.spotify_youtube_mapping import SpotifyYouTubeMapping
 
 from pytubefix import YouTube
 from services.spotify.tracks import SpotifyTrack
+from services.spotify.albums import SpotifyAlbumTrack
 
-executor = ThreadPoolExecutor(max_workers=5)
+from clients.discord.discord_audio.resolver_scheduler import ResolverScheduler, ResolvePriority
+from clients.discord.discord_audio.audio.opus_frame_store import OpusFrameStore
+
+class ResolutionDropped(Exception):
+    """Raised to the callers sharing a resolution when the prefetcher drops it before it started."""
+
+class SourceKind(Enum):
+    YOUTUBE = "youtube"  # The video id is known
+    SPOTIFY = "spotify"  # Mapped to a video through SpotifyYouTubeMapping, searched for otherwise
+    QUERY = "query"      # Searched for
 
 class QueueItem:
-    def __init__(self, source_object: 'Union[YouTube, SpotifyTrack]', ctx: commands.Context):
+    # Queues can hold thousands of items per guild, so an item only keeps ids and a few strings.
+    # The YouTube object is only built when the item is about to be played.
+    __slots__ = (
+        'kind', 'video_id', 'query', 'spotify_keys', 'title', 'duration_ms',
+        'guild_id', 'channel_id', 'requester_id', 'requester_name', 'target_kbps',
+        'yt_object', 'stream_url', 'audio_stream', 'audio_file', 'opus_frames', 'failure_reason',
+        'resolve_priority', '_resolve_task', '_pending_job', '_pending_wait', '_resolution_dropped',
+    )
+    # The fields written to the queue journal, everything else is rebuilt when the item is resolved.
+    RECORD_FIELDS = ('video_id', 'query', 'spotify_keys', 'title', 'duration_ms', 'guild_id', 'channel_id', 'requester_id', 'requester_name', 'target_kbps')
+
+    def __init__(self, source_object: 'Union[YouTube, YouTubePlaylistEntry, SpotifyTrack, SpotifyAlbumTrack, str]', ctx: commands.Context):
         """
-        Initializes a QueueItem object with the given source object and context.
+        Initializes a QueueItem from the given source object and context, keeping only what is needed to find it again.
         
         Parameters:
-            source_object (Union[YouTube, SpotifyTrack]): The source object associated with the queue item. Must be either a YouTube object or a SpotifyTrack object.
+            source_object (Union[YouTube, YouTubePlaylistEntry, SpotifyTrack, SpotifyAlbumTrack, str]): The source object associated with the queue item.
             ctx (commands.Context): The Discord context associated with the queue item.
         """
-        self.source_object = source_object
-        self.ctx = ctx
-        self.yt_object:YouTube = None
+        self.video_id: Optional[str] = None
+        self.query: Optional[str] = None
+        self.spotify_keys: tuple = ()
+        self.title: Optional[str] = None
+        self.duration_ms: Optional[int] = None
+        self.yt_object: YouTube = None
+
+        match source_object:
+            case YouTube():
+                self.kind = SourceKind.YOUTUBE
+                self.video_id = source_object.video_id
+                # Only what pytubefix already loaded, reading .title may hit the network
+                self.title = source_object._title
+                # Already built, so it is kept until release() is called
+                self.yt_object = source_object
+            case YouTubePlaylistEntry():
+                self.kind = SourceKind.YOUTUBE
+                self.video_id = source_object.video_id
+                self.title = source_object.title
+            case SpotifyTrack() | SpotifyAlbumTrack():
+                self.kind = SourceKind.SPOTIFY
+                self.spotify_keys = SpotifyYouTubeMapping.track_keys(source_object)
+                self.query = f"{source_object.artists[0].name} {source_object.name}"
+                self.title = f"{source_object.artists[0].name} - {source_object.name}"
+                self.duration_ms = source_object.duration_ms
+            case _:
+                self.kind = SourceKind.QUERY
+                self.query = str(source_object)
+
+        has_guild = ctx is not None and ctx.guild is not None
+        self.guild_id: Optional[int] = ctx.guild.id if has_guild else None
+        self.channel_id: Optional[int] = ctx.channel.id if ctx is not None else None
+        self.requester_id: Optional[int] = ctx.author.id if ctx is not None else None
+        # Kept for !queue, members who left are not in the member cache without the members intent
+        self.requester_name: Optional[str] = ctx.author.display_name if ctx is not None else None
+        self.target_kbps: Optional[int] = self._target_bitrate_kbps(ctx) if has_guild else None
+        self._reset_resolution()
+
+    def to_record(self) -> dict:
+        """
+        Returns:
+            dict: The item as plain JSON-serializable values, see from_record.
+        """
+        record = {field: getattr(self, field) for field in self.RECORD_FIELDS}
+        record['kind'] = self.kind.value
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> 'QueueItem':
+        """
+        Build an item back from to_record() output, without a command context.
+
+        Parameters:
+            record (dict): The values returned by to_record.
+
+        Returns:
+            QueueItem: The item, unresolved.
+        """
+        item = cls.__new__(cls)
+        item.kind = SourceKind(record['kind'])
+        for field in cls.RECORD_FIELDS:
+            setattr(item, field, record.get(field))
+        item.spotify_keys = tuple(tuple(key) for key in item.spotify_keys or ())
+        item.yt_object = None
+        item._reset_resolution()
+        return item
+
+    def _reset_resolution(self) -> None:
         self.stream_url = None
+        self.audio_stream: CachedAudioStream = None
+        self.audio_file: CachedAudioFile = None
+        self.opus_frames: tuple[str, str] = None
+        self.failure_reason: FailureReason = None
+        self.resolve_priority = ResolvePriority.FAR_FUTURE
+        self._resolve_task: asyncio.Task = None
+        # The resolver job, shared with items waiting for the same lookup, and what this item awaits of it
+        self._pending_job: asyncio.Future = None
+        self._pending_wait: asyncio.Future = None
+        self._resolution_dropped = False
 
     def __str__(self):
-        return f"{self.source_object}"
+        return self.title or self.query or f"https://www.youtube.com/watch?v={self.video_id}"
     
     def __repr__(self):
-        return f"{self.source_object}"
+        return f"QueueItem({self.kind.value}, {self})"
 
-    async def notify_user(self, message):
+    def release(self) -> None:
+        """
+        Drop the YouTube object of an item that will not be played soon, it is built again from the video id when needed.
+        An item whose stream is already resolved keeps it, so it does not have to be resolved again.
         """
-        Asynchronously sends a notification message in the context's channel.
+        if self.stream_url is None and (self._resolve_task is None or self._resolve_task.done()):
+            self.yt_object = None
 
-        Parameters:
-            message (str): The message to send to the channel from which the command was invoked.
+    def is_resolved(self) -> bool:
         """
-        try:
-            await self.ctx.send(message)
-        except Exception as e:
-            print(f"Failed to send message: {e}")
+        Returns:
+            bool: True if the stream URL has already been retrieved and has not expired, False otherwise.
+        """
+        if self.stream_url is None:
+            return False
+
+        stream_cache = YouTubeStreamCache()
+        expires_at = stream_cache.parse_expiry(self.stream_url)
+        if expires_at is not None and expires_at - stream_cache.expiry_margin <= time.time():
+            self.stream_url = None
+            self.audio_stream = None
+            return False
+        return True
+
+    def get_audio_codec(self) -> Optional[str]:
+        """
+        Returns:
+            str: The codec of the resolved audio stream (e.g. "opus"), or None if it is not known.
+        """
+        if self.audio_stream is None:
+            return None
+        return self.audio_stream.audio_codec
+
+    def is_failed(self) -> bool:
+        """
+        Returns:
+            bool: True if the item is known to be unplayable and should be skipped, False otherwise.
+        """
+        # Read again every time, so the reason goes away once the negative cache entry expires
+        self.failure_reason = self._known_failure()
+        return self.failure_reason is not None
+
+    def has_cached_audio(self) -> bool:
+        """
+        Returns:
+            bool: True if the audio of this item is in the on-disk audio cache or the Opus frame store, so it needs no resolution.
+        """
+        video_id = self._known_video_id()
+        return video_id is not None and (OpusFrameStore().contains(video_id) or YouTubeAudioCache().contains(video_id))
+
+    def load_opus_frames(self) -> Optional['tuple[str, str]']:
+        """
+        Look the item up in the Opus frame store, and remember the files to play it from.
+
+        Returns:
+            tuple[str, str]: The frames and index paths, or None on a miss.
+        """
+        video_id = self._known_video_id()
+        if video_id is not None:
+            self.opus_frames = OpusFrameStore().get(video_id)
+        return self.opus_frames
+
+    def load_cached_audio(self) -> Optional[CachedAudioFile]:
+        """
+        Look the item up in the on-disk audio cache, and remember the file to play it from.
+
+        Returns:
+            CachedAudioFile: The cached file, or None on a miss.
+        """
+        video_id = self._known_video_id()
+        if video_id is not None:
+            self.audio_file = YouTubeService().get_cached_audio_file(video_id)
+        return self.audio_file
 
-    async def log_request(self):
+    def get_duration_seconds(self) -> Optional[float]:
         """
-        Asynchronously logs the request for debugging or analytics, with detailed context info.
+        Returns:
+            float: The length of the item if it is known without a network request, None otherwise.
+        """
+        if self.opus_frames is not None:
+            return OpusFrameStore.get_duration_seconds(self.opus_frames[1])
+        if self.audio_stream is not None and self.audio_stream.duration_ms:
+            return self.audio_stream.duration_ms / 1000
+        return None
+
+    def record_play(self) -> None:
+        """
+        Count a play of this item. Items played often enough are downloaded to the audio cache in the background,
+        and the most played ones are then encoded into the Opus frame store.
+        """
+        video_id = self._known_video_id()
+        if video_id is None and self.audio_stream is not None:
+            video_id = self.audio_stream.video_id
+        if video_id is None:
+            return
+        plays = YouTubeService().record_play(video_id, self.audio_stream if self.audio_file is None else None)
+        if self.audio_file is not None:
+            OpusFrameStore().maybe_build(video_id, plays, self.audio_file.path)
+
+    async def get_metadata(self, complete: bool = False) -> VideoMetadata:
+        """
+        Return what is shown about this item (title, link, duration, thumbnail) without resolving its stream.
+
+        The metadata cache and what the item was queued with come first. YouTube is only asked for the video
+        details when the title is not known, or when `complete` is set and anything is missing. An item whose
+        video is not known yet (a search or an unmapped Spotify track) is shown as what was requested.
+
+        Parameters:
+            complete (bool, optional): Also get the duration, thumbnail and uploader, for an embed. Defaults to False.
+
+        Returns:
+            VideoMetadata: What is known about the item.
         """
-        log_message = f"Item requested by {self.ctx.author.display_name} in '{self.ctx.guild.name}' via channel '{self.ctx.channel.name}'."
-        print(log_message)
+        video_id = self._known_video_id()
+        known = VideoMetadata(video_id, self.title or self.query, self.duration_ms // 1000 if self.duration_ms else None)
+        if video_id is None:
+            return known
 
-    async def get_stream_url(self) -> str:
+        metadata_cache = YouTubeMetadataCache()
+        if self.yt_object is not None:
+            metadata_cache.put_youtube(self.yt_object)
+        metadata = metadata_cache.get(video_id)
+        if metadata is not None and (metadata.is_complete() or (not complete and metadata.title)):
+            return metadata
+        if not complete and known.title:
+            return known
+        fetched = await YouTubeService().get_video_metadata_async(video_id)
+        if fetched is None:
+            return metadata or known
+        # Kept on the item, so listing the queue again does not depend on the metadata cache still holding it
+        if self.title is None:
+            self.title = fetched.title
+        return fetched
+
+    async def get_stream_url(self, priority: ResolvePriority = ResolvePriority.NOW_PLAYING_NEXT) -> str:
         """
         Asynchronously retrieves the streaming URL for the source object.
 
         This function dynamically determines the type of the source object and delegates the stream retrieval
         to the appropriate method, handling SpotifyTrack and YouTube cases accordingly.
+        Concurrent callers (playback and the prefetcher) share a single resolution, which runs at the most
+        urgent priority any of them asked for.
+
+        Parameters:
+            priority (ResolvePriority, optional): How urgently the URL is needed. Defaults to NOW_PLAYING_NEXT.
 
         Returns:
             The streaming URL of the source object obtained by invoking the respective method.
         """
         try:
-            youtube_service = YouTubeService()
-            loop = asyncio.get_running_loop()
-            
-            if not self.yt_object:
-                await self._prepare_for_playback(youtube_service, loop)
-                self.stream_url:str = await loop.run_in_executor(executor, youtube_service.get_audio_stream, self.yt_object)
-            
+            if self.is_failed():
+                return None
+
+            while not self.is_resolved():
+                self.promote_resolution(priority)
+                if self._resolve_task is None or self._resolve_task.done():
+                    self._resolution_dropped = False
+                    self._resolve_task = asyncio.ensure_future(self._resolve())
+                try:
+                    await asyncio.shield(self._resolve_task)
+                    break
+                except ResolutionDropped:
+                    # The prefetcher gave up on this item, but this caller still needs it.
+                    continue
+
             if self.stream_url:
                 return self.stream_url
             
         except Exception as e:
             print(f"Failed to get stream URL: {e}")
 
-    async def _prepare_for_playback(self, youtube_service: YouTubeService, loop: asyncio.AbstractEventLoop):
-        match self.source_object:
-            case SpotifyTrack():
-                # Build the query for a Spotify track
-                query = f"{self.source_object.artists[0].name} {self.source_object.name}"
-            case str():
-                # Use the string directly as a query
-                query = self.source_object
-            case YouTube():
-                # Already a YouTube object, no need to search
-                self.yt_object = self.source_object
+    def cancel_pending_resolution(self) -> bool:
+        """
+        Drop the resolution of this item if its work is still waiting in the resolver scheduler.
+        Work that already started is left to finish.
+
+        Returns:
+            bool: True if the resolution was cancelled, False otherwise.
+        """
+        if self._resolve_task is None or self._resolve_task.done():
+            return False
+        if self._pending_job is not None and not ResolverScheduler().is_pending(self._pending_job):
+            return False
+        self._resolution_dropped = True
+        if self._pending_wait is not None:
+            # The job itself is only dropped once no other item waits for it
+            self._pending_wait.cancel()
+        self.resolve_priority = ResolvePriority.FAR_FUTURE
+        return True
+
+    def promote_resolution(self, priority: ResolvePriority) -> None:
+        """
+        Make the resolution of this item at least as urgent as the given priority.
+
+        Parameters:
+            priority (ResolvePriority): The new priority.
+        """
+        if priority >= self.resolve_priority:
+            return
+        self.resolve_priority = priority
+        if self._pending_job is not None:
+            ResolverScheduler().promote(self._pending_job, priority)
+
+    async def _run_resolver_step(self, func, *args, key=None):
+        # Items of any guild running a step with the same key share one resolver job, waiting for it takes no thread.
+        if self._resolution_dropped:
+            raise ResolutionDropped(f"Resolution of {self} was dropped")
+        submit = functools.partial(ResolverScheduler().submit, self.guild_id, self.resolve_priority, func, *args)
+        if key is None:
+            self._pending_job = self._pending_wait = submit()
+        else:
+            self._pending_job, self._pending_wait = SingleFlight().join(key, submit)
+        try:
+            return await self._pending_wait
+        except asyncio.CancelledError:
+            if self._resolution_dropped:
+                raise ResolutionDropped(f"Resolution of {self} was dropped")
+            raise
+        finally:
+            self._pending_job = None
+            self._pending_wait = None
+
+    def _known_video_id(self) -> Optional[str]:
+        # The video id if it can be known without a search, only looks at memory.
+        if self.video_id is not None:
+            return self.video_id
+        if self.yt_object is not None:
+            return self.yt_object.video_id
+        if self.kind is SourceKind.SPOTIFY:
+            return SpotifyYouTubeMapping().peek_video_id(self.spotify_keys)
+        return None
+
+    def _known_failure(self) -> Optional[FailureReason]:
+        # Only looks at memory, so it is cheap enough to call before every resolution attempt.
+        negative_cache = YouTubeNegativeCache()
+        video_id = self._known_video_id()
+        if video_id is not None:
+            return negative_cache.get_video_failure(video_id)
+        if self.query is not None:
+            return negative_cache.get_query_failure(self.query)
+        return None
+
+    @staticmethod
+    def _target_bitrate_kbps(ctx: commands.Context) -> Optional[int]:
+        # The channel the bot is playing in, or the one the requester is in if it has not joined yet
+        channel = None
+        if ctx.guild.voice_client is not None:
+            channel = ctx.guild.voice_client.channel
+        elif getattr(ctx.author, 'voice', None) is not None:
+            channel = ctx.author.voice.channel
+        if channel is None or not getattr(channel, 'bitrate', None):
+            return None
+        return channel.bitrate // 1000
+
+    async def _resolve(self) -> None:
+        youtube_service = YouTubeService()
+
+        if self.is_failed():
+            return
+
+        if not self.yt_object:
+            await self._prepare_for_playback(youtube_service)
+
+        if self.yt_object:
+            self.audio_stream = await self._run_resolver_step(
+                youtube_service.get_audio_stream_info, self.yt_object, self.target_kbps,
+                key=("audio_stream_info", self.yt_object.video_id, self.target_kbps)
+            )
+            self.stream_url = self.audio_stream.url if self.audio_stream else None
+
+        if self.stream_url:
+            self.failure_reason = None
+        else:
+            self._record_failure()
+
+    def _record_failure(self) -> None:
+        negative_cache = YouTubeNegativeCache()
+        query = self.query
+        video_id = self.yt_object.video_id if self.yt_object is not None else self.video_id
+
+        reason = None
+        if video_id is not None:
+            reason = negative_cache.get_video_failure(video_id)
+            if reason is None:
+                # is_failed reads the reason back from the negative cache, so it expires with the entry
+                reason = FailureReason.EXTRACTION_FAILED
+                negative_cache.record_video_failure(video_id, reason)
+        elif query is not None:
+            reason = negative_cache.get_query_failure(query)
+        reason = reason or FailureReason.EXTRACTION_FAILED
+
+        # Remember the query too, so re-queuing the same search skips the lookup entirely.
+        if query is not None:
+            negative_cache.record_query_failure(query, reason)
+        self.failure_reason = reason
+
+    async def _prepare_for_playback(self, youtube_service: YouTubeService):
+        if self.kind is SourceKind.SPOTIFY and self.video_id is None:
+            # A track that was resolved before skips the search entirely
+            mapping = SpotifyYouTubeMapping()
+            self.video_id = mapping.get_cached_video_id(self.spotify_keys)
+            if self.video_id is None:
+                self.video_id = await self._run_resolver_step(mapping.get_video_id, self.spotify_keys)
+
+        if self.video_id is not None:
+            # Only the id was kept, the YouTube object is built now that the item is about to be played.
+            # Built in a resolver job like the rest of the resolution, with no key: the object is not thread-safe.
+            self.yt_object = await self._run_resolver_step(
+                youtube_service.get_youtube_by_url, f"https://www.youtube.com/watch?v={self.video_id}"
+            )
+            if self.yt_object or self.kind is SourceKind.YOUTUBE:
                 return
-            case _:
-                query = None
 
         # If we have a query, run the search
-        if query:
-            yt_object = await loop.run_in_executor(
-                executor,
-                youtube_service.search_and_bind,
-                query,
-                1
+        if self.query:
+            # Only the search results are shared, every item builds its own YouTube object from them
+            search_results = await self._run_resolver_step(
+                youtube_service.perform_search, self.query, 1,
+                key=("search", YouTubeSearchCache.normalize_query(self.query), 1)
             )
+            yt_object = await self._run_resolver_step(youtube_service.bind_search_results, search_results)
             if yt_object:
                 self.yt_object = yt_object[0]
-
-#async def main():    
-#    import time
-#    start = time.perf_counter()
-#    item = QueueItem(YouTube("https://www.youtube.com/watch?v=dQw4w9WgXcQ"), None)
-#    try:
-#        result = await item.get_stream_url()
-#        print(result)
-#    except Exception as e:
-#        print(f"Failed to retrieve stream URL: {e}")
-#    finally:
-#        end = time.perf_counter()
-#        print(f"Time to complete: {end - start:0.4f} seconds")
-#
-#if __name__ == "__main__":
-#    loop = asyncio.new_event_loop()
-#    asyncio.set_event_loop(loop)  # Set the new event loop as the current loop
-#    loop.run_until_complete(main())
-#    loop.close()  # Properly close the loop after completion
\ No newline at end of file
+                self.video_id = self.yt_object.video_id
+                if self.kind is SourceKind.SPOTIFY:
+                    SpotifyYouTubeMapping().put(self.spotify_keys, self.video_id)
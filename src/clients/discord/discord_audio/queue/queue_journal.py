@@ -0,0 +1,238 @@
+import atexit
+import itertools
+import json
+import os
+import queue
+import threading
+from threading import Lock
+from typing import Any
+
+from services.services_utils.sqlite_store import SQLiteStore
+
+
+class QueueJournal:
+    """
+    Crash-safe record of every guild queue, so a restart or deploy does not lose them.
+
+    Every queue operation is appended to a journal table, and each guild is compacted into a snapshot
+    every QUEUE_SNAPSHOT_INTERVAL operations (and on clear or shuffle). The event loop only hands the
+    operation to a writer thread, which commits everything that piled up in a single transaction.
+    A snapshot costs the event loop a copy of the list of items, they are serialised by the writer thread.
+    load() replays the snapshots and the journal after them.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.enabled = os.getenv('QUEUE_JOURNAL', '1') != '0'
+        self.snapshot_interval = int(os.getenv('QUEUE_SNAPSHOT_INTERVAL', 500))
+        self.rejoin_voice = os.getenv('QUEUE_RESTORE_REJOIN', '1') != '0'
+        self.voice_channels: dict[int, int] = {}
+        self.written = 0
+        self.snapshots = 0
+        self._ops_since_snapshot: dict[int, int] = {}
+        self._pending = queue.SimpleQueue()
+        self._sequence = itertools.count(1)
+        self.store = None
+
+        if not self.enabled:
+            return
+        try:
+            self.store = SQLiteStore()
+            self.store.execute(
+                "CREATE TABLE IF NOT EXISTS queue_journal ("
+                "seq INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, op TEXT NOT NULL, value TEXT)"
+            )
+            self.store.execute(
+                "CREATE TABLE IF NOT EXISTS queue_snapshots ("
+                "guild_id INTEGER PRIMARY KEY, seq INTEGER NOT NULL, state TEXT NOT NULL)"
+            )
+            row = self.store.fetchone(
+                "SELECT MAX(seq) FROM (SELECT seq FROM queue_journal UNION ALL SELECT seq FROM queue_snapshots)"
+            )
+            self._sequence = itertools.count((row[0] or 0) + 1)
+        except Exception as e:
+            print(f"Error opening the queue journal, queues will not survive a restart: {e}")
+            self.enabled = False
+            self.store = None
+            return
+
+        threading.Thread(target=self._write_loop, name="queue-journal", daemon=True).start()
+        atexit.register(self.flush)
+
+    def record(self, guild_id: int, op: str, value: Any = None) -> bool:
+        """
+        Append an operation to the journal of a guild. Never blocks on the database.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+            op (str): One of "add", "pop", "move", "current" or "voice".
+            value: The item record, index, [from, to] indexes or voice channel id of the operation.
+
+        Returns:
+            bool: True if the guild is due for a snapshot.
+        """
+        if not self.enabled:
+            return False
+        if op == "voice":
+            if value is None:
+                self.voice_channels.pop(guild_id, None)
+            else:
+                self.voice_channels[guild_id] = value
+        self._pending.put((next(self._sequence), guild_id, op, value))
+        ops = self._ops_since_snapshot.get(guild_id, 0) + 1
+        self._ops_since_snapshot[guild_id] = ops
+        return ops >= self.snapshot_interval
+
+    def snapshot(self, guild_id: int, items: list, current: Any = None) -> None:
+        """
+        Replace the journal of a guild with its current state.
+        The items are turned into records by the writer thread, the caller only copies the list.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+            items (list): The items in the queue, head first, anything with a to_record() method.
+            current: The song being played, or None.
+        """
+        if not self.enabled:
+            return
+        state = {"items": items, "current": current, "voice_channel_id": self.voice_channels.get(guild_id)}
+        self._pending.put((next(self._sequence), guild_id, "snapshot", state))
+        self._ops_since_snapshot[guild_id] = 0
+
+    def discard(self, guild_id: int) -> None:
+        """
+        Forget a guild: nothing is queued or playing in it and it is in no voice channel, so nothing is restored.
+
+        Parameters:
+            guild_id (int): The ID of the guild.
+        """
+        if not self.enabled:
+            return
+        self.voice_channels.pop(guild_id, None)
+        self._ops_since_snapshot.pop(guild_id, None)
+        # An empty snapshot deletes everything journaled for the guild before it
+        self._pending.put((next(self._sequence), guild_id, "snapshot", {"items": [], "current": None, "voice_channel_id": None}))
+
+    def load(self) -> 'dict[int, dict]':
+        """
+        Rebuild the state of every guild from its snapshot and the operations journaled after it. Blocking.
+
+        Returns:
+            dict[int, dict]: The items, current song and voice channel id of each guild with anything to restore.
+        """
+        if not self.enabled:
+            return {}
+        states: dict[int, dict] = {}
+        try:
+            for guild_id, seq, state in self.store.fetchall("SELECT guild_id, seq, state FROM queue_snapshots"):
+                states[guild_id] = json.loads(state)
+            rows = self.store.fetchall(
+                "SELECT j.guild_id, j.op, j.value FROM queue_journal j LEFT JOIN queue_snapshots s ON s.guild_id = j.guild_id "
+                "WHERE s.seq IS NULL OR j.seq > s.seq ORDER BY j.seq"
+            )
+        except Exception as e:
+            print(f"Error reading the queue journal: {e}")
+            return {}
+
+        for guild_id, op, value in rows:
+            state = states.setdefault(guild_id, {"items": [], "current": None, "voice_channel_id": None})
+            try:
+                self._apply(state, op, json.loads(value))
+            except (IndexError, TypeError, ValueError) as e:
+                print(f"Skipping journaled {op} for guild {guild_id}: {e}")
+
+        for guild_id, state in states.items():
+            if state["voice_channel_id"] is not None:
+                self.voice_channels[guild_id] = state["voice_channel_id"]
+        return {guild_id: state for guild_id, state in states.items() if state["items"] or state["current"]}
+
+    def flush(self, timeout: float = 5) -> None:
+        """Wait until everything recorded so far is written."""
+        if not self.enabled:
+            return
+        written = threading.Event()
+        self._pending.put(written)
+        written.wait(timeout)
+
+    def get_stats(self) -> dict:
+        """Return the number of operations written and waiting to be written, and the number of snapshots."""
+        return {"written": self.written, "pending": self._pending.qsize(), "snapshots": self.snapshots}
+
+    @staticmethod
+    def _snapshot_records(state: dict) -> dict:
+        # Runs in the writer thread, so a large queue is never serialised on the event loop
+        current = state["current"]
+        return {
+            "items": [item.to_record() for item in state["items"]],
+            "current": current.to_record() if current is not None else None,
+            "voice_channel_id": state["voice_channel_id"],
+        }
+
+    @staticmethod
+    def _apply(state: dict, op: str, value) -> None:
+        items = state["items"]
+        match op:
+            case "add":
+                items.append(value)
+            case "pop":
+                items.pop(value)
+            case "move":
+                from_index, to_index = value
+                items.insert(to_index, items.pop(from_index))
+            case "current":
+                state["current"] = value
+            case "voice":
+                state["voice_channel_id"] = value
+
+    def _write_loop(self) -> None:
+        while True:
+            entries = [self._pending.get()]
+            # Everything that piled up while the last batch was written goes in one transaction
+            while len(entries) < 1000:
+                try:
+                    entries.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            statements = []
+            waiting = []
+            for entry in entries:
+                if isinstance(entry, threading.Event):
+                    waiting.append(entry)
+                    continue
+                seq, guild_id, op, value = entry
+                if op == "snapshot":
+                    value = self._snapshot_records(value)
+                if op == "snapshot" and not value["items"] and value["current"] is None:
+                    # Nothing to restore for this guild
+                    statements.append(("DELETE FROM queue_snapshots WHERE guild_id = ?", (guild_id,)))
+                    statements.append(("DELETE FROM queue_journal WHERE guild_id = ? AND seq < ?", (guild_id, seq)))
+                elif op == "snapshot":
+                    statements.append((
+                        "INSERT OR REPLACE INTO queue_snapshots (guild_id, seq, state) VALUES (?, ?, ?)",
+                        (guild_id, seq, json.dumps(value))
+                    ))
+                    statements.append(("DELETE FROM queue_journal WHERE guild_id = ? AND seq < ?", (guild_id, seq)))
+                else:
+                    statements.append((
+                        "INSERT INTO queue_journal (seq, guild_id, op, value) VALUES (?, ?, ?, ?)",
+                        (seq, guild_id, op, json.dumps(value))
+                    ))
+
+            if statements:
+                try:
+                    self.store.execute_batch(statements)
+                    self.snapshots += sum(1 for entry in entries if isinstance(entry, tuple) and entry[2] == "snapshot")
+                    self.written += len(entries) - len(waiting)
+                except Exception as e:
+                    print(f"Error writing the queue journal: {e}")
+            for event in waiting:
+                event.set()
@@ -0,0 +1,147 @@
+import os
+import asyncio
+from threading import Lock
+
+from clients.discord.discord_audio.queue.queue_item import QueueItem
+from clients.discord.discord_audio.playback_metrics import PlaybackMetrics
+from clients.discord.discord_audio.resolver_scheduler import ResolvePriority
+
+# How many upcoming items !queue shows, these resolve ahead of the rest of the window.
+VISIBLE_QUEUE_LENGTH = 5
+
+
+class GuildQueuePrefetcher:
+    def __init__(self, guild_id: int, depth: int, max_concurrent: int):
+        """
+        Keeps the first `depth` items of a guild queue resolved ahead of playback.
+
+        Parameters:
+            guild_id (int): The ID of the guild this prefetcher belongs to.
+            depth (int): How many items from the head of the queue to keep resolved.
+            max_concurrent (int): How many items may be resolved at the same time.
+        """
+        self.guild_id = guild_id
+        self.depth = depth
+        self.hits = 0
+        self.misses = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks: dict[QueueItem, asyncio.Task] = {}
+        self._started: set[QueueItem] = set()
+
+    def refresh(self, queue_items) -> None:
+        """
+        Re-evaluate which items should be resolved, in queue order.
+
+        Items that left the window are dropped, along with their resolver work if it has not started.
+        Items still waiting for a free slot are rescheduled so the slots go to whatever is now closest
+        to the head of the queue, and every item is resolved at the priority of its new position.
+        Resolutions already running are left alone, the work is shared with playback.
+
+        Parameters:
+            queue_items: The guild queue, head first.
+        """
+        window = list(queue_items[:self.depth])
+
+        for item, task in list(self._tasks.items()):
+            if item not in window:
+                task.cancel()
+                self._tasks.pop(item, None)
+                item.cancel_pending_resolution()
+            elif item not in self._started:
+                task.cancel()
+                self._tasks.pop(item, None)
+
+        for position, item in enumerate(window):
+            priority = self._priority_for(position)
+            if item.is_resolved() or item.is_failed() or item.has_cached_audio():
+                continue
+            if item in self._tasks:
+                item.promote_resolution(priority)
+                continue
+            self._tasks[item] = asyncio.create_task(self._prefetch(item, priority))
+
+    @staticmethod
+    def _priority_for(position: int) -> ResolvePriority:
+        if position == 0:
+            return ResolvePriority.NOW_PLAYING_NEXT
+        if position < VISIBLE_QUEUE_LENGTH:
+            return ResolvePriority.VISIBLE_QUEUE
+        return ResolvePriority.FAR_FUTURE
+
+    def cancel_all(self) -> None:
+        """Cancel every pending prefetch for this guild."""
+        self.refresh([])
+
+    def record_transition(self, queue_item: QueueItem) -> bool:
+        """
+        Record whether the item about to be played was already resolved.
+
+        Parameters:
+            queue_item (QueueItem): The item popped from the head of the queue.
+
+        Returns:
+            bool: True if it was a prefetch hit, False otherwise.
+        """
+        hit = queue_item.is_resolved() or queue_item.has_cached_audio()
+        if hit:
+            self.hits += 1
+            PlaybackMetrics().increment("prefetch_hits")
+        else:
+            self.misses += 1
+            PlaybackMetrics().increment("prefetch_misses")
+        return hit
+
+    async def _prefetch(self, queue_item: QueueItem, priority: ResolvePriority) -> None:
+        try:
+            async with self._semaphore:
+                self._started.add(queue_item)
+                await queue_item.get_stream_url(priority)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error prefetching {queue_item} for guild {self.guild_id}: {e}")
+        finally:
+            self._started.discard(queue_item)
+            if self._tasks.get(queue_item) is asyncio.current_task():
+                self._tasks.pop(queue_item, None)
+
+
+class QueuePrefetcherManager:
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.prefetchers = {}
+                cls._instance.depth = int(os.getenv('PREFETCH_DEPTH', 2))
+                cls._instance.max_concurrent = int(os.getenv('PREFETCH_CONCURRENCY', 2))
+        return cls._instance
+
+    def get_prefetcher_by_id(self, guild_id: int) -> GuildQueuePrefetcher:
+        """Ensure a prefetcher exists for the given guild_id, or creates one."""
+        if guild_id not in self.prefetchers:
+            self.prefetchers[guild_id] = GuildQueuePrefetcher(guild_id, self.depth, self.max_concurrent)
+        return self.prefetchers[guild_id]
+
+    def remove_prefetcher_by_id(self, guild_id: int) -> None:
+        """Cancel the prefetches of a guild and forget its prefetcher."""
+        prefetcher = self.prefetchers.pop(guild_id, None)
+        if prefetcher is not None:
+            prefetcher.cancel_all()
+
+    def refresh_by_id(self, guild_id: int, queue_items) -> None:
+        """Re-evaluate the prefetch window of a guild after its queue changed."""
+        if self.depth <= 0:
+            return
+        self.get_prefetcher_by_id(guild_id).refresh(queue_items)
+
+    def record_transition_by_id(self, guild_id: int, queue_item: QueueItem) -> bool:
+        """Record a prefetch hit or miss for the item a guild is about to play."""
+        return self.get_prefetcher_by_id(guild_id).record_transition(queue_item)
+
+    def get_stats_by_id(self, guild_id: int) -> dict:
+        """Return the hit/miss counts for a guild."""
+        prefetcher = self.get_prefetcher_by_id(guild_id)
+        return {"hits": prefetcher.hits, "misses": prefetcher.misses, "pending": len(prefetcher._tasks)}
@@ -0,0 +1,154 @@
+import os
+import enum
+import asyncio
+import functools
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+class ResolvePriority(enum.IntEnum):
+    NOW_PLAYING_NEXT = 0
+    VISIBLE_QUEUE = 1
+    FAR_FUTURE = 2
+
+
+class ResolverJob:
+    def __init__(self, guild_id, priority: ResolvePriority, func, future: asyncio.Future):
+        self.guild_id = guild_id
+        self.priority = priority
+        self.func = func
+        self.future = future
+
+
+class ResolverScheduler:
+    """
+    Runs blocking resolution work (searches, stream extraction) on one sized pool.
+
+    Jobs are picked by priority first, then round-robin across guilds within a priority,
+    so a guild queuing thousands of tracks cannot starve a guild asking for one song.
+
+    Every job here is a short lookup. Whole-file work (audio cache downloads, Opus pre-encoding) has pools
+    of its own: it takes seconds to minutes per song and cannot be preempted, so even at FAR_FUTURE it would
+    hold the workers a NOW_PLAYING_NEXT lookup is waiting for.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.max_workers = int(os.getenv('RESOLVER_WORKERS', 5))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="resolver")
+        self.pending: dict[ResolvePriority, OrderedDict] = {priority: OrderedDict() for priority in ResolvePriority}
+        self.jobs: dict[asyncio.Future, ResolverJob] = {}
+        # The jobs that have not started. A promoted or cancelled job is only taken out of this set,
+        # its old deque entry is skipped when it comes up, so neither has to search a deque.
+        self.queued: set[ResolverJob] = set()
+        self.running = 0
+        self.completed = 0
+
+    def submit(self, guild_id, priority: ResolvePriority, func, *args, **kwargs) -> asyncio.Future:
+        """
+        Schedule a blocking call. Must be called from the event loop.
+
+        Parameters:
+            guild_id (int): The guild the work is for, None for work not tied to a guild.
+            priority (ResolvePriority): How urgently the result is needed.
+            func (callable): The blocking function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            asyncio.Future: Resolves to the return value of the function. Cancelling it before
+            the job starts removes the job from the schedule.
+        """
+        future = asyncio.get_running_loop().create_future()
+        job = ResolverJob(guild_id, priority, functools.partial(func, *args, **kwargs), future)
+        self.jobs[future] = job
+        future.add_done_callback(self._forget)
+        self._enqueue(job)
+        self._dispatch()
+        return future
+
+    def is_pending(self, future: asyncio.Future) -> bool:
+        """Return True if the job behind the future has not started running yet."""
+        job = self.jobs.get(future)
+        return job is not None and job in self.queued
+
+    def promote(self, future: asyncio.Future, priority: ResolvePriority) -> None:
+        """
+        Move a job that has not started yet to a more urgent priority.
+
+        Parameters:
+            future (asyncio.Future): The future returned by submit.
+            priority (ResolvePriority): The new priority. Ignored if it is not more urgent.
+        """
+        job = self.jobs.get(future)
+        if job is None or priority >= job.priority or job not in self.queued:
+            return
+        job.priority = priority
+        self._enqueue(job)
+
+    def get_stats(self) -> dict:
+        """Return the number of pending jobs per priority, and the running and completed counts."""
+        queued = Counter(job.priority for job in self.queued)
+        return {
+            "pending": {priority.name: queued[priority] for priority in ResolvePriority},
+            "running": self.running,
+            "completed": self.completed,
+        }
+
+    def _next_job(self):
+        for priority in ResolvePriority:
+            guilds: OrderedDict = self.pending[priority]
+            while guilds:
+                guild_id, jobs = next(iter(guilds.items()))
+                job: ResolverJob = jobs.popleft()
+                if jobs:
+                    guilds.move_to_end(guild_id)
+                else:
+                    del guilds[guild_id]
+                # Left behind by a promotion or a cancellation
+                if job.priority != priority or job not in self.queued:
+                    continue
+                self.queued.discard(job)
+                if not job.future.done():
+                    return job
+        return None
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self.running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self.running += 1
+            work = loop.run_in_executor(self.executor, job.func)
+            work.add_done_callback(functools.partial(self._job_done, job))
+
+    def _job_done(self, job: ResolverJob, work: asyncio.Future) -> None:
+        self.running -= 1
+        self.completed += 1
+        if not job.future.done():
+            if work.cancelled():
+                job.future.cancel()
+            elif work.exception() is not None:
+                job.future.set_exception(work.exception())
+            else:
+                job.future.set_result(work.result())
+        self._dispatch()
+
+    def _enqueue(self, job: ResolverJob) -> None:
+        self.queued.add(job)
+        self.pending[job.priority].setdefault(job.guild_id, deque()).append(job)
+
+    def _forget(self, future: asyncio.Future) -> None:
+        job = self.jobs.pop(future, None)
+        if job is not None:
+            self.queued.discard(job)
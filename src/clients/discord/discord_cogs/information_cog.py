@@ -1,14 +1,26 @@
 
+import asyncio
 import discord
 from discord.ext import commands
 from ..discord_audio.music_manager import MusicManager
+from ..discord_audio.playback_metrics import PlaybackMetrics
+from ..discord_audio.resolver_scheduler import ResolverScheduler
 from ..discord_integrations.youtube import YoutubeIntegration
 from services.services_utils.service_factory import ServiceFactory
 from ..discord_messages.discord_embed.services_embeds import YoutubeEmbedCreator, SpotifyEmbedCreator
 
 
 from services.youtube.youtube_service import YouTube
+from services.youtube.youtube_stream_cache import YouTubeStreamCache
+from services.youtube.youtube_search_cache import YouTubeSearchCache
+from services.youtube.youtube_negative_cache import YouTubeNegativeCache
+from services.youtube.youtube_audio_cache import YouTubeAudioCache
+from services.youtube.youtube_metadata_cache import YouTubeMetadataCache
+from ..discord_audio.audio.opus_frame_store import OpusFrameStore
+from services.spotify.spotify_youtube_mapping import SpotifyYouTubeMapping
+from services.services_utils.single_flight import SingleFlight
 from services.spotify.tracks import SpotifyTrack
+from ..discord_audio.queue.queue_journal import QueueJournal
 
 class InfomationCog(commands.Cog):
     def __init__(self, bot, music_manager):
@@ -38,11 +50,8 @@ class InfomationCog(commands.Cog):
             
         await ctx.message.add_reaction("🔍")
 
-        #Weird hacky fix. Getting the stream_url also gets the Youtube object.
-        await current_song.get_stream_url()
-        yt_info = current_song.yt_object
-        embed = YoutubeEmbedCreator()
-        embed = embed.create_video_embed(yt_info)
+        metadata = await current_song.get_metadata(complete=True)
+        embed = YoutubeEmbedCreator.create_metadata_embed(metadata)
 
         await ctx.message.reply(embed=embed)
 
@@ -63,18 +72,59 @@ class InfomationCog(commands.Cog):
             await ctx.message.add_reaction("❌")
             await ctx.message.reply("There are no songs in the queue.")
 
+    @commands.command(name="stats")
+    async def stats(self, ctx: commands.Context):
+        prefetch_stats = self.music_manager.get_prefetch_stats(ctx.guild.id)
+        metrics = PlaybackMetrics()
+        stream_cache_stats = YouTubeStreamCache().get_stats()
+        search_cache_stats = YouTubeSearchCache().get_stats()
+        mapping_stats = SpotifyYouTubeMapping().get_stats()
+        negative_cache_stats = YouTubeNegativeCache().get_stats()
+        audio_cache_stats = YouTubeAudioCache().get_stats()
+        opus_frame_stats = OpusFrameStore().get_stats()
+        resolver_stats = ResolverScheduler().get_stats()
+        single_flight_stats = SingleFlight().get_stats()
+        journal_stats = QueueJournal().get_stats()
+        metadata_stats = YouTubeMetadataCache().get_stats()
+        session_stats = self.music_manager.get_session_stats()
+        audio_cpu_lines = "".join(
+            f"Audio CPU ({mode}) - songs: ``{usage['songs']}`` voice thread: ``{usage['voice_cpu_percent']:.2f}%`` ffmpeg: ``{usage['ffmpeg_cpu_percent']:.2f}%``\n"
+            for mode, usage in self.music_manager.get_audio_cpu_stats(ctx.guild.id).items()
+        )
+
+        await ctx.message.add_reaction("📊")
+        await ctx.message.reply(
+            f"Prefetch hits: ``{prefetch_stats['hits']}`` misses: ``{prefetch_stats['misses']}`` pending: ``{prefetch_stats['pending']}``\n"
+            f"All guilds - hits: ``{metrics.get_counter('prefetch_hits')}`` misses: ``{metrics.get_counter('prefetch_misses')}``\n"
+            f"Average gap between songs: ``{metrics.get_average('transition_gap_seconds'):.3f}s``\n"
+            f"Average silence between songs - pre-started: ``{metrics.get_average('audio_gap_seconds_warm'):.3f}s`` cold: ``{metrics.get_average('audio_gap_seconds_cold'):.3f}s`` (pre-started transitions: ``{metrics.get_counter('warm_transitions')}``)\n"
+            f"Average time to first audio: ``{metrics.get_average('time_to_first_audio_seconds'):.3f}s``\n"
+            f"{audio_cpu_lines}"
+            f"Stream cache - hits: ``{stream_cache_stats['hits']}`` misses: ``{stream_cache_stats['misses']}`` videos: ``{stream_cache_stats['size']}``\n"
+            f"Audio cache - hits: ``{audio_cache_stats['hits']}`` misses: ``{audio_cache_stats['misses']}`` files: ``{audio_cache_stats['size']}`` size: ``{audio_cache_stats['bytes'] / 1024 ** 2:.1f} MiB``\n"
+            f"Pre-encoded Opus - hits: ``{opus_frame_stats['hits']}`` tracks: ``{opus_frame_stats['size']}`` size: ``{opus_frame_stats['bytes'] / 1024 ** 2:.1f} MiB``\n"
+            f"Video metadata - hits: ``{metadata_stats['hits']}`` misses: ``{metadata_stats['misses']}`` videos: ``{metadata_stats['size']}``\n"
+            f"Search cache - memory hits: ``{search_cache_stats['memory_hits']}`` disk hits: ``{search_cache_stats['disk_hits']}`` misses: ``{search_cache_stats['misses']}``\n"
+            f"Spotify to YouTube mapping - hits: ``{mapping_stats['hits']}`` misses: ``{mapping_stats['misses']}``\n"
+            f"Known unplayable - skipped: ``{negative_cache_stats['hits']}`` remembered: ``{negative_cache_stats['size']}``\n"
+            f"Resolver - running: ``{resolver_stats['running']}`` pending: ``{sum(resolver_stats['pending'].values())}`` completed: ``{resolver_stats['completed']}``\n"
+            f"Coalesced lookups - upstream calls: ``{single_flight_stats['executed']}`` shared: ``{single_flight_stats['shared']}``\n"
+            f"Queue journal - written: ``{journal_stats['written']}`` pending: ``{journal_stats['pending']}`` snapshots: ``{journal_stats['snapshots']}``\n"
+            f"Guild sessions - live: ``{session_stats['sessions']}`` connected: ``{session_stats['connected']}`` queued songs: ``{session_stats['queued']}`` size: ``{session_stats['bytes'] / 1024:.1f} KiB`` reaped: ``{session_stats['reaped']}``\n"
+            f"Empty channels - waited in: ``{metrics.get_counter('empty_channel_lingers')}`` reconnects avoided: ``{metrics.get_counter('reconnects_avoided')}``"
+        )
+
     async def construct_queue_message(self, queue) -> str:
+        songs = queue[:5]
+        # Only metadata, the prefetcher takes care of resolving the streams
+        metadata_list = await asyncio.gather(*(song.get_metadata() for song in songs))
+
         message_parts = []
-        for song in queue[:5]:
-            await song.get_stream_url()
-            
-            yt_info = song.yt_object
-            title = yt_info.title
-            #channel_name = yt_info.channel_id
-            url = yt_info.watch_url
-            requester = song.ctx.author.display_name
+        for song, metadata in zip(songs, metadata_list):
+            requester = song.requester_name or "Unknown"
 
-            message_part = f"`{title}` - <{url}>\nRequested by: `{requester}`\n"
+            link = f" - <{metadata.url}>" if metadata.url else ""
+            message_part = f"`{metadata.title}`{link}\nRequested by: `{requester}`\n"
             message_parts.append(message_part)
 
         return "\n".join(message_parts)
@@ -1,12 +1,16 @@
 from typing import Union
+import time
+import itertools
 import discord
 from discord.ext import commands
 
 from services.services_utils.service_factory import ServiceFactory
+from services.services_utils.service_executor import ServiceExecutor
 from services.youtube.youtube_service import YouTubeService
 from services.spotify.spotify_service import SpotifyService
 
 from ..discord_audio.music_manager import MusicManager
+from ..discord_audio.playback_metrics import PlaybackMetrics
 from ..discord_messages.discord_views.pick_service_view import PickServiceView
 
 from ..discord_integrations.spotify import SpotifyIntegration
@@ -29,22 +33,20 @@ class PlayCog(commands.Cog):
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        # Check if the member is not the bot itself
-        if member.id != self.bot.user.id:
-            # Check every voice client (in case the bot is connected to multiple guilds)
-            for vc in self.bot.voice_clients:
-                if vc.guild == member.guild:
-                    # Ensure the voice client is connected to a channel
-                    if vc.channel:
-                        # Count members in the voice channel, excluding bots
-                        non_bot_members = len([m for m in vc.channel.members if not m.bot])
-                        
-                        # If no non-bot members are left in the channel, disconnect
-                        if non_bot_members == 0:
-                            await self.music_manager.disconnect_from_guild(member.guild.id)
+        # Mute, deafen and streaming changes do not move anyone
+        if before.channel == after.channel:
+            return
+        # Only the guild of the member is looked at, and only if the bot is connected there
+        if member.guild.voice_client is None:
+            return
+        if member.id == self.bot.user.id:
+            self.music_manager.recount_listeners(member.guild.id)
+        elif not member.bot:
+            self.music_manager.update_listeners(member.guild.id, before.channel, after.channel)
 
     @commands.command(name="play")
     async def play(self, ctx: commands.Context, *, query: str):
+        requested_at = time.perf_counter()
         if ctx.author.voice is None:
             await ctx.message.add_reaction("❌")
             await ctx.reply("You must be in a voice channel to use this command.")
@@ -57,16 +59,63 @@ class PlayCog(commands.Cog):
 
         query = query.strip()
         
-        items_to_queue, media_object = await self._handle_request(ctx, query)
-        
-        for item in items_to_queue:
+        response = await self._handle_request(ctx, query)
+        if response is None:
+            await ctx.message.add_reaction("❌")
+            return
+
+        items_to_queue, media_object, service_integration = response
+
+        # Only the first item is queued before playback starts, everything else streams in behind it.
+        item_pages = self._iter_in_pages(items_to_queue)
+        first_page = await anext(item_pages, None)
+        if not first_page:
+            await ctx.message.add_reaction("❌")
+            return
+
+        for item in first_page:
             queue_item = QueueItem(item, ctx)
             self.music_manager.add_item_to_queue(ctx.guild.id, queue_item)
 
-        await self.music_manager.play_queue_in_channel(ctx.guild.id, ctx.author.voice.channel.id)
+        started = await self.music_manager.play_queue_in_channel(ctx.guild.id, ctx.author.voice.channel.id)
+        if started:
+            PlaybackMetrics().observe("time_to_first_audio_seconds", time.perf_counter() - requested_at)
+
+        self.music_manager.stream_items_to_queue(ctx.guild.id, self._remaining_pages(item_pages, media_object, service_integration), ctx)
         
         await ctx.message.add_reaction("✅")
 
+    async def _iter_in_pages(self, items, page_size: int = 50):
+        """
+        Asynchronously yields the given items in pages, the first page holding a single item.
+
+        Items are pulled from the iterable in an executor, since lazy playlists may hit the network while iterating.
+
+        Args:
+            items: Any iterable of items to queue.
+            page_size (int, optional): The size of every page after the first. Defaults to 50.
+
+        Yields:
+            list: The next page of items.
+        """
+        iterator = iter(items)
+        size = 1
+        while True:
+            page = await ServiceExecutor().run(lambda: list(itertools.islice(iterator, size)))
+            if not page:
+                return
+            yield page
+            size = page_size
+
+    async def _remaining_pages(self, item_pages, media_object, service_integration: 'Union[YoutubeIntegration, SpotifyIntegration]'):
+        async for page in item_pages:
+            yield page
+
+        # Large playlists and albums keep streaming into the queue while the first page plays.
+        if isinstance(service_integration, SpotifyIntegration):
+            async for page in service_integration.iter_remaining_tracks(media_object):
+                yield page
+
     async def _handle_generic_request(self, ctx: commands.Context, query) -> 'Union[YouTubeService, SpotifyService]':
         yt = ServiceFactory().get_service("www.youtube.com")
         sp = ServiceFactory().get_service("www.spotify.com")
@@ -94,7 +143,7 @@ class PlayCog(commands.Cog):
             query (str): The query for the audio playback.
 
         Returns:
-            None
+            tuple: The items to queue, the media object they came from and the integration that produced it, or None.
 
         Raises:
             Exception: If there is an error handling the generic request or parsing the link.
@@ -105,24 +154,25 @@ class PlayCog(commands.Cog):
             try:
                 #This request wasn't a link. Prompt the user to pick a service.
                 service_integration = await self._handle_generic_request(ctx, query)
-                media_object = service_integration.search_string(query, limit=1)[0]
+                media_object = (await service_integration.search_string_async(query, limit=1))[0]
             except Exception as e:
                 print(f"Failed to handle generic request: {e}")
                 return
         else:
             try:
-                media_object = self._parse_link(service_integration, query)
+                media_object = await self._parse_link(service_integration, query)
             except Exception as e:
                 print(f"Failed to parse link: {e}")
                 return
 
+        search_items = None
         try:
             search_items = self._deconstruct_media_to_list(media_object, service_integration)
         except Exception as e:
             print(f"Failed to create queue search items: {e}")
         
         if search_items:
-            return search_items, media_object
+            return search_items, media_object, service_integration
 
     def _deconstruct_media_to_list(self, media_object, integration: 'Union[YoutubeIntegration, SpotifyIntegration]') -> list:
         """
@@ -150,9 +200,9 @@ class PlayCog(commands.Cog):
         
         return search_items
 
-    def _parse_link(self, service_integration: 'Union[YoutubeIntegration, SpotifyIntegration]', web_link: str):
+    async def _parse_link(self, service_integration: 'Union[YoutubeIntegration, SpotifyIntegration]', web_link: str):
         """
-        Parses a link using the provided service and query.
+        Parses a link using the provided service and query, off the event loop.
 
         Parameters:
             service_integration (Union[YoutubeIntegration, SpotifyIntegration]): The audio service to use.
@@ -162,7 +212,7 @@ class PlayCog(commands.Cog):
             A parsed media object or a list of media objects, depending on the query.
         """
         try:
-            response = service_integration.parse_link(web_link)
+            response = await service_integration.parse_link_async(web_link)
             return response
         except Exception as e:
             print(f"Error: {e}")
@@ -111,6 +111,76 @@ class PlaybackCog(commands.Cog):
             await ctx.message.add_reaction("❌")
             await ctx.reply("The queue is already empty.")
 
+    @commands.command(name="remove")
+    async def remove(self, ctx: commands.Context, position: int):
+        if ctx.author.voice is None:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("You must be in a voice channel to use this command.")
+            return
+
+        if not self.music_manager.get_guild_voice_client(ctx.guild.id):
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("I'm not in a voice channel right now.")
+            return
+
+        if ctx.author.voice.channel.id != self.music_manager.get_guild_voice_client(ctx.guild.id).channel.id:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("You must be in the same voice channel as the bot to use this command.")
+            return
+
+        # Positions are counted from 1, as shown by !queue
+        if position < 1 or self.music_manager.remove_item_from_queue(ctx.guild.id, position - 1) is None:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"There is no song at position {position} in the queue.")
+            return
+        await ctx.message.add_reaction("🗑️")
+
+    @commands.command(name="move")
+    async def move(self, ctx: commands.Context, from_position: int, to_position: int):
+        if ctx.author.voice is None:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("You must be in a voice channel to use this command.")
+            return
+
+        if not self.music_manager.get_guild_voice_client(ctx.guild.id):
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("I'm not in a voice channel right now.")
+            return
+
+        if ctx.author.voice.channel.id != self.music_manager.get_guild_voice_client(ctx.guild.id).channel.id:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("You must be in the same voice channel as the bot to use this command.")
+            return
+
+        if min(from_position, to_position) < 1 or not self.music_manager.move_item_in_queue(ctx.guild.id, from_position - 1, to_position - 1):
+            await ctx.message.add_reaction("❌")
+            await ctx.reply(f"The queue only has {len(self.music_manager.get_guild_queue(ctx.guild.id))} songs.")
+            return
+        await ctx.message.add_reaction("✅")
+
+    @commands.command(name="shuffle")
+    async def shuffle(self, ctx: commands.Context):
+        if ctx.author.voice is None:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("You must be in a voice channel to use this command.")
+            return
+
+        if not self.music_manager.get_guild_voice_client(ctx.guild.id):
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("I'm not in a voice channel right now.")
+            return
+
+        if ctx.author.voice.channel.id != self.music_manager.get_guild_voice_client(ctx.guild.id).channel.id:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("You must be in the same voice channel as the bot to use this command.")
+            return
+
+        if self.music_manager.shuffle_queue(ctx.guild.id):
+            await ctx.message.add_reaction("🔀")
+        else:
+            await ctx.message.add_reaction("❌")
+            await ctx.reply("The queue is empty.")
+
 
 async def setup(bot):
     mm = MusicManager(bot)
@@ -6,11 +6,12 @@ from services.spotify.spotify_service import SpotifyService
 
 
 from services.spotify.tracks import SpotifyTrack
-from services.spotify.playlists import SpotifyPlaylist
-from services.spotify.albums import SpotifyAlbum
+from services.spotify.playlists import SpotifyPlaylist, SpotifyPlaylistTrackSearch
+from services.spotify.albums import SpotifyAlbum, SpotifyAlbumTrack, SpotifyAlbumTrackSearch
 from services.spotify.artists import SpotifyArtist
 
 import random
+import asyncio
 
 from .shared import SharedIntegration
 from clients.discord.discord_messages.discord_embed.services_embeds import SpotifyEmbedCreator
@@ -39,7 +40,7 @@ class SpotifyIntegration:
 
         #if not "spotify.com/" in request:
         #    results: list[SpotifyTrack] = self.spotify_service.perform_search(request, limit=search_limit)
-        results = self.search_string(request)
+        results = await self.search_string_async(request)
         result = await SharedIntegration.handle_search_results(ctx, results, SpotifyEmbedCreator.create_song_search_embed)
         if result is None:
             raise ValueError("No results found")
@@ -61,51 +62,41 @@ class SpotifyIntegration:
         #return view.user_choice, search_safe_list
         #return search_safe_list
     
-    def search_string(self, request: str, limit=4) -> list[SpotifyTrack]:
+    async def search_string_async(self, request: str, limit=4) -> list[SpotifyTrack]:
         if not "spotify.com/" in request:
-            return self.spotify_service.perform_search(request, limit=limit)
+            return await self.spotify_service.perform_search_async(request, limit=limit)
         else:
             raise Exception("Unable to parse Spotify link. Please provide a query.")
 
-    def parse_link(self, request: str) -> 'Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, SpotifyArtist, list[SpotifyTrack]]':
+    async def parse_link_async(self, request: str) -> 'Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, SpotifyArtist, list[SpotifyTrack]]':
         """
-        Handles Spotify link requests from the user.
+        Handles Spotify link requests from the user. The spotipy requests run in the shared service executor,
+        and identical links requested at the same time share one request.
 
         Args:
-            ctx (commands.Context): The command context.
-            self.spotify_service (SpotifyService): The Spotify service instance.
             request (str): The user's request.
 
         Returns:
-            Optional[Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, SpotifyArtist, list[SpotifyTrack]]]: The search result and search queries.
+            Optional[Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, SpotifyArtist, list[SpotifyTrack]]]: The search result.
         """
         if "show" in request or "episode" in request:
-            #Throw exception
             raise Exception("Spotify Integration does not support shows or episodes. Please provide a link to a track, album, playlist, or artist.")
-        
+
+        # Share links carry a per-user ?si= token, dropping it lets identical links share one lookup.
+        request = request.split("?")[0]
+
         try:
             result = None
             if "playlist" in request:
-                result = self.spotify_service.get_playlist_by_id(request)
-                #search_queries = [f"{item.track.name} - {item.track.artists[0].name}" for item in result.tracks.items]
-                #embed = SpotifyEmbedCreator.create_playlist_embed(result)
-
+                result = await self.spotify_service.get_playlist_by_id_async(request)
             elif "track" in request:
-                result = self.spotify_service.get_track_by_id(request)
-                #search_queries = [f"{result.artists[0].name} - {result.name}"]
-                #embed = SpotifyEmbedCreator.create_track_embed(result)
-
+                result = await self.spotify_service.get_track_by_id_async(request)
             elif "album" in request:
-                result = self.spotify_service.get_album_by_id(request)
-                #search_queries = [f"{item.name} - {item.artists[0].name}" for item in result.tracks.items]
-                #embed = SpotifyEmbedCreator.create_album_embed(result)
-
+                result = await self.spotify_service.get_album_by_id_async(request)
             elif "artist" in request:
-                artist = self.spotify_service.get_artist_by_id(request)
-                result: list[SpotifyTrack] = self.spotify_service.get_artist_top_songs(artist.id)
-                #search_queries = [f"{item.name} - {item.artists[0].name}" for item in result]
-                #embed =  SpotifyEmbedCreator.create_artist_embed(artist, result)
-            
+                artist = await self.spotify_service.get_artist_by_id_async(request)
+                result = await self.spotify_service.get_artist_top_songs_async(artist.id)
+
             if result is None:
                 raise Exception("No results found.")
 
@@ -113,9 +104,58 @@ class SpotifyIntegration:
 
         except Exception as e:
             print(f"An error occurred while handling the Spotify link: {e}")
-            #await ctx.send(content="An error occurred while processing your request. Please try again later.")
             return None
-        
+
+    async def iter_remaining_tracks(self, result: 'Union[SpotifyPlaylist, SpotifyAlbum]', max_concurrent_pages: int = 4):
+        """
+        Asynchronously yields the tracks of every page after the first one, in order.
+
+        The first page is already part of `result`, so it can be queued right away while the
+        remaining pages are fetched concurrently in the background.
+
+        Args:
+            result (Union[SpotifyPlaylist, SpotifyAlbum]): The playlist or album returned by parse_link_async.
+            max_concurrent_pages (int, optional): How many pages are fetched at the same time. Defaults to 4.
+
+        Yields:
+            list[Union[SpotifyTrack, SpotifyAlbumTrack]]: The tracks of one page.
+        """
+        if isinstance(result, SpotifyPlaylist):
+            fetch_page = self.spotify_service.get_playlist_tracks_page_async
+        elif isinstance(result, SpotifyAlbum):
+            fetch_page = self.spotify_service.get_album_tracks_page_async
+        else:
+            return
+
+        first_page = result.tracks
+        if not first_page.next or not first_page.limit:
+            return
+
+        semaphore = asyncio.Semaphore(max_concurrent_pages)
+        offsets = range(first_page.offset + first_page.limit, first_page.total, first_page.limit)
+
+        async def fetch(offset):
+            async with semaphore:
+                return await fetch_page(result.id, offset, first_page.limit)
+
+        tasks = [asyncio.ensure_future(fetch(offset)) for offset in offsets]
+        try:
+            for task in tasks:
+                try:
+                    page = await task
+                except Exception as e:
+                    print(f"An error occurred while fetching a page of {result.name}: {e}")
+                    continue
+                yield self._tracks_from_page(page)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _tracks_from_page(self, page: 'Union[SpotifyPlaylistTrackSearch, SpotifyAlbumTrackSearch]') -> 'list[Union[SpotifyTrack, SpotifyAlbumTrack]]':
+        if isinstance(page, SpotifyPlaylistTrackSearch):
+            return [item.track for item in page.items if item.track is not None]
+        return list(page.items)
+
     def _create_embed(self, result: 'Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, SpotifyArtist, list[SpotifyTrack]]'):
         embed = None
         if isinstance(result, list):
@@ -130,16 +170,17 @@ class SpotifyIntegration:
             embed = SpotifyEmbedCreator.create_artist_embed(result)
         return embed
     
-    def create_search_safe_list(self, result: 'Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, list[SpotifyTrack]]') -> list[str]:
+    def create_search_safe_list(self, result: 'Union[SpotifyTrack, SpotifyPlaylist, SpotifyAlbum, list[SpotifyTrack]]') -> 'list[Union[SpotifyTrack, SpotifyAlbumTrack]]':
+        # The tracks themselves are queued so their ISRC and id can be matched to a known YouTube video before searching.
         search_safe_list = None
         if isinstance(result, list):
-            search_safe_list = [f"{item.name} - {item.artists[0].name}" for item in result]
+            search_safe_list = [item for item in result if item is not None]
         elif isinstance(result, SpotifyTrack):
-            search_safe_list = [f"{result.artists[0].name} - {result.name}"]
+            search_safe_list = [result]
         elif isinstance(result, SpotifyPlaylist):
-            search_safe_list = [f"{item.track.name} - {item.track.artists[0].name}" for item in result.tracks.items]
+            search_safe_list = self._tracks_from_page(result.tracks)
         elif isinstance(result, SpotifyAlbum):
-            search_safe_list = [f"{item.name} - {item.artists[0].name}" for item in result.tracks.items]
+            search_safe_list = self._tracks_from_page(result.tracks)
         
         if search_safe_list is None:
             raise Exception("No results found.")
@@ -1,14 +1,16 @@
-from typing import Union
+from typing import Iterable, Union
 import discord
 from discord.ext import commands
 from .shared import SharedIntegration
 
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 
 from services.youtube.youtube_service import YouTubeService
+from services.services_utils.service_executor import ServiceExecutor
+from services.youtube.youtube_playlist_entry import YouTubePlaylistEntry
 
 from clients.discord.discord_messages.discord_views.queue_selected_view import QueueSelectedView
+from clients.discord.discord_audio.resolver_scheduler import ResolverScheduler, ResolvePriority
 from clients.discord.discord_messages.discord_embed.services_embeds import YoutubeEmbedCreator
 
 #from typing import TYPE_CHECKING, Union
@@ -36,10 +38,12 @@ class YoutubeIntegration:
         """
         #Throw the request into the queue immediately as a youtube object, assuming it doesn't
         if fast_mode:
-            result_list = self.youtube_service.search_and_bind(request,limit=1)
+            result_list = await self.youtube_service.search_and_bind_async(request,limit=1)
+            if not result_list:
+                return None, None
             result = result_list[0]
 
-            if result.age_restricted:
+            if await ServiceExecutor().run(self.youtube_service.check_playable, result) is not None:
                 return None, None
             return 'add_to_queue', [result]
         
@@ -57,6 +61,15 @@ class YoutubeIntegration:
     def search_string(self, request: str, limit=4) -> list[YouTube]:
         return self.youtube_service.search_and_bind(request,limit=limit)
 
+    async def search_string_async(self, request: str, limit=4) -> list[YouTube]:
+        return await self.youtube_service.search_and_bind_async(request, limit=limit)
+
+    async def parse_link_async(self, request: str) -> 'Union[YouTube, Playlist]':
+        """
+        Runs parse_link in the shared service executor so the pytubefix requests don't block the event loop.
+        """
+        return await ServiceExecutor().run(self.parse_link, request)
+
     def parse_link(self, request: str) -> 'Union[YouTube, Playlist]':
         """
     	Handles YouTube requests from the user.
@@ -71,14 +84,19 @@ class YoutubeIntegration:
         if "playlist" in request or "list" in request:
             #print(f"Handling playlist {request}")
             result:Playlist = self.youtube_service.get_playlist_from_url(request)
-            if not result:
+            # Checking the length here would fetch every page of the playlist, emptiness shows up when it is iterated.
+            if result is None:
                 raise Exception(f"No items in playlist {request}")
 
         elif "watch" in request or "https://youtu.be/" in request:
             #print(f"watch {request}")
             result:'YouTube' = self.youtube_service.get_youtube_by_url(request)
-            if result.age_restricted:
-                raise Exception(f"{result.title} is age restricted.")
+            if result is None:
+                raise Exception(f"Unable to load {request}.")
+            # Known-bad videos are rejected from the negative cache without fetching the page again.
+            failure = self.youtube_service.check_playable(result)
+            if failure is not None:
+                raise Exception(f"{request} is {failure.value}.")
             
         else:
             raise Exception(f"Unable to parse YouTube link. Please provide a query.")
@@ -109,18 +127,15 @@ class YoutubeIntegration:
         return result
 
     #TODO: Figure out how to get this to work consistently with the search limits.  Will be needed for multiple items in the queue.
-    async def fast_youtube_search(self, list_of_requests: list[str]) -> list[str]:
+    async def fast_youtube_search(self, list_of_requests: list[str], guild_id: int = None) -> list[str]:
         print("performing fast search")
         result_urls: list = []
 
-        # Get the event loop
-        loop = asyncio.get_event_loop()
-
-        # Create a thread pool executor
-        executor = ThreadPoolExecutor(max_workers=2)  # Adjust the number of workers as needed
+        # Searches share the resolver pool, so they are scheduled fairly against every guild's queue
+        resolver_scheduler = ResolverScheduler()
 
         async def fetch_url(request):
-            query_result = await loop.run_in_executor(executor, self.youtube_service.perform_search, request, 1)
+            query_result = await resolver_scheduler.submit(guild_id, ResolvePriority.VISIBLE_QUEUE, self.youtube_service.perform_search, request, 1)
             if query_result is not None:
                 if "https://www.youtube.com" in query_result:
                     return query_result
@@ -137,10 +152,11 @@ class YoutubeIntegration:
     def create_info_embed(self, video: 'YouTube'):
         return YoutubeEmbedCreator.create_video_embed(video)
     
-    def create_search_safe_list(self, media_object: 'Union[YouTube, Playlist]') -> 'list[YouTube]':
+    def create_search_safe_list(self, media_object: 'Union[YouTube, Playlist]') -> 'Iterable[Union[YouTube, YouTubePlaylistEntry]]':
         if isinstance(media_object, YouTube):
             return [media_object]
         elif isinstance(media_object, Playlist):
-            return media_object.videos
+            # Lazily paged id/url records; the YouTube objects are only built once an item nears the head of the queue.
+            return self.youtube_service.iter_playlist_entries(media_object)
         else:
             raise Exception(f"Invalid media object: {media_object}")
\ No newline at end of file
@@ -219,6 +219,29 @@ class YoutubeEmbedCreator():
         except Exception as e:
             print(f"Error creating video embed: {e}")
 
+    @staticmethod
+    def create_metadata_embed(metadata):
+        """Same layout as create_video_embed, from a VideoMetadata so nothing has to be fetched."""
+        duration_value = "Unknown"
+        if metadata.duration_seconds is not None:
+            con_sec, con_min, con_hour = EmbedUtilities.convertMillis(metadata.duration_seconds * 1000)
+            duration_value = f"{con_hour:02d}:{con_min:02d}:{con_sec:02d}" if con_hour != 00 else f"{con_min:02d}:{con_sec:02d}"
+
+        fields = [
+            ("Title", metadata.title, True),
+            ("Duration", duration_value, True),
+            ("Popularity", metadata.views if metadata.views is not None else "Unknown", True),
+            ("Uploader", metadata.author or "Unknown", True)
+        ]
+
+        return EmbedUtilities.create_embed(
+            title=metadata.title,
+            color=0xb526d9,
+            url=metadata.url,
+            image_url=metadata.thumbnail_url,
+            fields=fields
+        )
+
     @staticmethod
     def create_video_search_embed(search_result_urls:list):
         fields = []
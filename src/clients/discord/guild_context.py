@@ -1,9 +1,116 @@
+import asyncio
+import sys
+import time
+from enum import Enum
+from typing import Optional
+
 import discord
 
+from clients.discord.discord_audio.queue.guild_queue import GuildQueue
+from clients.discord.discord_audio.queue.queue_prefetcher import GuildQueuePrefetcher
+from clients.discord.discord_audio.audio.discord_guild_audio_player import DiscordGuildAudioPlayer
+
+
+class PlaybackState(Enum):
+    IDLE = "idle"            # Nothing is playing, the next play command starts the queue
+    RESOLVING = "resolving"  # The next song is being popped and resolved
+    PLAYING = "playing"
+    PAUSED = "paused"
+
+
+class InvalidPlaybackTransition(Exception):
+    """Raised when a guild is moved to a playback state it cannot reach from its current one."""
+
+
 class GuildContext:
-    def __init__(self, bot, guild_id, guild_queue, audio_player, voice_client):
+    # The states each playback state can move to
+    TRANSITIONS = {
+        PlaybackState.IDLE: {PlaybackState.RESOLVING},
+        PlaybackState.RESOLVING: {PlaybackState.PLAYING, PlaybackState.IDLE},
+        PlaybackState.PLAYING: {PlaybackState.PAUSED, PlaybackState.RESOLVING, PlaybackState.IDLE},
+        PlaybackState.PAUSED: {PlaybackState.PLAYING, PlaybackState.RESOLVING, PlaybackState.IDLE},
+    }
+
+    def __init__(self, bot, guild_id: int, guild_queue: GuildQueue, prefetcher: GuildQueuePrefetcher):
+        """
+        Everything kept for one guild, created on first use by MusicManager.get_guild_context
+        and torn down in one place by MusicManager.close_guild_context.
+
+        Parameters:
+            bot (discord.Client): The bot.
+            guild_id (int): The ID of the guild.
+            guild_queue (GuildQueue): The queue of the guild.
+            prefetcher (GuildQueuePrefetcher): Keeps the head of the queue resolved.
+        """
         self.bot = bot
         self.guild_id = guild_id
         self.guild_queue = guild_queue
-        self.audio_player = audio_player
-        self.voice_client = voice_client
\ No newline at end of file
+        self.prefetcher = prefetcher
+        self.audio_player: Optional[DiscordGuildAudioPlayer] = None
+        # Only one connection attempt at a time, two !play commands would both try to connect otherwise
+        self.voice_lock = asyncio.Lock()
+        # Held while the next song is popped and started, so a play command and the end of a song never both pop
+        self.playback_lock = asyncio.Lock()
+        self.state = PlaybackState.IDLE
+        self.last_active = time.monotonic()
+        # People (not bots) in the voice channel of the bot, kept up to date from voice state events
+        self.listener_channel_id: Optional[int] = None
+        self.listener_count = 0
+        # Disconnects the bot once its channel has stayed empty for the grace period
+        self.empty_channel_task: Optional[asyncio.Task] = None
+        # Whether playback was paused because everyone left, so it is resumed when someone comes back
+        self.paused_when_empty = False
+
+    @property
+    def guild(self) -> Optional[discord.Guild]:
+        return self.bot.get_guild(self.guild_id)
+
+    @property
+    def voice_client(self) -> Optional[discord.VoiceClient]:
+        guild = self.guild
+        return guild.voice_client if guild is not None else None
+
+    def transition(self, state: PlaybackState) -> None:
+        """
+        Move the guild to another playback state.
+
+        Parameters:
+            state (PlaybackState): The new state.
+
+        Raises:
+            InvalidPlaybackTransition: If the new state cannot be reached from the current one.
+        """
+        if state is self.state:
+            return
+        if state not in self.TRANSITIONS[self.state]:
+            raise InvalidPlaybackTransition(f"Guild {self.guild_id} cannot go from {self.state.value} to {state.value}")
+        self.state = state
+
+    def touch(self) -> None:
+        """Mark the guild as active."""
+        self.last_active = time.monotonic()
+
+    def cancel_empty_channel_timer(self) -> None:
+        """Stop the pending disconnect of an empty channel, if any."""
+        if self.empty_channel_task is not None:
+            self.empty_channel_task.cancel()
+            self.empty_channel_task = None
+
+    def memory_bytes(self) -> int:
+        """
+        Estimate the memory held by the queue of the guild: the items and the strings they keep.
+
+        Returns:
+            int: The estimated size in bytes.
+        """
+        items = list(self.guild_queue.queue)
+        current_song = self.guild_queue.get_current_song()
+        if current_song is not None:
+            items.append(current_song)
+        size = 0
+        for item in items:
+            size += sys.getsizeof(item)
+            for value in (item.video_id, item.query, item.title, item.requester_name, item.spotify_keys):
+                if value is not None:
+                    size += sys.getsizeof(value)
+        return size
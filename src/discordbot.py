@@ -5,6 +5,9 @@ import discord
 from discord.ext import commands
 import traceback
 import asyncio
+from clients.discord.discord_audio.music_manager import MusicManager
+from clients.discord.discord_audio.queue.guild_queue_manager import GuildQueueManager
+from clients.discord.discord_audio.queue.queue_journal import QueueJournal
 
 def read_token(override_token=None):
     if override_token:
@@ -15,15 +18,29 @@ def read_token(override_token=None):
 class DiscordBot(commands.Bot):
     def __init__(self, command_prefix, intents):
         super().__init__(command_prefix=command_prefix, intents=intents)
+        # Voice channels to rejoin once connected, for queues restored from the journal
+        self.restored_voice_channels: dict[int, int] = {}
 
     async def setup_hook(self):
         self.register_commands()
+        self.session_reaper = asyncio.create_task(MusicManager(self).run_session_reaper())
 
     def register_commands(self):
         pass
 
     async def on_ready(self):
         print(f"Logged in as {self.user.name}")
+        await self.resume_restored_queues()
+
+    async def resume_restored_queues(self):
+        # on_ready fires again after reconnects, only the first one resumes anything
+        restored, self.restored_voice_channels = self.restored_voice_channels, {}
+        music_manager = MusicManager(self)
+        for guild_id, voice_channel_id in restored.items():
+            if self.get_guild(guild_id) is None:
+                continue
+            if await music_manager.play_queue_in_channel(guild_id, voice_channel_id):
+                print(f"Resumed the queue of guild {guild_id}")
 
     async def on_message(self, message):
         if message.author != self.user:
@@ -51,6 +68,9 @@ async def main():
     intents.voice_states = True
 
     bot = DiscordBot(command_prefix='!', intents=intents)
+    restored_voice_channels = GuildQueueManager().restore_from_journal()
+    if QueueJournal().rejoin_voice:
+        bot.restored_voice_channels = restored_voice_channels
     await bot.load_extension('clients.discord.discord_cogs.play_cog')
     await bot.load_extension('clients.discord.discord_cogs.playback_cog')
     await bot.load_extension('clients.discord.discord_cogs.voicechannel_cog')
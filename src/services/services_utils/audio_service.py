@@ -8,5 +8,5 @@ class AudioService(ABC):
         pass
 
     @abstractmethod
-    def download_song(self, url: str, id: str, duration: int) -> Optional[str]:
+    def download_song(self, url: str, id: str, itag: int = None, mime_type: str = "audio/webm") -> Optional[str]:
         pass
@@ -0,0 +1,41 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+class ServiceExecutor:
+    """
+    Shared thread pool that keeps blocking spotipy/pytubefix calls off the event loop.
+    Used by commands someone is waiting on, queued songs are resolved by the ResolverScheduler so they never delay them.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.max_workers = int(os.getenv('SERVICE_EXECUTOR_WORKERS', 8))
+                cls._instance.executor = ThreadPoolExecutor(max_workers=cls._instance.max_workers, thread_name_prefix="service")
+        return cls._instance
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable in the shared pool and await its result.
+
+        Parameters:
+            func (callable): The blocking function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            The return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        """Stop accepting work and let queued calls finish."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+from threading import Lock
+
+
+class _Flight:
+    def __init__(self, shared: asyncio.Future):
+        self.shared = shared
+        self.waiters: set[asyncio.Future] = set()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls on the event loop: the first caller for a key starts the call,
+    callers arriving while it runs get a future for its result (or its exception). Waiting takes no thread,
+    so duplicate requests never hold a worker of the service executor or the resolver pool.
+
+    Results are handed to every caller, so shared calls should return plain data rather than objects
+    that load lazily (a pytubefix YouTube or Playlist).
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.calls = {}
+                cls._instance.executed = 0
+                cls._instance.shared = 0
+        return cls._instance
+
+    def join(self, key, start) -> 'tuple[asyncio.Future, asyncio.Future]':
+        """
+        Join the call in flight for key, or start it with start(). Must be called from the event loop.
+
+        Parameters:
+            key: A hashable key identifying the call.
+            start (callable): Returns the awaitable (coroutine or future) doing the work, only called if nothing is in flight.
+
+        Returns:
+            tuple[asyncio.Future, asyncio.Future]: The shared call, and the future this caller awaits. Cancelling the
+            caller's future only stops waiting, the shared call is cancelled once every caller stopped waiting.
+        """
+        flight: _Flight = self.calls.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(start()))
+            self.calls[key] = flight
+            self.executed += 1
+            flight.shared.add_done_callback(functools.partial(self._finish, key, flight))
+        else:
+            self.shared += 1
+
+        waiter = asyncio.get_running_loop().create_future()
+        flight.waiters.add(waiter)
+        waiter.add_done_callback(functools.partial(self._leave, key, flight))
+        return flight.shared, waiter
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Await func(*args, **kwargs) unless a call with the same key is already in flight.
+
+        Parameters:
+            key: A hashable key identifying the call.
+            func (callable): The coroutine function to run.
+
+        Returns:
+            The result of the single upstream call.
+        """
+        _, waiter = self.join(key, functools.partial(func, *args, **kwargs))
+        return await waiter
+
+    def get_stats(self) -> dict:
+        """Return how many upstream calls were made and how many callers shared one instead."""
+        return {"executed": self.executed, "shared": self.shared, "in_flight": len(self.calls)}
+
+    def _finish(self, key, flight: _Flight, shared: asyncio.Future) -> None:
+        if self.calls.get(key) is flight:
+            del self.calls[key]
+        for waiter in list(flight.waiters):
+            if waiter.done():
+                continue
+            if shared.cancelled():
+                waiter.cancel()
+            elif shared.exception() is not None:
+                waiter.set_exception(shared.exception())
+            else:
+                waiter.set_result(shared.result())
+
+    def _leave(self, key, flight: _Flight, waiter: asyncio.Future) -> None:
+        flight.waiters.discard(waiter)
+        if waiter.cancelled() and not flight.waiters and not flight.shared.done():
+            # A caller arriving while the call is being cancelled starts a new one instead of getting the cancellation
+            if self.calls.get(key) is flight:
+                del self.calls[key]
+            flight.shared.cancel()
+
+
+def single_flight(key_func=None):
+    """
+    Decorate an async service method so identical concurrent calls share one upstream call.
+
+    Parameters:
+        key_func (callable, optional): Builds the key from the method arguments. Defaults to the arguments themselves.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if key_func is not None:
+                key = key_func(*args, **kwargs)
+            else:
+                key = (args, tuple(sorted(kwargs.items())))
+            return await SingleFlight().do((type(self).__name__, method.__name__, key), method, self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+from threading import Lock
+
+
+class SQLiteStore:
+    """
+    Thread-safe wrapper around one SQLite connection. The on-disk caches and the queue journal each open their own
+    on the same CACHE_DB_PATH file, so a large journal write never holds the lock a cache lookup waits on.
+    Writes are committed together or rolled back together.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Opens (or creates) the database file.
+
+        Parameters:
+            path (str, optional): The database file. Defaults to the CACHE_DB_PATH environment variable.
+        """
+        self.path = path or os.getenv('CACHE_DB_PATH', 'beatbot_cache.db')
+        self._lock = Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+    def execute(self, statement: str, parameters: tuple = ()) -> None:
+        """
+        Run a statement and commit it.
+
+        Parameters:
+            statement (str): The SQL statement.
+            parameters (tuple, optional): The statement parameters.
+        """
+        with self._lock:
+            with self.connection:
+                self.connection.execute(statement, parameters)
+
+    def executemany(self, statement: str, parameters: list) -> None:
+        """
+        Run a statement once per parameter tuple, in a single transaction.
+
+        Parameters:
+            statement (str): The SQL statement.
+            parameters (list): A list of parameter tuples.
+        """
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(statement, parameters)
+
+    def execute_batch(self, statements: list) -> None:
+        """
+        Run several different statements in a single transaction.
+
+        Parameters:
+            statements (list): A list of (statement, parameters) tuples.
+        """
+        with self._lock:
+            # Commits all of them, or none if one fails
+            with self.connection:
+                for statement, parameters in statements:
+                    self.connection.execute(statement, parameters)
+
+    def fetchone(self, statement: str, parameters: tuple = ()):
+        """Run a query and return its first row, or None."""
+        with self._lock:
+            return self.connection.execute(statement, parameters).fetchone()
+
+    def fetchall(self, statement: str, parameters: tuple = ()) -> list:
+        """Run a query and return all of its rows."""
+        with self._lock:
+            return self.connection.execute(statement, parameters).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
@@ -3,6 +3,9 @@ from spotipy.oauth2 import SpotifyClientCredentials
 import os
 from dotenv import load_dotenv
 
+from ..services_utils.service_executor import ServiceExecutor
+from ..services_utils.single_flight import single_flight
+
 
 #Base models
 from .albums import *
@@ -43,6 +46,15 @@ class SpotifyService:
             uri=artist_data['uri']
         )
 
+    def _create_spotify_external_ids(self, external_ids_data) -> SpotifyExternalIDs:
+        if not external_ids_data:
+            return None
+        return SpotifyExternalIDs(
+            isrc=external_ids_data.get('isrc'),
+            ean=external_ids_data.get('ean'),
+            upc=external_ids_data.get('upc')
+        )
+
     def _create_spotify_image(self, image_data) -> SpotifyImage:
         return SpotifyImage(
             height=image_data['height'],
@@ -118,7 +130,7 @@ class SpotifyService:
             disc_number=track_data['disc_number'],
             duration_ms=track_data['duration_ms'],
             explicit=track_data['explicit'],
-            external_ids=None,
+            external_ids=self._create_spotify_external_ids(track_data.get('external_ids')),
             external_urls=track_data['external_urls']['spotify'],
             href=track_data['href'],
             id=track_data['id'],
@@ -162,7 +174,7 @@ class SpotifyService:
             added_at=item['added_at'],
             added_by=item['added_by']['external_urls']['spotify'],
             is_local=item['is_local'],
-            track=self._create_spotify_track(item['track'])
+            track=self._create_spotify_track(item['track']) if item['track'] and item['track'].get('type') == 'track' else None
         )
 
 
@@ -212,6 +224,30 @@ class SpotifyService:
         )
 
 
+    def get_playlist_tracks_page(self, playlist_id: str, offset: int, limit: int = 100) -> SpotifyPlaylistTrackSearch:
+        """
+        Fetch one page of a playlist's tracks.
+
+        :param playlist_id: The playlist ID, URI or URL.
+        :param offset: The index of the first track of the page.
+        :param limit: The page size, at most 100.
+        :return: A SpotifyPlaylistTrackSearch holding the page.
+        """
+        response = self.spotify_client.playlist_items(playlist_id, limit=limit, offset=offset, additional_types=('track',))
+        return self._create_spotify_playlist_track_search(response)
+
+    def get_album_tracks_page(self, album_id: str, offset: int, limit: int = 50) -> SpotifyAlbumTrackSearch:
+        """
+        Fetch one page of an album's tracks.
+
+        :param album_id: The album ID, URI or URL.
+        :param offset: The index of the first track of the page.
+        :param limit: The page size, at most 50.
+        :return: A SpotifyAlbumTrackSearch holding the page.
+        """
+        response = self.spotify_client.album_tracks(album_id, limit=limit, offset=offset)
+        return self._create_spotify_album_track_search(response)
+
     def get_artist_by_id(self,artist_id:str) -> SpotifyArtist:
         response = self.spotify_client.artist(artist_id=artist_id)
         return SpotifyArtist(
@@ -241,6 +277,40 @@ class SpotifyService:
         return self._create_spotify_track_list(response['tracks'])
     
     
+    #Async facade, runs the blocking spotipy calls in the shared service executor.
+    #Identical concurrent lookups share one call, waiting for it takes no thread.
+    @single_flight()
+    async def get_album_by_id_async(self, album_id: str) -> SpotifyAlbum:
+        return await ServiceExecutor().run(self.get_album_by_id, album_id)
+
+    @single_flight()
+    async def get_track_by_id_async(self, track_id: str) -> SpotifyTrack:
+        return await ServiceExecutor().run(self.get_track_by_id, track_id)
+
+    @single_flight()
+    async def get_playlist_by_id_async(self, playlist_id: str) -> SpotifyPlaylist:
+        return await ServiceExecutor().run(self.get_playlist_by_id, playlist_id)
+
+    @single_flight()
+    async def get_playlist_tracks_page_async(self, playlist_id: str, offset: int, limit: int = 100) -> SpotifyPlaylistTrackSearch:
+        return await ServiceExecutor().run(self.get_playlist_tracks_page, playlist_id, offset, limit)
+
+    @single_flight()
+    async def get_album_tracks_page_async(self, album_id: str, offset: int, limit: int = 50) -> SpotifyAlbumTrackSearch:
+        return await ServiceExecutor().run(self.get_album_tracks_page, album_id, offset, limit)
+
+    @single_flight()
+    async def get_artist_by_id_async(self, artist_id: str) -> SpotifyArtist:
+        return await ServiceExecutor().run(self.get_artist_by_id, artist_id)
+
+    @single_flight()
+    async def get_artist_top_songs_async(self, artist_id: str) -> list[SpotifyTrack]:
+        return await ServiceExecutor().run(self.get_artist_top_songs, artist_id)
+
+    @single_flight()
+    async def perform_search_async(self, query: str, limit=1) -> list[SpotifyTrack]:
+        return await ServiceExecutor().run(self.perform_search, query, limit)
+
     #Recommendation Engine stuff
     def get_track_recommendations(self, seed_artists: list[str] = None, seed_tracks: list[str] = None, search_limit: int = 20, country: str = 'US') -> list[SpotifyTrack]:
         """
@@ -0,0 +1,159 @@
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Union
+
+from ..services_utils.sqlite_store import SQLiteStore
+from .tracks import SpotifyTrack
+from .albums import SpotifyAlbumTrack
+
+
+class SpotifyYouTubeMapping:
+    """
+    Remembers which YouTube video was chosen for a Spotify track, by ISRC and by Spotify track id.
+    The most recently used keys are kept in memory, SQLite keeps all of them.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.memory: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self.max_entries = int(os.getenv('SPOTIFY_MAPPING_CACHE_SIZE', 10000))
+        self.hits = 0
+        self.misses = 0
+
+        self.store = None
+        if os.getenv('SPOTIFY_MAPPING_DISK', '1') != '0':
+            try:
+                self.store = SQLiteStore()
+                self.store.execute(
+                    "CREATE TABLE IF NOT EXISTS spotify_youtube_mapping ("
+                    "key_type TEXT NOT NULL, key TEXT NOT NULL, video_id TEXT NOT NULL, stored_at REAL NOT NULL, "
+                    "PRIMARY KEY (key_type, key))"
+                )
+            except Exception as e:
+                print(f"Error opening the Spotify mapping database, using memory only: {e}")
+                self.store = None
+
+    @staticmethod
+    def track_keys(track: 'Union[SpotifyTrack, SpotifyAlbumTrack]') -> 'tuple[tuple[str, str], ...]':
+        """Return the keys a track is remembered under, ISRC first. Small enough to keep instead of the track."""
+        keys = []
+        external_ids = getattr(track, 'external_ids', None)
+        if external_ids is not None and external_ids.isrc:
+            keys.append(('isrc', external_ids.isrc.upper()))
+        if track.id:
+            keys.append(('spotify', track.id))
+        return tuple(keys)
+
+    def peek_video_id(self, keys: 'tuple[tuple[str, str], ...]') -> Optional[str]:
+        """
+        Look up the YouTube video id of a track in memory only, without counting a hit or refreshing it.
+        For checks that run on every queue change, such as whether a queued track is known to be unplayable.
+
+        Parameters:
+            keys (tuple[tuple[str, str], ...]): The keys of the Spotify track, from track_keys.
+
+        Returns:
+            str: The YouTube video id, or None if it is not in memory.
+        """
+        with self._lock:
+            for key in keys:
+                video_id = self.memory.get(key)
+                if video_id is not None:
+                    return video_id
+        return None
+
+    def get_cached_video_id(self, keys: 'tuple[tuple[str, str], ...]') -> Optional[str]:
+        """
+        Look up the YouTube video id of a track in memory only. Safe to call from the event loop.
+
+        Parameters:
+            keys (tuple[tuple[str, str], ...]): The keys of the Spotify track, from track_keys.
+
+        Returns:
+            str: The YouTube video id, or None if it is not in memory.
+        """
+        for key in keys:
+            video_id = self._recall(key)
+            if video_id is not None:
+                self.hits += 1
+                return video_id
+        return None
+
+    def get_video_id(self, keys: 'tuple[tuple[str, str], ...]') -> Optional[str]:
+        """
+        Look up the YouTube video id of a track, ISRC first, then Spotify track id.
+
+        Parameters:
+            keys (tuple[tuple[str, str], ...]): The keys of the Spotify track, from track_keys.
+
+        Returns:
+            str: The YouTube video id, or None if the track was never resolved.
+        """
+        video_id = self.get_cached_video_id(keys)
+        if video_id is not None:
+            return video_id
+
+        if self.store is not None:
+            try:
+                for key_type, key in keys:
+                    row = self.store.fetchone(
+                        "SELECT video_id FROM spotify_youtube_mapping WHERE key_type = ? AND key = ?", (key_type, key)
+                    )
+                    if row is not None:
+                        self._remember((key_type, key), row[0])
+                        self.hits += 1
+                        return row[0]
+            except Exception as e:
+                print(f"Error reading the Spotify mapping: {e}")
+
+        self.misses += 1
+        return None
+
+    def put(self, keys: 'tuple[tuple[str, str], ...]', video_id: str) -> None:
+        """
+        Record the YouTube video chosen for a track under every key it has.
+
+        Parameters:
+            keys (tuple[tuple[str, str], ...]): The keys of the Spotify track, from track_keys.
+            video_id (str): The YouTube video id.
+        """
+        for key in keys:
+            self._remember(key, video_id)
+
+        if self.store is not None and keys:
+            try:
+                stored_at = time.time()
+                self.store.executemany(
+                    "INSERT OR REPLACE INTO spotify_youtube_mapping (key_type, key, video_id, stored_at) VALUES (?, ?, ?, ?)",
+                    [(key_type, key, video_id, stored_at) for key_type, key in keys]
+                )
+            except Exception as e:
+                print(f"Error writing the Spotify mapping: {e}")
+
+    def _recall(self, key: 'tuple[str, str]') -> Optional[str]:
+        with self._lock:
+            video_id = self.memory.get(key)
+            if video_id is not None:
+                self.memory.move_to_end(key)
+            return video_id
+
+    def _remember(self, key: 'tuple[str, str]', video_id: str) -> None:
+        with self._lock:
+            self.memory[key] = video_id
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        """Return the hit and miss counts and the number of keys kept in memory."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.memory)}
@@ -0,0 +1,233 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+
+@dataclass
+class CachedAudioFile:
+    video_id: str
+    itag: int
+    path: str
+    size: int
+    audio_codec: Optional[str]
+
+
+# Only the container is in the file name, YouTube's WebM audio is always Opus.
+EXTENSIONS = {"audio/webm": "webm", "audio/mp4": "m4a"}
+CODECS = {"webm": "opus"}
+
+
+class YouTubeAudioCache:
+    """
+    Size-bounded on-disk cache of downloaded audio streams, keyed by video id and itag.
+
+    Only tracks played at least AUDIO_CACHE_MIN_PLAYS times are downloaded. When the cache is over
+    AUDIO_CACHE_MAX_BYTES, the least played of the least recently used files are evicted first.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.directory = os.getenv('AUDIO_CACHE_DIR', 'audio_cache')
+        self.max_bytes = int(os.getenv('AUDIO_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+        self.min_plays = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', 2))
+        # How many of the least recently used files are compared by play count when evicting.
+        self.eviction_window = 8
+        self.max_tracked_plays = 10000
+        self.enabled = self.max_bytes > 0
+
+        self.files: OrderedDict[str, CachedAudioFile] = OrderedDict()
+        self.plays: OrderedDict[str, int] = OrderedDict()
+        self.downloading: set[str] = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # A download holds its thread for the whole file, so it stays out of the resolver pool
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv('AUDIO_CACHE_DOWNLOAD_WORKERS', 1)), thread_name_prefix="audio-cache")
+
+        if self.enabled:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self._load_directory()
+            except OSError as e:
+                print(f"Error opening the audio cache directory, disabling it: {e}")
+                self.enabled = False
+
+    def _load_directory(self) -> None:
+        # Files are named <video_id>.<itag>.<ext>, oldest first so the most recently used end up last.
+        entries = []
+        for name in os.listdir(self.directory):
+            parts = name.split('.')
+            path = os.path.join(self.directory, name)
+            if len(parts) != 3 or not parts[1].isdigit():
+                if name.endswith('.part'):
+                    os.remove(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, CachedAudioFile(parts[0], int(parts[1]), path, stat.st_size, CODECS.get(parts[2]))))
+
+        for _, cached_file in sorted(entries, key=lambda entry: entry[0]):
+            self.files[cached_file.video_id] = cached_file
+            self.total_bytes += cached_file.size
+        self._evict()
+
+    def get(self, video_id: str) -> Optional[CachedAudioFile]:
+        """
+        Return the cached file of a video and mark it as recently used.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+
+        Returns:
+            CachedAudioFile: The cached file, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            cached_file = self.files.get(video_id)
+            if cached_file is None or not os.path.exists(cached_file.path):
+                if cached_file is not None:
+                    self._remove(video_id)
+                self.misses += 1
+                return None
+            self.files.move_to_end(video_id)
+            self.hits += 1
+        try:
+            # The modification time keeps the LRU order across restarts
+            os.utime(cached_file.path)
+        except OSError:
+            pass
+        return cached_file
+
+    def contains(self, video_id: str) -> bool:
+        """Return True if a video is cached, without counting a hit or marking it as used."""
+        return self.enabled and video_id in self.files
+
+    def record_play(self, video_id: str) -> int:
+        """
+        Count a play of a video.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+
+        Returns:
+            int: How many times the video has been played.
+        """
+        with self._lock:
+            plays = self.plays.pop(video_id, 0) + 1
+            self.plays[video_id] = plays
+            while len(self.plays) > self.max_tracked_plays:
+                self.plays.popitem(last=False)
+            return plays
+
+    def should_download(self, video_id: str) -> bool:
+        """Return True if a video has been played often enough to cache and is not cached or downloading yet."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return (
+                self.plays.get(video_id, 0) >= self.min_plays
+                and video_id not in self.files
+                and video_id not in self.downloading
+            )
+
+    def schedule_download(self, video_id: str, download, *args) -> bool:
+        """
+        Run a download in the background, at most once per video at a time.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+            download (callable): The blocking function filling the cache.
+            *args: Arguments for the function.
+
+        Returns:
+            bool: True if the download was scheduled, False if it is already running.
+        """
+        with self._lock:
+            if video_id in self.downloading:
+                return False
+            self.downloading.add(video_id)
+
+        def run():
+            try:
+                download(*args)
+            except Exception as e:
+                print(f"Error caching audio for {video_id}: {e}")
+            finally:
+                with self._lock:
+                    self.downloading.discard(video_id)
+
+        self.executor.submit(run)
+        return True
+
+    def get_download_path(self, video_id: str, itag: int, mime_type: str) -> str:
+        """Return the path a download should be written to, it is renamed by put_file once complete."""
+        extension = EXTENSIONS.get(mime_type, "bin")
+        return os.path.join(self.directory, f"{video_id}.{itag}.{extension}.part")
+
+    def put_file(self, video_id: str, itag: int, download_path: str) -> CachedAudioFile:
+        """
+        Move a completed download into the cache and evict files until it fits.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+            itag (int): The stream format that was downloaded.
+            download_path (str): The path returned by get_download_path.
+
+        Returns:
+            CachedAudioFile: The cached file.
+        """
+        path = download_path.removesuffix('.part')
+        os.replace(download_path, path)
+        cached_file = CachedAudioFile(video_id, itag, path, os.path.getsize(path), CODECS.get(path.rsplit('.', 1)[1]))
+
+        with self._lock:
+            if video_id in self.files:
+                self._remove(video_id, delete=self.files[video_id].path != path)
+            self.files[video_id] = cached_file
+            self.total_bytes += cached_file.size
+            self._evict()
+        return cached_file
+
+    def get_stats(self) -> dict:
+        """Return the hit, miss and eviction counts, the number of cached files and their total size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.files),
+            "bytes": self.total_bytes,
+            "downloading": len(self.downloading),
+        }
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            # Least recently used first, the least played of those goes
+            candidates = []
+            for video_id in self.files:
+                candidates.append(video_id)
+                if len(candidates) >= self.eviction_window:
+                    break
+            victim = min(candidates, key=lambda video_id: self.plays.get(video_id, 0))
+            self._remove(victim)
+            self.evictions += 1
+
+    def _remove(self, video_id: str, delete: bool = True) -> None:
+        cached_file = self.files.pop(video_id)
+        self.total_bytes -= cached_file.size
+        if delete:
+            try:
+                os.remove(cached_file.path)
+            except OSError:
+                pass
@@ -1,6 +1,7 @@
 import datetime
 #from download_utils.audio_download_manager import AudioDownloadManager
-from pytubefix import YouTube, Playlist, Channel, Stream
+from pytubefix import YouTube, Playlist, Channel, Stream, extract, request
+from .youtube_playlist_entry import YouTubePlaylistEntry
 
 class YouTubeData:
     def __init__(self):
@@ -8,17 +9,104 @@ class YouTubeData:
               
     def get_playlist(self, url: str): 
         return Playlist(url)
+
+    def iter_playlist_entries(self, playlist: Playlist):
+        # video_urls fetches one page (up to 100 videos) at a time, as it is iterated.
+        # Each page also carries the video titles, pytubefix only keeps the ids so they are read on the way.
+        titles = {}
+        extract_ids = getattr(playlist, '_extract_ids', None)
+        if extract_ids is not None:
+            def extract_ids_and_titles(items: list) -> list:
+                titles.update(self.get_playlist_page_titles(items))
+                return extract_ids(items)
+            playlist._extract_ids = extract_ids_and_titles
+
+        for url in playlist.video_urls:
+            video_id = extract.video_id(url)
+            yield YouTubePlaylistEntry(video_id=video_id, url=url, title=titles.pop(video_id, None))
+
+    @staticmethod
+    def get_playlist_page_titles(items: list) -> dict:
+        """
+        Read the video titles of a playlist page.
+
+        Parameters:
+            items (list): The video renderers of the page, as passed to Playlist._extract_ids.
+
+        Returns:
+            dict: The title of each video id found, videos without one are left out.
+        """
+        titles = {}
+        for item in items:
+            try:
+                if 'playlistVideoRenderer' in item:
+                    renderer = item['playlistVideoRenderer']
+                    title = renderer['title']
+                    titles[renderer['videoId']] = title['runs'][0]['text'] if 'runs' in title else title['simpleText']
+                elif 'lockupViewModel' in item:
+                    lockup = item['lockupViewModel']
+                    titles[lockup['contentId']] = lockup['metadata']['lockupMetadataViewModel']['title']['content']
+            except (KeyError, IndexError, TypeError):
+                continue
+        return titles
         
-    def get_audio_stream(self, yt: YouTube):
+    def get_audio_stream(self, yt: YouTube, target_kbps: int = None):
         try:            
-            stream = yt.streams.filter(only_audio=True).first()
-            if stream:
-                return stream
-            return None
+            return self.select_audio_stream(self.get_audio_streams(yt), target_kbps=target_kbps)
         except Exception as e:
             #print(f"Error fetching audio stream: {e}")
             return None
+
+    def select_audio_stream(self, streams: list, prefer_opus=True, target_kbps: int = None):
+        """
+        Pick the audio stream to play. Opus streams (WebM itags 249/250/251) can be sent to Discord
+        without re-encoding, so they win over AAC when prefer_opus is set.
+
+        With a target bitrate (the voice channel's), the lowest bitrate stream that still covers it is picked:
+        anything above it is thrown away by the channel, so it only costs bandwidth and transcoding time.
+        If nothing covers the target, the highest bitrate stream is picked.
+
+        Parameters:
+            streams (list): pytubefix Streams or cached streams, anything with itag, audio_codec and abr.
+            prefer_opus (bool, optional): Whether to prefer Opus streams. Defaults to True.
+            target_kbps (int, optional): The bitrate the audio will be played at. Defaults to None (best available).
+
+        Returns:
+            The selected stream, or None if there are no streams.
+        """
+        if not streams:
+            return None
+
+        candidates = streams
+        if prefer_opus:
+            opus_streams = [stream for stream in streams if stream.audio_codec == "opus"]
+            if opus_streams:
+                candidates = opus_streams
+
+        if target_kbps:
+            covering = [stream for stream in candidates if self._parse_abr(stream.abr) >= target_kbps]
+            if covering:
+                return min(covering, key=lambda stream: self._parse_abr(stream.abr))
+        return max(candidates, key=lambda stream: self._parse_abr(stream.abr))
+
+    @staticmethod
+    def _parse_abr(abr: str) -> int:
+        # pytubefix reports bitrates as strings like "160kbps"
+        try:
+            return int(abr.rstrip("kbps"))
+        except (AttributeError, ValueError):
+            return 0
+
+    def get_audio_streams(self, yt: YouTube) -> list[Stream]:
+        # Extraction errors propagate, the service classifies them for the negative cache.
+        return list(yt.streams.filter(only_audio=True))
         
+    def download_stream(self, url: str, path: str) -> None:
+        # Downloads in ranged chunks, googlevideo throttles plain requests for whole files
+        with open(path, "wb") as file:
+            for chunk in request.stream(url, max_retries=2):
+                file.write(chunk)
+
     def get_youtube_object(self, url: str):
         return YouTube(url)
 
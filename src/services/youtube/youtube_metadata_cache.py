@@ -0,0 +1,150 @@
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from threading import Lock
+from typing import Optional
+
+from pytubefix import YouTube
+
+
+@dataclass(frozen=True)
+class VideoMetadata:
+    video_id: Optional[str]
+    title: Optional[str]
+    duration_seconds: Optional[int] = None
+    thumbnail_url: Optional[str] = None
+    author: Optional[str] = None
+    views: Optional[int] = None
+
+    @property
+    def url(self) -> Optional[str]:
+        if self.video_id is None:
+            return None
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+    def is_complete(self) -> bool:
+        """Return True if everything an embed shows is known."""
+        return None not in (self.title, self.duration_seconds, self.thumbnail_url, self.author)
+
+
+class YouTubeMetadataCache:
+    """
+    In-memory LRU of what is shown about a video (title, duration, thumbnail, uploader), keyed by video id.
+
+    It is filled from data the bot already has: search results, playlist entries and YouTube objects
+    whose details were loaded while resolving them, so displaying a queue needs no stream extraction.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.entries: OrderedDict[str, VideoMetadata] = OrderedDict()
+        self.max_entries = int(os.getenv('METADATA_CACHE_SIZE', 10000))
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, video_id: str) -> Optional[VideoMetadata]:
+        """
+        Parameters:
+            video_id (str): The YouTube video id.
+
+        Returns:
+            VideoMetadata: What is known about the video, or None.
+        """
+        with self._lock:
+            metadata = self.entries.get(video_id)
+            if metadata is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(video_id)
+            self.hits += 1
+            return metadata
+
+    def put(self, metadata: VideoMetadata) -> VideoMetadata:
+        """
+        Remember what is known about a video, keeping the fields the new metadata does not have.
+
+        Parameters:
+            metadata (VideoMetadata): The metadata, video_id must be set.
+
+        Returns:
+            VideoMetadata: The merged metadata.
+        """
+        with self._lock:
+            known = self.entries.pop(metadata.video_id, None)
+            if known is not None:
+                metadata = replace(known, **{
+                    field.name: getattr(metadata, field.name)
+                    for field in fields(metadata) if getattr(metadata, field.name) is not None
+                })
+            self.entries[metadata.video_id] = metadata
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return metadata
+
+    def put_search_results(self, results: list[dict]) -> None:
+        """Remember the videos of a YoutubeSearch result list."""
+        for result in results or []:
+            if not result or not result.get('id'):
+                continue
+            thumbnails = result.get('thumbnails') or [None]
+            self.put(VideoMetadata(
+                video_id=result['id'],
+                title=result.get('title'),
+                duration_seconds=self.parse_duration(result.get('duration')),
+                thumbnail_url=thumbnails[0],
+                author=result.get('channel'),
+                views=self.parse_views(result.get('views')),
+            ))
+
+    def put_youtube(self, yt: YouTube) -> Optional[VideoMetadata]:
+        """
+        Remember the details of a YouTube object if they are already loaded. Never touches the network.
+
+        Returns:
+            VideoMetadata: The merged metadata, or None if the details were not loaded.
+        """
+        vid_info = yt._vid_info
+        if not vid_info or 'videoDetails' not in vid_info:
+            return None
+        details = vid_info['videoDetails']
+        thumbnails = details.get('thumbnail', {}).get('thumbnails') or [{}]
+        return self.put(VideoMetadata(
+            video_id=yt.video_id,
+            title=details.get('title'),
+            duration_seconds=int(details['lengthSeconds']) if str(details.get('lengthSeconds', '')).isdigit() else None,
+            # The last thumbnail is the largest
+            thumbnail_url=thumbnails[-1].get('url'),
+            author=details.get('author'),
+            views=int(details['viewCount']) if str(details.get('viewCount', '')).isdigit() else None,
+        ))
+
+    def get_stats(self) -> dict:
+        """Return the hit and miss counts and the number of videos remembered."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+    @staticmethod
+    def parse_duration(duration) -> Optional[int]:
+        """Parse a "1:02:03" style duration into seconds."""
+        if isinstance(duration, int):
+            return duration
+        if not duration or not re.fullmatch(r'\d+(:\d+)*', str(duration)):
+            return None
+        seconds = 0
+        for part in str(duration).split(':'):
+            seconds = seconds * 60 + int(part)
+        return seconds
+
+    @staticmethod
+    def parse_views(views) -> Optional[int]:
+        """Parse a "1,234,567 views" style count."""
+        digits = re.sub(r'\D', '', str(views or ''))
+        return int(digits) if digits else None
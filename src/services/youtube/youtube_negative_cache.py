@@ -0,0 +1,112 @@
+import os
+import enum
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from pytubefix import exceptions
+
+
+class FailureReason(enum.Enum):
+    AGE_RESTRICTED = "age restricted"
+    UNAVAILABLE = "unavailable"
+    NO_RESULTS = "not found"
+    EXTRACTION_FAILED = "unplayable"
+
+
+# Seconds each kind of failure is remembered. Extraction failures are often transient (rate limits, bot checks).
+DEFAULT_FAILURE_TTLS = {
+    FailureReason.AGE_RESTRICTED: 7 * 24 * 60 * 60,
+    FailureReason.UNAVAILABLE: 24 * 60 * 60,
+    FailureReason.NO_RESULTS: 60 * 60,
+    FailureReason.EXTRACTION_FAILED: 10 * 60,
+}
+
+# pytubefix reports these as unavailable videos, but they say nothing about the video itself.
+TRANSIENT_ERRORS = ("BotDetection", "PoTokenRequired", "MaxRetriesExceeded")
+
+
+class YouTubeNegativeCache:
+    """Remembers videos and search queries that failed to resolve, so they are skipped instead of retried."""
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.entries: OrderedDict[tuple[str, str], tuple[FailureReason, float]] = OrderedDict()
+        self.max_entries = int(os.getenv('NEGATIVE_CACHE_SIZE', 10000))
+        self.ttls = {
+            reason: int(os.getenv(f'NEGATIVE_CACHE_TTL_{reason.name}', ttl))
+            for reason, ttl in DEFAULT_FAILURE_TTLS.items()
+        }
+        self.hits = 0
+
+    @staticmethod
+    def classify(error: Exception) -> FailureReason:
+        """
+        Map a pytubefix error to a failure class.
+
+        Parameters:
+            error (Exception): The error raised while resolving a video.
+
+        Returns:
+            FailureReason: The failure class to remember it under.
+        """
+        name = type(error).__name__
+        if isinstance(error, exceptions.AgeRestrictedError) or name.startswith("AgeCheck"):
+            return FailureReason.AGE_RESTRICTED
+        if name in TRANSIENT_ERRORS:
+            return FailureReason.EXTRACTION_FAILED
+        if isinstance(error, exceptions.VideoUnavailable):
+            return FailureReason.UNAVAILABLE
+        return FailureReason.EXTRACTION_FAILED
+
+    def get_video_failure(self, video_id: str) -> Optional[FailureReason]:
+        """Return why a video failed recently, or None if it is not known to fail."""
+        return self._get(('video', video_id))
+
+    def get_query_failure(self, query: str) -> Optional[FailureReason]:
+        """Return why a search query failed recently, or None if it is not known to fail."""
+        return self._get(('query', self._normalize(query)))
+
+    def record_video_failure(self, video_id: str, reason: FailureReason) -> None:
+        """Remember that a video failed to resolve."""
+        self._put(('video', video_id), reason)
+
+    def record_query_failure(self, query: str, reason: FailureReason) -> None:
+        """Remember that a search query failed to resolve."""
+        self._put(('query', self._normalize(query)), reason)
+
+    def get_stats(self) -> dict:
+        """Return the hit count and number of remembered failures."""
+        return {"hits": self.hits, "size": len(self.entries)}
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.split()).lower()
+
+    def _get(self, key: tuple[str, str]) -> Optional[FailureReason]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            reason, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.hits += 1
+            return reason
+
+    def _put(self, key: tuple[str, str], reason: FailureReason) -> None:
+        with self._lock:
+            self.entries[key] = (reason, time.time() + self.ttls[reason])
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
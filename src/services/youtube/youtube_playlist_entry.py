@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass(frozen=True)
+class YouTubePlaylistEntry:
+    """A playlist video that has not been turned into a pytubefix YouTube object yet."""
+    video_id: str
+    url: str
+    title: Optional[str] = None
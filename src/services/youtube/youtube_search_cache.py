@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from ..services_utils.sqlite_store import SQLiteStore
+
+
+class YouTubeSearchCache:
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.memory: OrderedDict[str, tuple[float, int, list[dict]]] = OrderedDict()
+        self.max_memory_entries = int(os.getenv('SEARCH_CACHE_SIZE', 5000))
+        self.ttl = int(os.getenv('SEARCH_CACHE_TTL', 7 * 24 * 60 * 60))
+        self.max_disk_entries = int(os.getenv('SEARCH_CACHE_DISK_SIZE', 100000))
+        # Expired and excess rows are deleted every this many writes, rather than on every one
+        self.prune_interval = int(os.getenv('SEARCH_CACHE_PRUNE_INTERVAL', 100))
+        self.writes_since_prune = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.store = None
+        if os.getenv('SEARCH_CACHE_DISK', '1') != '0':
+            try:
+                self.store = SQLiteStore()
+                self.store.execute(
+                    "CREATE TABLE IF NOT EXISTS youtube_search_cache ("
+                    "query TEXT PRIMARY KEY, result_limit INTEGER NOT NULL, results TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self.store.execute(
+                    "CREATE INDEX IF NOT EXISTS youtube_search_cache_stored_at ON youtube_search_cache (stored_at)"
+                )
+                self.prune()
+            except Exception as e:
+                print(f"Error opening the search cache database, using memory only: {e}")
+                self.store = None
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Normalize a search query so trivially different spellings share one cache entry.
+
+        Parameters:
+            query (str): The raw search query.
+
+        Returns:
+            str: The lowercased query with collapsed whitespace.
+        """
+        return re.sub(r'\s+', ' ', query).strip().lower()
+
+    def get(self, query: str, limit: int) -> Optional[list[dict]]:
+        """
+        Return cached search results for a query, if at least `limit` results were cached.
+
+        Parameters:
+            query (str): The search query.
+            limit (int): The number of results requested.
+
+        Returns:
+            list[dict]: The cached results, or None on a miss.
+        """
+        key = self.normalize_query(query)
+        now = time.time()
+
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                stored_at, result_limit, results = entry
+                if now - stored_at < self.ttl and result_limit >= limit:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return results[:limit]
+
+        if self.store is not None:
+            try:
+                row = self.store.fetchone(
+                    "SELECT result_limit, results, stored_at FROM youtube_search_cache WHERE query = ?", (key,)
+                )
+                if row is not None:
+                    result_limit, results, stored_at = row
+                    if now - stored_at >= self.ttl:
+                        self.store.execute("DELETE FROM youtube_search_cache WHERE query = ?", (key,))
+                    elif result_limit >= limit:
+                        results = json.loads(results)
+                        self._remember(key, stored_at, result_limit, results)
+                        self.disk_hits += 1
+                        return results[:limit]
+            except Exception as e:
+                print(f"Error reading the search cache: {e}")
+
+        self.misses += 1
+        return None
+
+    def put(self, query: str, limit: int, results: list[dict]) -> None:
+        """
+        Cache the results of a search, in memory and on disk.
+        Every SEARCH_CACHE_PRUNE_INTERVAL writes the expired rows, and the oldest rows beyond SEARCH_CACHE_DISK_SIZE, are deleted.
+
+        Parameters:
+            query (str): The search query.
+            limit (int): The number of results that were requested.
+            results (list[dict]): The search results.
+        """
+        key = self.normalize_query(query)
+        stored_at = time.time()
+        self._remember(key, stored_at, limit, results)
+
+        if self.store is not None:
+            try:
+                self.store.execute(
+                    "INSERT OR REPLACE INTO youtube_search_cache (query, result_limit, results, stored_at) VALUES (?, ?, ?, ?)",
+                    (key, limit, json.dumps(results), stored_at)
+                )
+            except Exception as e:
+                print(f"Error writing the search cache: {e}")
+                return
+
+            with self._lock:
+                self.writes_since_prune += 1
+                due = self.writes_since_prune >= self.prune_interval
+                if due:
+                    self.writes_since_prune = 0
+            if due:
+                self.prune(stored_at)
+
+    def prune(self, now: float = None) -> None:
+        """
+        Delete the expired rows from disk, then the oldest rows beyond SEARCH_CACHE_DISK_SIZE.
+
+        Parameters:
+            now (float, optional): The current time. Defaults to time.time().
+        """
+        if self.store is None:
+            return
+        now = time.time() if now is None else now
+        statements = [("DELETE FROM youtube_search_cache WHERE stored_at < ?", (now - self.ttl,))]
+        if self.max_disk_entries > 0:
+            statements.append((
+                "DELETE FROM youtube_search_cache WHERE query IN "
+                "(SELECT query FROM youtube_search_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            ))
+        try:
+            self.store.execute_batch(statements)
+        except Exception as e:
+            print(f"Error pruning the search cache: {e}")
+
+    def _remember(self, key: str, stored_at: float, limit: int, results: list[dict]) -> None:
+        with self._lock:
+            self.memory[key] = (stored_at, limit, results)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_memory_entries:
+                self.memory.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        """Return the memory hits, disk hits and misses and the number of entries kept in memory."""
+        return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.memory)}
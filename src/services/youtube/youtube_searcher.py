@@ -1,17 +1,29 @@
 from youtube_search import YoutubeSearch
+from .youtube_search_cache import YouTubeSearchCache
+from .youtube_negative_cache import YouTubeNegativeCache, FailureReason
 
 class YouTubeSearcher:
     def __init__(self):
-        pass
-    
+        self.search_cache = YouTubeSearchCache()
+        self.negative_cache = YouTubeNegativeCache()
+
     def perform_search(self, query: str, limit=1) -> str:
         #print(f"YoutubeSearch for {query}")
+        cached_results = self.search_cache.get(query, limit)
+        if cached_results:
+            return cached_results
+
+        if self.negative_cache.get_query_failure(query) is not None:
+            return None
+
         try:
             results = YoutubeSearch(query, max_results=limit).to_dict()
 
             if len(results) == 0:
+                self.negative_cache.record_query_failure(query, FailureReason.NO_RESULTS)
                 return None
 
+            self.search_cache.put(query, limit, results)
             #url = f"https://www.youtube.com{results[0]['url_suffix']}"
             return results
         except Exception as e:
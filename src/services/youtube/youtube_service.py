@@ -1,12 +1,22 @@
+import os
 from ..services_utils.audio_service import AudioService
 from .youtube_data import YouTubeData
 from .youtube_url import YouTubeURL
 from .youtube_searcher import YouTubeSearcher
+from .youtube_stream_cache import YouTubeStreamCache, CachedAudioStream
+from .youtube_audio_cache import YouTubeAudioCache, CachedAudioFile
+from .youtube_playlist_entry import YouTubePlaylistEntry
+from ..services_utils.service_executor import ServiceExecutor
+from ..services_utils.single_flight import single_flight
+from .youtube_search_cache import YouTubeSearchCache
+from .youtube_negative_cache import YouTubeNegativeCache, FailureReason
+from .youtube_metadata_cache import YouTubeMetadataCache, VideoMetadata
 
 #typing
 #from typing import TYPE_CHECKING
 #if TYPE_CHECKING:
-from pytubefix import YouTube, Playlist, Channel, Stream
+from typing import Iterator, Optional
+from pytubefix import YouTube, Playlist, Channel
 
 class YouTubeService(AudioService):
     _instance = None
@@ -21,6 +31,10 @@ class YouTubeService(AudioService):
         self.search_handler = YouTubeSearcher()
         self.data_handler = YouTubeData()
         self.url_validator = YouTubeURL()
+        self.stream_cache = YouTubeStreamCache()
+        self.negative_cache = YouTubeNegativeCache()
+        self.audio_cache = YouTubeAudioCache()
+        self.metadata_cache = YouTubeMetadataCache()
 
     def __str__(self):
         return "YouTube Service"
@@ -32,9 +46,22 @@ class YouTubeService(AudioService):
         return self.search_handler.perform_search(query, limit)
     
     def search_and_bind(self, query: str, limit=1) -> list[YouTube]:
-        search_results: list[dict] = self.search_handler.perform_search(query, limit)
+        return self.bind_search_results(self.perform_search(query, limit))
+
+    def bind_search_results(self, search_results: list[dict]) -> list[YouTube]:
+        """
+        Build a YouTube object for each search result. The objects load their details lazily and are not
+        thread-safe, so each caller builds its own from the shared results. Does not touch the network.
+
+        Parameters:
+            search_results (list[dict]): The results of perform_search.
+
+        Returns:
+            list[YouTube]: The videos, or None if the search failed.
+        """
         if search_results is None:
             return None
+        self.metadata_cache.put_search_results(search_results)
 
         answer = []
         for video in search_results:
@@ -48,35 +75,204 @@ class YouTubeService(AudioService):
 
         return answer
            
-    def download_song(self, url: str, id: str) -> str:
-        pass
+    def download_song(self, url: str, id: str, itag: int = None, mime_type: str = "audio/webm") -> str:
+        """
+        Download an audio stream into the audio cache. Blocking, run it in the background.
+
+        Parameters:
+            url (str): The signed stream URL.
+            id (str): The YouTube video id.
+            itag (int, optional): The stream format being downloaded.
+            mime_type (str, optional): The mime type of the stream, used for the file extension.
+
+        Returns:
+            str: The path of the cached file.
+        """
+        download_path = self.audio_cache.get_download_path(id, itag, mime_type)
+        try:
+            self.data_handler.download_stream(url, download_path)
+        except Exception:
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            raise
+        return self.audio_cache.put_file(id, itag, download_path).path
+
+    def get_cached_audio_file(self, video_id: str) -> Optional[CachedAudioFile]:
+        return self.audio_cache.get(video_id)
+
+    def record_play(self, video_id: str, audio_stream: CachedAudioStream = None) -> int:
+        """
+        Count a play of a video and return the play count. Once it has been played often enough, the stream
+        it was played from is downloaded to the audio cache in the background so later plays come from disk.
+        """
+        plays = self.audio_cache.record_play(video_id)
+        if audio_stream is not None and self.audio_cache.should_download(video_id):
+            self.audio_cache.schedule_download(
+                video_id, self.download_song, audio_stream.url, video_id, audio_stream.itag, audio_stream.mime_type
+            )
+        return plays
     
     def get_youtube_by_url(self, url: str) -> YouTube:
         return self.data_handler.get_video_information(url)
     
     def get_playlist_from_url(self, url: str) -> Playlist:
+        # Not shared between callers, a Playlist fetches its pages lazily and is not thread-safe
         return self.data_handler.get_playlist(url)
+
+    def iter_playlist_entries(self, playlist: Playlist) -> 'Iterator[YouTubePlaylistEntry]':
+        return self.data_handler.iter_playlist_entries(playlist)
     
-    def get_audio_stream(self, yt:YouTube) -> Stream:
-        #if yt.age_restricted:
-        #    return None
-        #print(yt.age_restricted)
-        results = self.data_handler.get_audio_stream(yt)
-        if results is not None:
-            return results.url
-        return None
+    def get_known_failure(self, yt: YouTube) -> Optional[FailureReason]:
+        """Return why the video failed to resolve recently, without touching the network."""
+        return self.negative_cache.get_video_failure(yt.video_id)
+
+    def check_playable(self, yt: YouTube) -> Optional[FailureReason]:
+        """
+        Return why the video cannot be played, or None if it can.
+        Known failures are answered from the negative cache, otherwise age restriction is checked and remembered.
+        """
+        failure = self.get_known_failure(yt)
+        if failure is not None:
+            return failure
+
+        try:
+            age_restricted = yt.age_restricted
+        except Exception as e:
+            failure = self.negative_cache.classify(e)
+        else:
+            if not age_restricted:
+                self.metadata_cache.put_youtube(yt)
+                return None
+            failure = FailureReason.AGE_RESTRICTED
+
+        self.negative_cache.record_video_failure(yt.video_id, failure)
+        return failure
+
+    def get_audio_stream(self, yt:YouTube, target_kbps: int = None) -> str:
+        audio_stream = self.get_audio_stream_info(yt, target_kbps)
+        if audio_stream is None:
+            return None
+        return audio_stream.url
+
+    def get_audio_stream_info(self, yt: YouTube, target_kbps: int = None) -> CachedAudioStream:
+        """
+        Return the audio stream to play for a video, along with its codec and bitrate.
+        Opus streams are preferred so they can be played without re-encoding, and the bitrate is matched
+        to target_kbps (the voice channel's bitrate) when it is given.
+        """
+        return self.data_handler.select_audio_stream(self.get_audio_streams(yt), target_kbps=target_kbps)
+
+    def get_audio_streams(self, yt: YouTube) -> list[CachedAudioStream]:
+        """Return every audio stream of a video, from the stream cache when possible."""
+        cached = self.stream_cache.get_streams(yt.video_id)
+        if cached:
+            return cached
+
+        if self.get_known_failure(yt) is not None:
+            return []
+
+        try:
+            streams = self.data_handler.get_audio_streams(yt)
+        except Exception as e:
+            failure = self.negative_cache.classify(e)
+            print(f"Error fetching audio streams for {yt.video_id} ({failure.value}): {e}")
+            self.negative_cache.record_video_failure(yt.video_id, failure)
+            return []
+
+        if not streams:
+            self.negative_cache.record_video_failure(yt.video_id, FailureReason.EXTRACTION_FAILED)
+            return []
+        self.metadata_cache.put_youtube(yt)
+
+        cached = self.stream_cache.put_streams(yt.video_id, streams)
+        if not cached:
+            # Every URL expires too soon to be cached, play one anyway
+            return [
+                CachedAudioStream(
+                    video_id=yt.video_id,
+                    itag=stream.itag,
+                    url=stream.url,
+                    mime_type=stream.mime_type,
+                    audio_codec=stream.audio_codec,
+                    abr=stream.abr,
+                    expires_at=self.stream_cache.parse_expiry(stream.url) or 0,
+                    duration_ms=self.stream_cache.parse_duration_ms(stream)
+                )
+                for stream in streams
+            ]
+        return cached
     
+    def get_video_metadata(self, video_id: str) -> Optional[VideoMetadata]:
+        """
+        Return the title, duration, thumbnail and uploader of a video, from the metadata cache when they are all known.
+        Otherwise only the video details are fetched, no stream is extracted.
+        """
+        metadata = self.metadata_cache.get(video_id)
+        if metadata is not None and metadata.is_complete():
+            return metadata
+
+        try:
+            yt = self.get_youtube_by_url(f"https://www.youtube.com/watch?v={video_id}")
+            # Loads the video details, the streams are not deciphered
+            if yt is None or not yt.vid_info:
+                return metadata
+            return self.metadata_cache.put_youtube(yt) or metadata
+        except Exception as e:
+            print(f"Error fetching metadata for {video_id}: {e}")
+            return metadata
+
     def get_playback_stream_from_str(self, item: str):
-        response:list[YouTube] = self.search_and_bind(item, 1)
+        query = item
+        if self.negative_cache.get_query_failure(query) is not None:
+            return None
+
+        response:list[YouTube] = self.search_and_bind(query, 1)
+        if not response:
+            return None
         item:YouTube = response[0]
-        if item is None:
+
+        failure = self.check_playable(item)
+        if failure is not None:
+            # The query keeps resolving to the same video, so it fails for the same reason.
+            self.negative_cache.record_query_failure(query, failure)
             return None
-        
-        #HACK
-        #Should we be doing this here?
-        if item.age_restricted:
+
+        stream_url = self.get_audio_stream(item)
+        if stream_url is None:
+            failure = self.get_known_failure(item)
+            if failure is not None:
+                self.negative_cache.record_query_failure(query, failure)
+        return stream_url
+
+    #Async facade, runs the blocking calls above in the shared service executor.
+    #Identical concurrent lookups share one call, only plain data is shared.
+    @single_flight(lambda query, limit=4: (YouTubeSearchCache.normalize_query(query), limit))
+    async def perform_search_async(self, query: str, limit=4) -> list[dict]:
+        return await ServiceExecutor().run(self.perform_search, query, limit)
+
+    async def search_and_bind_async(self, query: str, limit=1) -> list[YouTube]:
+        search_results = await self.perform_search_async(query, limit)
+        return await ServiceExecutor().run(self.bind_search_results, search_results)
+
+    async def get_youtube_by_url_async(self, url: str) -> YouTube:
+        return await ServiceExecutor().run(self.get_youtube_by_url, url)
+
+    async def get_playlist_from_url_async(self, url: str) -> Playlist:
+        return await ServiceExecutor().run(self.get_playlist_from_url, url)
+
+    async def get_audio_stream_async(self, yt: YouTube, target_kbps: int = None) -> str:
+        audio_stream = await self.get_audio_stream_info_async(yt, target_kbps)
+        if audio_stream is None:
             return None
-        
-        #print(item.watch_url)
-            
-        return self.get_audio_stream(item)
\ No newline at end of file
+        return audio_stream.url
+
+    @single_flight(lambda yt, target_kbps=None: (yt.video_id, target_kbps))
+    async def get_audio_stream_info_async(self, yt: YouTube, target_kbps: int = None) -> CachedAudioStream:
+        return await ServiceExecutor().run(self.get_audio_stream_info, yt, target_kbps)
+
+    @single_flight()
+    async def get_video_metadata_async(self, video_id: str) -> Optional[VideoMetadata]:
+        return await ServiceExecutor().run(self.get_video_metadata, video_id)
+
+    async def get_playback_stream_from_str_async(self, item: str):
+        return await ServiceExecutor().run(self.get_playback_stream_from_str, item)
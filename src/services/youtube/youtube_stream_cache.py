@@ -0,0 +1,160 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+from pytubefix import Stream
+
+
+@dataclass(frozen=True)
+class CachedAudioStream:
+    video_id: str
+    itag: int
+    url: str
+    mime_type: str
+    audio_codec: str
+    abr: str
+    expires_at: float
+    duration_ms: Optional[int] = None
+
+
+class YouTubeStreamCache:
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.entries: OrderedDict[str, dict[int, CachedAudioStream]] = OrderedDict()
+        self.max_videos = int(os.getenv('STREAM_CACHE_SIZE', 1000))
+        # googlevideo URLs are only useful if they outlive the song that is about to be played with them.
+        self.expiry_margin = int(os.getenv('STREAM_CACHE_EXPIRY_MARGIN', 1800))
+        # Used when a URL carries no expire parameter.
+        self.default_ttl = int(os.getenv('STREAM_CACHE_DEFAULT_TTL', 3600))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def parse_expiry(stream_url: str) -> Optional[float]:
+        """
+        Read the unix timestamp from the `expire` parameter of a signed googlevideo URL.
+
+        Parameters:
+            stream_url (str): The signed stream URL.
+
+        Returns:
+            float: The expiry timestamp, or None if the URL has no usable expire parameter.
+        """
+        try:
+            expire = parse_qs(urlparse(stream_url).query).get('expire')
+            if expire:
+                return float(expire[0])
+        except ValueError:
+            pass
+        return None
+
+    @staticmethod
+    def parse_duration_ms(stream: Stream) -> Optional[int]:
+        """Return the approximate duration of a stream in milliseconds, or None if YouTube did not report it."""
+        try:
+            return int(stream.durationMs)
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def get(self, video_id: str, itag: int = None) -> Optional[CachedAudioStream]:
+        """
+        Return a cached audio stream for a video that is still safe to play.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+            itag (int, optional): A specific stream format. Defaults to the first cached audio stream.
+
+        Returns:
+            CachedAudioStream: The cached stream, or None on a miss.
+        """
+        streams = self.get_streams(video_id)
+        for stream in streams:
+            if itag is None or stream.itag == itag:
+                return stream
+        return None
+
+    def get_streams(self, video_id: str) -> list[CachedAudioStream]:
+        """
+        Return every cached audio stream of a video, in the order YouTube listed them.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+
+        Returns:
+            list[CachedAudioStream]: The cached streams, empty on a miss.
+        """
+        with self._lock:
+            streams = self.entries.get(video_id)
+            if streams:
+                now = time.time()
+                for itag, stream in list(streams.items()):
+                    if stream.expires_at - self.expiry_margin <= now:
+                        del streams[itag]
+                        self.evictions += 1
+                if not streams:
+                    del self.entries[video_id]
+
+            if not streams:
+                self.misses += 1
+                return []
+
+            self.entries.move_to_end(video_id)
+            self.hits += 1
+            return list(streams.values())
+
+    def put_streams(self, video_id: str, streams: list[Stream]) -> list[CachedAudioStream]:
+        """
+        Cache the audio streams of a video, keyed by itag.
+
+        Parameters:
+            video_id (str): The YouTube video id.
+            streams (list[Stream]): The audio streams returned by pytubefix.
+
+        Returns:
+            list[CachedAudioStream]: The streams that were cached, empty if they all expire too soon.
+        """
+        now = time.time()
+        cached = {}
+        for stream in streams:
+            expires_at = self.parse_expiry(stream.url) or now + self.default_ttl
+            if expires_at - self.expiry_margin <= now:
+                continue
+            cached[stream.itag] = CachedAudioStream(
+                video_id=video_id,
+                itag=stream.itag,
+                url=stream.url,
+                mime_type=stream.mime_type,
+                audio_codec=stream.audio_codec,
+                abr=stream.abr,
+                expires_at=expires_at,
+                duration_ms=self.parse_duration_ms(stream)
+            )
+
+        if not cached:
+            return []
+
+        with self._lock:
+            self.entries[video_id] = cached
+            self.entries.move_to_end(video_id)
+            while len(self.entries) > self.max_videos:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return list(cached.values())
+
+    def get_stats(self) -> dict:
+        """Return the hit, miss and eviction counts and the number of cached videos."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.entries)}
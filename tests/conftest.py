@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The bot runs from src and imports its packages from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
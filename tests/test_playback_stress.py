@@ -0,0 +1,218 @@
+import asyncio
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("pytubefix")
+
+from clients.discord.discord_audio.music_manager import MusicManager
+from clients.discord.discord_audio.queue.queue_item import QueueItem
+from clients.discord.discord_audio.audio.discord_guild_audio_player import DiscordGuildAudioPlayer, PlaybackMode
+from clients.discord.guild_context import PlaybackState, InvalidPlaybackTransition
+
+GUILD_ID = 1
+VOICE_CHANNEL_ID = 2
+
+
+# How a stress item behaves, see StressQueueItem
+PLAYABLE = "playable"
+UNRESOLVABLE = "unresolvable"  # Has no stream URL, skipped
+BROKEN_FILE = "broken file"    # Its cached file cannot be opened, played from its stream instead
+NO_START = "no start"          # Its stream resolves but cannot be started, skipped
+
+
+class StressQueueItem(QueueItem):
+    """A queue item that resolves after a random delay, without touching YouTube or the caches."""
+    __slots__ = ('behaviour',)
+
+    def __init__(self, query: str, behaviour: str = PLAYABLE):
+        super().__init__(query, None)
+        self.behaviour = behaviour
+
+    def load_opus_frames(self):
+        return None
+
+    def load_cached_audio(self):
+        if self.behaviour == BROKEN_FILE:
+            self.audio_file = SimpleNamespace(path=f"broken://{self.query}", audio_codec=None)
+        return self.audio_file
+
+    def get_duration_seconds(self):
+        return None
+
+    def record_play(self) -> None:
+        pass
+
+    async def get_stream_url(self, priority=None) -> str:
+        await asyncio.sleep(random.uniform(0, 0.002))
+        if self.behaviour == UNRESOLVABLE:
+            return None
+        scheme = "nostart" if self.behaviour == NO_START else "stress"
+        self.stream_url = f"{scheme}://{self.query}"
+        return self.stream_url
+
+
+class StressVoiceClient:
+    """
+    Plays each source for a random moment in its own thread, like discord.py's audio player,
+    and calls after() from that thread when the source ends or is stopped.
+    """
+
+    def __init__(self):
+        self.channel = SimpleNamespace(id=VOICE_CHANNEL_ID, bitrate=64000, members=[])
+        self._lock = threading.Lock()
+        self._playing = False
+        self._paused = False
+        self._stopped: threading.Event = None
+
+    def is_playing(self) -> bool:
+        return self._playing and not self._paused
+
+    def is_paused(self) -> bool:
+        return self._playing and self._paused
+
+    def is_connected(self) -> bool:
+        return True
+
+    def play(self, source, after=None) -> None:
+        with self._lock:
+            if self._playing:
+                raise RuntimeError("Already playing audio.")
+            self._playing = True
+            self._paused = False
+            self._stopped = threading.Event()
+        threading.Thread(target=self._run, args=(self._stopped, after), daemon=True).start()
+
+    def _run(self, stopped: threading.Event, after) -> None:
+        remaining = random.uniform(0, 0.004)
+        while remaining > 0 and not stopped.wait(0.0005):
+            if not self._paused:
+                remaining -= 0.0005
+        with self._lock:
+            if self._stopped is stopped:
+                self._playing = False
+                self._paused = False
+        if after is not None:
+            after(None)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._stopped is not None:
+                self._stopped.set()
+            self._playing = False
+            self._paused = False
+
+    def pause(self) -> None:
+        self._paused = True
+
+    def resume(self) -> None:
+        self._paused = False
+
+
+class StressAudioPlayer(DiscordGuildAudioPlayer):
+    """An audio player whose sources are placeholders, so no ffmpeg is started."""
+
+    def _create_source(self, source: str, audio_codec: str, before_options: str = None):
+        if source.startswith(("broken://", "nostart://")):
+            raise RuntimeError(f"Cannot open {source}")
+        return SimpleNamespace(source=source, cleanup=lambda: None), PlaybackMode.PCM
+
+    def _meter(self, audio_source, mode: PlaybackMode, warm: bool = False):
+        return audio_source
+
+
+async def stress(count: int, monkeypatch: pytest.MonkeyPatch) -> 'list[str]':
+    """
+    Queue count items, some of which cannot be resolved or started, while play, pause, resume and skip
+    commands run concurrently with songs ending in the audio threads, and return any problem found.
+    """
+    voice_client = StressVoiceClient()
+    guild = SimpleNamespace(id=GUILD_ID, voice_client=voice_client, get_channel=lambda channel_id: voice_client.channel)
+    bot = SimpleNamespace(get_guild=lambda guild_id: guild)
+
+    # A MusicManager of its own, the shared one is left as it was
+    monkeypatch.setattr(MusicManager, "_instance", None)
+    music_manager = MusicManager(bot)
+    monkeypatch.setattr(
+        music_manager.guild_audio_player_manager, "_create_audio_player",
+        lambda guild_id, vc, on_song_end_callback=None: StressAudioPlayer(guild_id, vc, on_song_end_callback=on_song_end_callback)
+    )
+    context = music_manager.get_guild_context(GUILD_ID)
+
+    problems = []
+    transition = context.transition
+
+    def checked_transition(state: PlaybackState) -> None:
+        try:
+            transition(state)
+        except InvalidPlaybackTransition as e:
+            problems.append(str(e))
+            raise
+    context.transition = checked_transition
+
+    started = []
+    play_queue_item = music_manager._play_queue_item
+
+    async def record_start(guild_id, vc, queue_item):
+        if await play_queue_item(guild_id, vc, queue_item):
+            started.append(queue_item.query)
+            return True
+        return False
+    music_manager._play_queue_item = record_start
+
+    commands = []
+    expected = []
+    for i in range(count):
+        behaviour = random.choices((PLAYABLE, UNRESOLVABLE, BROKEN_FILE, NO_START), weights=(85, 5, 5, 5))[0]
+        if behaviour in (PLAYABLE, BROKEN_FILE):
+            expected.append(f"song {i}")
+        music_manager.add_item_to_queue(GUILD_ID, StressQueueItem(f"song {i}", behaviour))
+        roll = random.random()
+        if roll < 0.3:
+            commands.append(asyncio.create_task(music_manager.play_queue_in_channel(GUILD_ID, VOICE_CHANNEL_ID)))
+        elif roll < 0.4:
+            music_manager.pause_playback(GUILD_ID)
+        elif roll < 0.5:
+            music_manager.resume_playback(GUILD_ID)
+        elif roll < 0.55:
+            music_manager.skip_playback(GUILD_ID)
+        if random.random() < 0.3:
+            await asyncio.sleep(random.uniform(0, 0.001))
+    await asyncio.gather(*commands)
+    await music_manager.play_queue_in_channel(GUILD_ID, VOICE_CHANNEL_ID)
+
+    # Let the queue drain, resuming whatever was left paused
+    for _ in range(count * 10):
+        music_manager.resume_playback(GUILD_ID)
+        if len(started) >= len(expected) and context.state is PlaybackState.IDLE:
+            break
+        await asyncio.sleep(0.005)
+
+    if started != expected:
+        missing = len(set(expected) - set(started))
+        repeated = len(started) - len(set(started))
+        unexpected = len(set(started) - set(expected))
+        in_order = not unexpected and started == sorted(started, key=expected.index)
+        problems.append(f"{len(started)} of {len(expected)} items started, {missing} missing, {repeated} repeated, {unexpected} unplayable, in order: {in_order}")
+    if context.state is not PlaybackState.IDLE:
+        problems.append(f"Ended in state {context.state.value} instead of idle")
+    if len(context.guild_queue.queue) > 0:
+        problems.append(f"{len(context.guild_queue.queue)} items left in the queue")
+    return problems
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_every_item_played_once_in_order(seed, monkeypatch, tmp_path):
+    """Check that no playable item is lost or played twice when commands race with the end of songs."""
+    random.seed(seed)
+    # Nothing is written to disk, resolved ahead of time or started before the end of a song
+    monkeypatch.setenv('CACHE_DB_PATH', str(tmp_path / "cache.db"))
+    monkeypatch.setenv('QUEUE_JOURNAL', '0')
+    monkeypatch.setenv('PREFETCH_DEPTH', '0')
+    monkeypatch.setenv('PRESPAWN_SECONDS', '0')
+
+    problems = asyncio.run(stress(1000, monkeypatch))
+    assert problems == [], f"seed {seed}"
@@ -0,0 +1,50 @@
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("pytubefix")
+
+from clients.discord.discord_audio.queue.queue_item import QueueItem
+from services.spotify.tracks import SpotifyTrack
+from services.spotify.artists import SpotifySimpleArtist
+from services.spotify.albums import SpotifySimpleAlbum
+from services.spotify.shared_entities import SpotifyExternalIDs, SpotifyImage
+
+
+def make_track(i: int) -> SpotifyTrack:
+    artist = SpotifySimpleArtist(f"https://open.spotify.com/artist/{i:022d}", f"https://api.spotify.com/v1/artists/{i:022d}", f"{i:022d}", f"Artist {i}", "artist", f"spotify:artist:{i:022d}")
+    images = [SpotifyImage(size, f"https://i.scdn.co/image/{i:040d}{size}", size) for size in (640, 300, 64)]
+    album = SpotifySimpleAlbum("album", [artist], f"https://open.spotify.com/album/{i:022d}", f"https://api.spotify.com/v1/albums/{i:022d}", f"{i:022d}", True, images, f"Album {i}", "2020-01-01", "day", 12, "album", f"spotify:album:{i:022d}")
+    return SpotifyTrack(album, [artist], 1, 200000, False, SpotifyExternalIDs(f"USRC1{i:07d}", None, None), f"https://open.spotify.com/track/{i:022d}", f"https://api.spotify.com/v1/tracks/{i:022d}", f"{i:022d}", False, True, None, f"Track {i}", 50, 1, "track", f"spotify:track:{i:022d}")
+
+
+def measure(count: int) -> 'tuple[int, int]':
+    """
+    Measure the memory a queue of Spotify tracks takes once the tracks themselves are gone.
+
+    Returns:
+        tuple[int, int]: The bytes taken by the tracks, and by the queue items built from them.
+    """
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracks = [make_track(i) for i in range(count)]
+        tracks_bytes = tracemalloc.get_traced_memory()[0] - baseline
+
+        items = [QueueItem(track, None) for track in tracks]
+        del tracks
+        items_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    assert len(items) == count
+    return tracks_bytes, items_bytes
+
+
+def test_queue_items_are_smaller_than_tracks():
+    # Run with `pytest -s` to see the numbers
+    count = 10000
+    tracks_bytes, items_bytes = measure(count)
+    print(f"\n{count} Spotify tracks: {tracks_bytes / 1024 ** 2:.2f} MiB ({tracks_bytes / count:.0f} bytes each)")
+    print(f"{count} queue items without the tracks: {items_bytes / 1024 ** 2:.2f} MiB ({items_bytes / count:.0f} bytes each)")
+    assert items_bytes < tracks_bytes / 2
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("pytubefix")
+
+from clients.discord.discord_audio.music_manager import MusicManager
+from clients.discord.discord_audio.queue.guild_queue_manager import GuildQueueManager
+from clients.discord.discord_audio.queue.queue_item import QueueItem
+from clients.discord.discord_audio.queue.queue_journal import QueueJournal
+
+GUILD_ID = 1
+VOICE_CHANNEL_ID = 2
+
+
+class JournalVoiceClient:
+    """A voice client that is connected until disconnect() is awaited, and never plays anything."""
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.channel = SimpleNamespace(id=VOICE_CHANNEL_ID, bitrate=64000, members=[])
+
+    def is_playing(self) -> bool:
+        return False
+
+    def is_paused(self) -> bool:
+        return False
+
+    def stop(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        self.guild.voice_client = None
+
+
+@pytest.fixture
+def journaled(monkeypatch, tmp_path):
+    """Fresh journal, queue manager and music manager writing to a database of their own."""
+    monkeypatch.setenv('CACHE_DB_PATH', str(tmp_path / "cache.db"))
+    monkeypatch.setenv('QUEUE_JOURNAL', '1')
+    monkeypatch.setenv('PREFETCH_DEPTH', '0')
+    for singleton in (QueueJournal, GuildQueueManager, MusicManager):
+        monkeypatch.setattr(singleton, "_instance", None)
+
+    guild = SimpleNamespace(id=GUILD_ID, voice_client=None)
+    guild.voice_client = JournalVoiceClient(guild)
+    bot = SimpleNamespace(get_guild=lambda guild_id: guild, is_ready=lambda: True)
+    return guild, MusicManager(bot)
+
+
+def play_first_of(music_manager: MusicManager, queries: 'list[str]') -> None:
+    # Queue the songs and move the first one to current, as starting it would
+    for query in queries:
+        music_manager.add_item_to_queue(GUILD_ID, QueueItem(query, None))
+    music_manager._set_current_song(GUILD_ID, music_manager.guild_queue_manager.pop_item_from_guild_queue_by_id(GUILD_ID, 0))
+    music_manager.guild_queue_manager.record_voice_channel_by_id(GUILD_ID, VOICE_CHANNEL_ID)
+
+
+def test_nothing_is_restored_after_a_disconnect(journaled):
+    guild, music_manager = journaled
+    play_first_of(music_manager, ["song a", "song b"])
+    QueueJournal().flush()
+    assert QueueJournal().load()[GUILD_ID]["current"]["query"] == "song a"
+
+    async def disconnect():
+        assert await music_manager.disconnect_from_guild(GUILD_ID)
+        # Let the voice client finish disconnecting
+        await asyncio.sleep(0)
+    asyncio.run(disconnect())
+    QueueJournal().flush()
+
+    assert QueueJournal().load() == {}
+    assert GuildQueueManager().restore_from_journal() == {}
+    assert GUILD_ID not in GuildQueueManager().get_guild_ids()
+
+
+def test_nothing_is_restored_after_a_reap(journaled):
+    guild, music_manager = journaled
+    play_first_of(music_manager, ["song a", "song b"])
+    guild.voice_client = None
+    music_manager.get_guild_context(GUILD_ID).last_active -= music_manager.session_idle_ttl
+
+    assert music_manager.reap_idle_sessions() == 1
+    QueueJournal().flush()
+
+    assert QueueJournal().load() == {}
+    assert GuildQueueManager().restore_from_journal() == {}
+
+
+def test_snapshot_is_restored(journaled):
+    guild, music_manager = journaled
+    play_first_of(music_manager, ["song a", "song b", "song c"])
+    GuildQueueManager().snapshot_guild_queue_by_id(GUILD_ID)
+    QueueJournal().flush()
+
+    state = QueueJournal().load()[GUILD_ID]
+    assert state["current"]["query"] == "song a"
+    assert [record["query"] for record in state["items"]] == ["song b", "song c"]
+    assert state["voice_channel_id"] == VOICE_CHANNEL_ID
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("discord")
+
+from clients.discord.discord_audio.resolver_scheduler import ResolvePriority, ResolverScheduler
+
+
+def test_promoted_and_cancelled_jobs_run_once_in_priority_order(monkeypatch):
+    monkeypatch.setenv('RESOLVER_WORKERS', '1')
+    monkeypatch.setattr(ResolverScheduler, "_instance", None)
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    async def schedule():
+        scheduler = ResolverScheduler()
+        busy = scheduler.submit(1, ResolvePriority.NOW_PLAYING_NEXT, blocker)
+        await asyncio.to_thread(started.wait, 5)
+        jobs = {name: scheduler.submit(1, ResolvePriority.FAR_FUTURE, ran.append, name) for name in "abcd"}
+
+        scheduler.promote(jobs["c"], ResolvePriority.VISIBLE_QUEUE)
+        scheduler.promote(jobs["c"], ResolvePriority.NOW_PLAYING_NEXT)
+        jobs["b"].cancel()
+        await asyncio.sleep(0)
+        assert scheduler.is_pending(jobs["a"]) and scheduler.is_pending(jobs["c"])
+        assert not scheduler.is_pending(jobs["b"])
+        assert scheduler.get_stats()["pending"] == {"NOW_PLAYING_NEXT": 1, "VISIBLE_QUEUE": 0, "FAR_FUTURE": 2}
+
+        release.set()
+        await asyncio.gather(busy, jobs["a"], jobs["c"], jobs["d"])
+        assert not scheduler.is_pending(jobs["a"])
+        assert scheduler.get_stats()["pending"] == {"NOW_PLAYING_NEXT": 0, "VISIBLE_QUEUE": 0, "FAR_FUTURE": 0}
+
+    asyncio.run(schedule())
+    assert ran == ["c", "a", "d"]
@@ -0,0 +1,17 @@
+import sqlite3
+
+import pytest
+
+from services.services_utils.sqlite_store import SQLiteStore
+
+
+def test_failed_batch_is_rolled_back(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    store.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        store.execute_batch([("INSERT INTO items VALUES (1)", ()), ("INSERT INTO items VALUES (1)", ())])
+    # The next batch must not commit what was left of the failed one
+    store.execute_batch([("INSERT INTO items VALUES (2)", ())])
+
+    assert store.fetchall("SELECT id FROM items") == [(2,)]
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+pytest.importorskip("pytubefix")
+
+from pytubefix import Playlist
+
+from services.youtube.youtube_data import YouTubeData
+
+
+def playlist_page(videos: 'list[dict]') -> str:
+    """The html of a playlist page that lists the given renderers and has no further pages."""
+    initial_data = {"contents": {"twoColumnBrowseResultsRenderer": {"tabs": [{"tabRenderer": {"content": {
+        "sectionListRenderer": {"contents": [{"itemSectionRenderer": {"contents": [
+            {"playlistVideoListRenderer": {"contents": videos}}
+        ]}}]}
+    }}}]}}}
+    return f"<script>var ytInitialData = {json.dumps(initial_data)};</script>"
+
+
+def test_playlist_entries_carry_their_titles():
+    playlist = Playlist("https://www.youtube.com/playlist?list=PLtest")
+    playlist._html = playlist_page([
+        {"playlistVideoRenderer": {"videoId": "aaaaaaaaaaa", "title": {"runs": [{"text": "First"}]}}},
+        {"playlistVideoRenderer": {"videoId": "bbbbbbbbbbb", "title": {"simpleText": "Second"}}},
+        {"playlistVideoRenderer": {"videoId": "ccccccccccc"}},
+    ])
+
+    entries = list(YouTubeData().iter_playlist_entries(playlist))
+
+    assert [(entry.video_id, entry.title) for entry in entries] == [
+        ("aaaaaaaaaaa", "First"), ("bbbbbbbbbbb", "Second"), ("ccccccccccc", None)
+    ]